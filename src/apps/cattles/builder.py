@@ -21,8 +21,8 @@ def direct(start_date=None, end_date=None, *args, **kwargs):
 
     for model in MODELS:
         api = Api(model=model, **data._asdict())
-        for delta_start_date, delta_end_date in date_generator(start_date, end_date, DELTA_DAYS):
-            response = api.request(date=delta_start_date)
+        params_list = [{'date': date} for date, _ in date_generator(start_date, end_date, DELTA_DAYS)]
+        for params, response in api.request_many(params_list):
             api.load(response)
 
     return data
@@ -1,6 +1,5 @@
-import pickle
-
-from dashboard.caches import redis_instance as cache
+from dashboard.caches import chart_cache, redis_instance as cache
+from django.db import transaction
 from django.db.models import (
     Model,
     QuerySet,
@@ -13,7 +12,7 @@ from django.db.models import (
     BooleanField,
     Q,
 )
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.forms.models import model_to_dict
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -23,13 +22,27 @@ from model_utils.managers import InheritanceManager
 CHILDREN_CACHE_KEY = "watchlist{watchlist_id}_product{product_id}_children"
 CHILDREN_ALL_CACHE_KEY = "product{product_id}_children_all"
 TYPES_CACHE_KEY = "product{product_id}_types"
-TYPE_CACHE_KEY = "product{product_id}_type"
-SOURCES_WITH_WATCHLIST_CACHE_KEY = "product{product_id}_sources_with_watchlist"
-SOURCES_CACHE_KEY = "product{product_id}_sources"
+TYPES_WITH_WATCHLIST_CACHE_KEY = "watchlist{watchlist_id}_product{product_id}_types"
 FIRST_LEVEL_PRODUCTS_WITH_WATCHLIST_CACHE_KEY = "watchlist{watchlist_id}_config{config_id}_lv1_products"
 FIRST_LEVEL_PRODUCTS_CACHE_KEY = "config{config_id}_lv1_products"
 PRODUCTS_CACHE_KEY = "config{config_id}_products"
-TYPES_FILTER_BY_WATCHLIST_ITEMS = "types_filter_by_watchlist_items{hash_id}"
+CHARTS_CACHE_KEY = "config{config_id}_charts"
+
+# 快取失效的 namespace(dashboard.caches.RedisCache.invalidate):
+# 品項階層在後台很少修改，任何品項異動時整個品項樹的快取一起失效
+PRODUCTS_CACHE_NAMESPACE = "products"
+CONFIG_CACHE_NAMESPACE = "config{config_id}"
+WATCHLIST_CACHE_NAMESPACE = "watchlist{watchlist_id}"
+LAST5_YEARS_ITEMS_CACHE_NAMESPACE = "last5_years_items"
+
+
+def watchlist_cache_namespaces(watchlist=None):
+    """ 品項快取的 namespace，依監控清單篩選時需一併在監控品項異動時失效 """
+
+    if watchlist:
+        return PRODUCTS_CACHE_NAMESPACE, WATCHLIST_CACHE_NAMESPACE.format(watchlist_id=watchlist.id)
+
+    return PRODUCTS_CACHE_NAMESPACE,
 
 
 class AbstractProduct(Model):
@@ -70,59 +83,54 @@ class AbstractProduct(Model):
 
     def get_cache_key(self, watchlist=None):
         return (
-            f'watchlist{watchlist.id}_product{self.id}_children'
+            CHILDREN_CACHE_KEY.format(watchlist_id=watchlist.id, product_id=self.id)
 
             if watchlist
             else f'product{self.id}_children'
         )
 
-    def children(self, watchlist=None):
-        """ 取得某個品項底下的第一層所有子品項 (parent=self)，並把結果用快取保存，就不用每次都透過資料庫取出子品項 """
-
-        # 沒傳 watchlist : products{self.id}_children
-        # 有傳 watchlist : watchlist{watchlist.id}_product{self.id}_children
-        cache_key = self.get_cache_key(watchlist)
-        products = cache.get(cache_key)
+    def children_ids(self, watchlist=None):
+        """ 第一層子品項的 id，快取只保存 id list """
 
-        # 抓取 self 第一層子品項， select_subclasses() 能讓 QuerySet() 在 SQL 取出父表和第一層所有子表
-        # 就可以直接實例化子類別
-        # 如果沒有加上 select_subclasses()，只會實例化父類 AbstractProduct，要再多查詢一次
-        if products is None:
-            products = AbstractProduct.objects.filter(parent=self).select_subclasses()
+        def load():
+            # 抓取 self 第一層子品項
+            products = AbstractProduct.objects.filter(parent=self)
 
-            # 有 watchlist 且 watch_all = False 時，會把查到的結果放進快取
+            # 有 watchlist 且 watch_all = False 時，只保留監控清單相關的品項
             if watchlist and not watchlist.watch_all:
                 products = products.filter(id__in=watchlist.related_product_ids)
 
-            cache.set(cache_key, products.order_by('id'), dump=True)
+            return list(products.order_by('id').values_list('id', flat=True))
 
-        else:
-            products = pickle.loads(products) # 反序列化去讀取快取內容
-
-        return products.order_by('id')
+        # 沒傳 watchlist : product{self.id}_children
+        # 有傳 watchlist : watchlist{watchlist.id}_product{self.id}_children
+        return cache.get_or_set(self.get_cache_key(watchlist), load, namespaces=watchlist_cache_namespaces(watchlist))
 
-    def children_all(self):
-        """ 取得某個品項底下所有層別的所有子品項 """
+    def children(self, watchlist=None):
+        """ 取得某個品項底下的第一層所有子品項 (parent=self)，並把 id 用快取保存，就不用每次都透過資料庫找出子品項 """
 
-        cache_key = f'product{self.id}_children_all'
-        products = cache.get(cache_key)
+        # select_subclasses() 能讓 QuerySet() 在 SQL 取出父表和第一層所有子表，就可以直接實例化子類別
+        # 如果沒有加上 select_subclasses()，只會實例化父類 AbstractProduct，要再多查詢一次
+        return AbstractProduct.objects.filter(id__in=self.children_ids(watchlist)).select_subclasses().order_by('id')
 
-        if products is None:
+    def children_all_ids(self):
+        def load():
             # 簡而言之，過濾出 X 品項，或是向上找出 parent 為 X 品項的子品項 # todo
-            products = AbstractProduct.objects.filter(
-            Q(parent=self)
-            | Q(parent__parent=self)
-            | Q(parent__parent__parent=self)
-            | Q(parent__parent__parent__parent=self)
-            | Q(parent__parent__parent__parent__parent=self)
-        ).select_subclasses().order_by('id')
+            return list(AbstractProduct.objects.filter(
+                Q(parent=self)
+                | Q(parent__parent=self)
+                | Q(parent__parent__parent=self)
+                | Q(parent__parent__parent__parent=self)
+                | Q(parent__parent__parent__parent__parent=self)
+            ).order_by('id').values_list('id', flat=True))
 
-            cache.set(cache_key, products, dump=True)
+        return cache.get_or_set(CHILDREN_ALL_CACHE_KEY.format(product_id=self.id), load,
+                                namespaces=(PRODUCTS_CACHE_NAMESPACE,))
 
-        else:
-            products = pickle.loads(products)
+    def children_all(self):
+        """ 取得某個品項底下所有層別的所有子品項 """
 
-        return products
+        return AbstractProduct.objects.filter(id__in=self.children_all_ids()).select_subclasses().order_by('id')
 
     def types(self, watchlist=None):
         """
@@ -142,43 +150,33 @@ class AbstractProduct(Model):
             2. 最終會回傳 QuerySet.none()
         """
         if self.has_child:
-            cache_key = f'product{self.id}_types'
-            types = cache.get(cache_key)
+            cache_key = (
+                TYPES_WITH_WATCHLIST_CACHE_KEY.format(watchlist_id=watchlist.id, product_id=self.id)
+
+                if watchlist
+                else TYPES_CACHE_KEY.format(product_id=self.id)
+            )
 
-            if types is None:
-                products = self.children()
+            def load():
+                products = AbstractProduct.objects.filter(id__in=self.children_ids())
 
                 if watchlist and not watchlist.watch_all:
                     products = products.filter(id__in=watchlist.related_product_ids)
 
                 # flat= True 能讓回傳結果變成一個 list，但是只能查詢一個欄位，同時取兩個以上欄位會 TypeError
                 # [(3,), (5,), (5,), (7,)] -> [3, 5, 5, 7]
-                type_ids = products.values_list('type__id', flat=True)
-                types = Type.objects.filter(id__in=type_ids)
+                return sorted(set(products.exclude(type=None).values_list('type__id', flat=True)))
 
-                # dump=True 保證 寫入前先 pickle，讀出後手動 unpickle
-                # 讓快取內容安全又不會意外觸發額外查詢
-                cache.set(cache_key, types, dump=True)
-            else:
-                types = pickle.loads(types)
-
-            return types
-
-        elif self.type:
-            cache_key = f'product{self.id}_type'
+            # 快取只保存 type id，不保存 QuerySet
+            type_ids = cache.get_or_set(cache_key, load, namespaces=watchlist_cache_namespaces(watchlist))
 
-            _type = cache.get(cache_key)
+            return Type.objects.filter(id__in=type_ids)
 
-            if _type is None:
-                _type = Type.objects.filter(id=self.type.id)
-                cache.set(cache_key, _type, dump=True)
-            else:
-                _type = pickle.loads(_type)
-
-            return _type
+        elif self.type_id:
+            return Type.objects.filter(id=self.type_id)
 
         else: # 沒有子品項也沒有 Type
-            return self.objects.none() # 回傳一個空的 QuerySet
+            return Type.objects.none() # 回傳一個空的 QuerySet
 
     def sources(self, watchlist=None):
         """
@@ -212,7 +210,7 @@ class AbstractProduct(Model):
     @property
     def has_child(self):
         """ 判斷這個商品是否有子品項，如果有子品項則會顯示筆數 """
-        return self.children().count() > 0
+        return len(self.children_ids()) > 0
 
     @property
     def level(self):
@@ -291,25 +289,21 @@ class Config(Model):
 
     def get_cache_key(self, watchlist=None):
         return (
-            f'watchlist{watchlist.id}_config{self.id}_lv1_products'
+            FIRST_LEVEL_PRODUCTS_WITH_WATCHLIST_CACHE_KEY.format(watchlist_id=watchlist.id, config_id=self.id)
 
             if watchlist
-            else f'config{self.id}_lv1_products'
+            else FIRST_LEVEL_PRODUCTS_CACHE_KEY.format(config_id=self.id)
         )
 
     def products(self):
-        cache_key = f'config{self.id}_products'
-
-        products = cache.get(cache_key)
-
-        if products is None:
-            # Use select_subclasses() to return subclass instance
-            products = AbstractProduct.objects.filter(config=self).select_subclasses().order_by('id')
-            cache.set(cache_key, products, dump=True)
-        else:
-            products = pickle.loads(products)
+        product_ids = cache.get_or_set(
+            PRODUCTS_CACHE_KEY.format(config_id=self.id),
+            lambda: list(AbstractProduct.objects.filter(config=self).order_by('id').values_list('id', flat=True)),
+            namespaces=(PRODUCTS_CACHE_NAMESPACE,),
+        )
 
-        return products
+        # Use select_subclasses() to return subclass instance
+        return AbstractProduct.objects.filter(id__in=product_ids).select_subclasses().order_by('id')
 
     def first_level_products(self, watchlist=None):
         """
@@ -322,23 +316,29 @@ class Config(Model):
         主要由 `dashboard.views.Index` 與 `apps.dashboard.views.JarvisMenu` 間接呼叫
         """
 
-        # using redis to reduce database handling and using pickle to serialize the data
-        cache_key = self.get_cache_key(watchlist)
-        products = cache.get(cache_key)
-
-        if products is None:
-            # Use select_subclasses() to return subclass instance
-            products = AbstractProduct.objects.filter(config=self).filter(parent=None).select_subclasses()
+        # using redis to reduce database handling, only product ids are cached
+        def load():
+            products = AbstractProduct.objects.filter(config=self).filter(parent=None)
 
             if watchlist and not watchlist.watch_all:
                 products = products.filter(id__in=watchlist.related_product_ids)
 
-            cache.set(cache_key, products.order_by('id'), dump=True)
+            return list(products.order_by('id').values_list('id', flat=True))
 
-        else:
-            products = pickle.loads(products)
+        product_ids = cache.get_or_set(self.get_cache_key(watchlist), load,
+                                       namespaces=watchlist_cache_namespaces(watchlist))
+
+        # Use select_subclasses() to return subclass instance
+        return AbstractProduct.objects.filter(id__in=product_ids).select_subclasses().order_by('id')
+
+    def chart_ids(self):
+        """ 圖表頁籤使用的 Chart id，Config.charts 異動時失效 """
 
-        return products.order_by('id')
+        return cache.get_or_set(
+            CHARTS_CACHE_KEY.format(config_id=self.id),
+            lambda: list(self.charts.order_by('id').values_list('id', flat=True)),
+            namespaces=(CONFIG_CACHE_NAMESPACE.format(config_id=self.id),),
+        )
 
     def types(self):
         """
@@ -433,24 +433,15 @@ class Source(Model):
 
 
 class TypeQuerySet(QuerySet):
-    """ 根據一組 watchlist_items，把用得到的 type 都篩選出來，並把結果快取起來，下次查詢同一批 item 就不用重跑資料庫 """
+    """ 根據一組 watchlist_items，把用得到的 type 都篩選出來 """
 
     def filter_by_watchlist_items(self, **kwargs):
         items = kwargs.get('watchlist_items')
         if not items:
             raise NotImplementedError
 
-        ids = items.values_list('product__type__id', flat=True)
-        cache_key = f'types_filter_by_watchlist_items{hash(str(ids))}'
-        types = cache.get(cache_key)
-
-        if types is None:
-            types = self.filter(id__in=ids)
-            cache.set(cache_key, types, dump=True)
-        else:
-            types = pickle.loads(types)
-
-        return types
+        # 以子查詢篩選，只需查詢一次資料庫，不需快取
+        return self.filter(id__in=items.values_list('product__type__id', flat=True))
 
 
 class Type(Model):
@@ -639,6 +630,54 @@ def instance_post_save(sender, instance, created, **kwargs):
         instance.save()
         return
     else:
-        cache.delete_keys_by_model_instance(instance, Last5YearsItems, key=Last5YearsItems.LAST5_YEARS_ITEMS_CACHE_KEY)
+        # 交易 commit 後才失效，避免其他 request 在 commit 前以舊資料重建快取
+        transaction.on_commit(lambda: cache.invalidate(LAST5_YEARS_ITEMS_CACHE_NAMESPACE))
+
+post_save.connect(instance_post_save, sender=Last5YearsItems)
+
+
+def last5_years_items_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.invalidate(LAST5_YEARS_ITEMS_CACHE_NAMESPACE))
+
+post_delete.connect(last5_years_items_changed, sender=Last5YearsItems)
+m2m_changed.connect(last5_years_items_changed, sender=Last5YearsItems.product_id.through)
+m2m_changed.connect(last5_years_items_changed, sender=Last5YearsItems.source.through)
+
+
+def product_changed(sender, instance, **kwargs):
+    # AbstractProduct 及所有子類別(Crop、Fruit...)新增、修改或刪除時，品項樹的快取一起失效
+    if isinstance(instance, AbstractProduct) and not kwargs.get('raw'):
+        transaction.on_commit(lambda: cache.invalidate(PRODUCTS_CACHE_NAMESPACE))
+        # 品項的來源由 config 及 type 決定(AbstractProduct.sources)
+        product_ids = [instance.id]
+        transaction.on_commit(lambda: chart_cache.invalidate(product_ids))
+
+post_save.connect(product_changed)
+post_delete.connect(product_changed)
+
+
+def config_charts_changed(sender, instance, reverse, pk_set, **kwargs):
+    # 由 Chart 端修改(chart.config_set.add)時 pk_set 為 Config id，clear 時 pk_set 為 None
+    if not reverse:
+        config_ids = [instance.id]
+    elif pk_set is not None:
+        config_ids = pk_set
+    else:
+        config_ids = Config.objects.filter(charts=instance).values_list('id', flat=True)
+
+    namespaces = [CONFIG_CACHE_NAMESPACE.format(config_id=config_id) for config_id in config_ids]
+    transaction.on_commit(lambda: cache.invalidate(*namespaces))
+
+m2m_changed.connect(config_charts_changed, sender=Config.charts.through)
+
+
+def source_changed(sender, **kwargs):
+    # 來源的 config、type 異動會改變所有相關品項的預設來源，後台很少修改，所有圖表快取一起失效
+    if kwargs.get('raw') or not kwargs.get('action', 'post_').startswith('post_'):
+        return
+
+    transaction.on_commit(chart_cache.invalidate_all)
 
-post_save.connect(instance_post_save, sender=Last5YearsItems)
\ No newline at end of file
+post_save.connect(source_changed, sender=Source)
+post_delete.connect(source_changed, sender=Source)
+m2m_changed.connect(source_changed, sender=Source.configs.through)
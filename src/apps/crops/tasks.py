@@ -1,7 +1,8 @@
 from __future__ import absolute_import, unicode_literals
 import logging
 from celery.task import task
-from .builder import direct
+from apps.dailytrans.tasks import fan_out_direct
+from .builder import DIRECT_JOBS
 
 
 @task(name="DailyCropBuilder")
@@ -11,9 +12,7 @@ def build_crop(delta):
         'type_code': 'LOT-crops',
     }
     try:
-        result = direct(delta=delta)
-        if result.success:
-            logger_extra['duration'] = result.duration
-            db_logger.info('Successfully process trans: %s - %s' % (result.start_date, result.end_date), extra=logger_extra)
+        # 各資料來源平行執行，結果由 AggregateDirectResults 寫入 log
+        fan_out_direct(DIRECT_JOBS, delta, logger_extra['type_code'])
     except Exception as e:
         db_logger.exception(e, extra=logger_extra)
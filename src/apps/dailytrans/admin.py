@@ -5,7 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 from rangefilter.filter import DateRangeFilter
 
 from apps.configs.models import AbstractProduct, Source
-from .models import DailyTran, DailyReport, FestivalReport
+from .models import DailyTran, DailyReport, FestivalReport, BuilderRun, ReportArtifact
 
 
 class DailyTranModelForm(ModelForm):
@@ -111,6 +111,20 @@ class DailyReportAdmin(admin.ModelAdmin):
     )
 
 
+class ReportArtifactAdmin(admin.ModelAdmin):
+    list_display = (
+        'kind',
+        'date',
+        'version',
+        'file_name',
+        'file_id',
+        'update_time',
+        'create_time',
+    )
+    list_filter = ('kind',)
+    exclude = ('content',)
+
+
 class FestivalReportAdmin(admin.ModelAdmin):
     list_display = (
         'festival_id',
@@ -119,7 +133,30 @@ class FestivalReportAdmin(admin.ModelAdmin):
         'update_time',
         'create_time',
     )
+
+
+class BuilderRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'job',
+        'start_date',
+        'end_date',
+        'success',
+        'duration',
+        'fetched',
+        'matched',
+        'unmatched',
+        'inserted',
+        'updated',
+        'deleted',
+        'latency_p95',
+        'create_time',
+    )
+    list_filter = ('success', 'type_code', ('create_time', DateRangeFilter))
+    search_fields = ('job',)
+
     
 admin.site.register(DailyTran, DailyTranAdmin)
 admin.site.register(DailyReport, DailyReportAdmin)
+admin.site.register(ReportArtifact, ReportArtifactAdmin)
 admin.site.register(FestivalReport, FestivalReportAdmin)
+admin.site.register(BuilderRun, BuilderRunAdmin)
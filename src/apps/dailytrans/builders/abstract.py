@@ -1,8 +1,8 @@
 import abc
+import datetime
 import logging
 import time
 
-import requests
 from django.conf import settings
 
 from apps.configs.models import (
@@ -10,6 +10,13 @@ from apps.configs.models import (
     Config,
     Type,
 )
+from .fetcher import get_fetcher
+from .index import LookupIndex
+from .metrics import BuilderMetrics, current_metrics
+from .store import get_store
+from .staging import DailyTranCopyImporter
+from .upsert import DailyTranUpserter
+from .utils import date_windows
 
 
 class AbstractApi(object):
@@ -20,6 +27,12 @@ class AbstractApi(object):
 
     _metaclass__ = abc.ABCMeta
 
+    # 支援日期區間查詢的 API 單次請求最多涵蓋的天數，可由 settings.DAILYTRAN_BUILDER_WINDOW 覆寫
+    MAX_WINDOW_DAYS = 1
+
+    # 伺服器單次回傳的筆數上限，回傳筆數達到此值時視為資料被截斷，None 代表不檢查
+    MAX_ROWS = None
+
     def __init__(self, model, config_code=None, type_id=None, logger=None, logger_type_code=None):
         if self.API_NAME is None:
             raise NotImplementedError('Class attribute API_NAME not advised at AbstractApi inheritance')
@@ -44,6 +57,10 @@ class AbstractApi(object):
         if not isinstance(logger, str):
             raise NotImplementedError('Argument logger must be str')
 
+        window = getattr(settings, 'DAILYTRAN_BUILDER_WINDOW', {}).get(self.API_NAME, {})
+        self.MAX_WINDOW_DAYS = window.get('MAX_WINDOW_DAYS', self.MAX_WINDOW_DAYS)
+        self.MAX_ROWS = window.get('MAX_ROWS', self.MAX_ROWS)
+
         self.MODEL = model
 
         # 品項分類: 蔬菜(COG05), 水果(COG06) etc.
@@ -62,15 +79,23 @@ class AbstractApi(object):
             self.SOURCE_QS = self.SOURCE_QS.filter(type__id=type_id)
             self.PRODUCT_QS = self.PRODUCT_QS.filter(type__id=type_id, track_item=True)
             
+        # 一次取出所有品項與來源建立索引，hook 解析資料時不再查詢資料庫
+        self.INDEX = LookupIndex(products=self.PRODUCT_QS.order_by('id'), sources=self.SOURCE_QS.order_by('id'))
+
         # 將不重複的品項 code 欄位取出來(code 若無對應代碼則可能與品項名稱相同(或是空): 柿子-甜柿(Z4), 柳橙(柳橙) etc.)
-        # 需注意 obj type 為 Tuple
-        self.target_items = {obj[0] for obj in self.PRODUCT_QS.values_list('code')}
+        self.target_items = set(self.INDEX.codes)
+        self.FETCHER = get_fetcher()
+        self.STORE = get_store()
         self.LOGGER = logging.getLogger(logger)
         self.LOGGER_EXTRA = {
             'type_code': logger_type_code,
             'request_url': None,
         }
 
+        # 於 `director` 中執行時寫入該次執行的統計數據(BuilderRun)，否則只記錄在此實例
+        self.METRICS = current_metrics() or BuilderMetrics()
+        self.METRICS.type_code = self.METRICS.type_code or logger_type_code
+
     @abc.abstractmethod
     def request(self, *args):
         return
@@ -83,31 +108,142 @@ class AbstractApi(object):
     def load(self, response):
         return
 
-    def get(self, url, *args, **kwargs):
+    def fetch(self, method, url, **kwargs):
         """
-        通用的 get 方法，當請求失敗時會根據狀況重試
+        透過共用的 Fetcher 發送請求，當請求失敗時會根據狀況重試
+        有啟用 ResponseStore 時會將成功的 response 存下來，replay 模式下則直接讀取存下來的資料，不連線
         """
 
-        response = requests.Response()
-        retry_count = 0
+        if self.STORE and self.STORE.replay:
+            return self.STORE.load(self.API_NAME, method, url, kwargs.get('params'))
+
+        start = time.monotonic()
+        response = self.FETCHER.request(method, url, logger=self.LOGGER, logger_extra=self.LOGGER_EXTRA, **kwargs)
+        self.METRICS.record_response(response, time.monotonic() - start)
 
-        # max retry 5 times
-        while response.status_code != 200 and retry_count < 5:
-            try:
-                response = requests.get(url, *args, **kwargs)
-                self.LOGGER_EXTRA['request_url'] = response.request.url
-            except requests.exceptions.ConnectionError:
-                response = requests.Response()
+        if self.STORE:
+            self.STORE.save(self.API_NAME, method, url, kwargs.get('params'), response)
 
-            if response.status_code != 200:
-                retry_count += 1
-                self.LOGGER.error(
-                    f'Connection Refused, Retry {retry_count} Time',
-                    extra=self.LOGGER_EXTRA,
-                )
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        通用的 get 方法
+        """
+
+        return self.fetch('GET', url, **kwargs)
+
+    def unmatched(self, kind, value):
+        """
+        記錄無法對應的品項或來源，執行結束後彙整成一筆 log 及 BuilderRun.unmatched_codes，不逐筆寫入 log
 
-                # sleep 15 seconds before retry
-                time.sleep(15)
+        :param kind: str，Product 或 Source
+        :param value: 無法對應的代碼或名稱
+        """
+
+        self.METRICS.record_unmatched(kind, value)
+
+    def request_many(self, params_list):
+        """
+        以多執行緒同時送出多個 `request`(例如整個日期區間)，並依完成順序回傳結果
+        呼叫端應於主執行緒逐一 `load`，避免在多執行緒中存取資料庫
+
+        :param params_list: Iterable[dict]，每個 dict 為一次 `request` 的參數
+        :return: Generator[Tuple[dict, response]]，request 發生例外時會寫入 log 並略過
+        """
+
+        for params, response in self.FETCHER.map(lambda params: self.request(**params), params_list):
+            if isinstance(response, Exception):
+                self.LOGGER.error(f'Request failed, params: {params}, exception: {response}',
+                                  extra=self.LOGGER_EXTRA)
                 continue
 
-        return response
+            yield params, response
+
+    @staticmethod
+    def split_window(start_date, end_date, days):
+        """
+        將日期區間切成數個不重疊且最多 `days` 天的區間
+
+        :return: List[Tuple[datetime.date, datetime.date]]
+        """
+
+        return date_windows(start_date, end_date, days)
+
+    def count_rows(self, response):
+        """
+        回傳 response 內的資料筆數，用來判斷資料是否被伺服器截斷，支援日期區間查詢的子類別需覆寫
+        """
+
+        return 0
+
+    @staticmethod
+    def _responses(response):
+        return response if isinstance(response, list) else [response]
+
+    def _is_truncated(self, response):
+        return bool(self.MAX_ROWS) and any(
+            resp.status_code == 200 and self.count_rows(resp) >= self.MAX_ROWS for resp in self._responses(response)
+        )
+
+    def _is_window_exceeded(self, response):
+        return any(resp.status_code != 200 for resp in self._responses(response)) or self._is_truncated(response)
+
+    def request_range(self, start_date, end_date, **kwargs):
+        """
+        以 MAX_WINDOW_DAYS 為單位將日期區間切成數個區間同時請求，取代逐日請求，並依完成順序回傳 response
+        區間請求失敗或回傳筆數達到 MAX_ROWS 時，會將區間切半後重新請求，直到區間只剩一天為止，
+        單日仍達到 MAX_ROWS 時寫入 warning log
+        回傳的資料可能包含多個日期，`load` 需以日期分組處理
+
+        :param start_date: datetime.date
+        :param end_date: datetime.date
+        :param kwargs: 其他 `request` 參數
+        :return: Generator[response]
+        """
+
+        windows = self.split_window(start_date, end_date, self.MAX_WINDOW_DAYS)
+
+        while windows:
+            params_list = [dict(kwargs, start_date=start, end_date=end) for start, end in windows]
+            windows = []
+
+            for params, response in self.request_many(params_list):
+                start, end = params['start_date'], params['end_date']
+
+                if start < end and self._is_window_exceeded(response):
+                    middle = start + datetime.timedelta(days=(end - start).days // 2)
+                    windows.extend([(start, middle), (middle + datetime.timedelta(days=1), end)])
+                    self.LOGGER.warning(f'Window {start} ~ {end} exceeded, split and retry',
+                                        extra=self.LOGGER_EXTRA)
+                    continue
+
+                if self._is_truncated(response):
+                    # 單日仍達到 MAX_ROWS，無法再切分，資料可能被截斷
+                    self.LOGGER.warning(f'Window {start} ~ {end} reached MAX_ROWS ({self.MAX_ROWS}), '
+                                        f'data may be truncated', extra=self.LOGGER_EXTRA)
+
+                yield response
+
+    def upsert(self, trans, fields, insert_condition=None):
+        """
+        將 hook 轉換出來的整批 DailyTran 以批次方式新增或更新至資料庫
+        筆數達到 settings.DAILYTRAN_BUILDER_COPY_THRESHOLD 時改以 COPY 寫入暫存表後合併
+
+        :param trans: Iterable[DailyTran]
+        :param fields: 既有資料需要更新的欄位
+        :param insert_condition: callable，回傳 False 的資料不會新增
+        :return: UpsertResult，發生例外時回傳 None
+        """
+
+        trans = list(trans)
+        self.METRICS.add(matched=len(trans))
+        threshold = getattr(settings, 'DAILYTRAN_BUILDER_COPY_THRESHOLD', None)
+        upserter_class = DailyTranCopyImporter if threshold and len(trans) >= threshold else DailyTranUpserter
+
+        try:
+            upserter = upserter_class(fields=fields, logger=self.LOGGER, logger_extra=self.LOGGER_EXTRA,
+                                      metrics=self.METRICS)
+            return upserter.upsert(trans, insert_condition=insert_condition)
+        except Exception as e:
+            self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
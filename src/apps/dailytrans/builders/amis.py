@@ -1,4 +1,3 @@
-from django.db.models import Q
 import datetime
 import json
 from xml.etree import ElementTree
@@ -42,7 +41,7 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         source_code = dic.get('MarketNo')
-        source = self.SOURCE_QS.filter(code=source_code).first()
+        source = self.INDEX.get_source_by_code(source_code)
         date = date_transfer(sep=self.SEP, string=dic.get('TransDate'), roc_format=self.ROC_FORMAT)
         products = dic.get('Detail')
         if source and products:
@@ -63,7 +62,7 @@ class Api(AbstractApi):
                     return sum_avg_price / sum_volume, sum_volume
 
                 product_code = self.sum_to_product
-                product = self.PRODUCT_QS.filter(code=product_code).first()
+                product = self.INDEX.get_product(product_code)
                 if product:
                     avg_price, sum_volume = sum_details(products)
                     tran = DailyTran(
@@ -75,15 +74,13 @@ class Api(AbstractApi):
                     )
                     trans.append(tran)
                 else:
-                    self.LOGGER.warning(
-                        'Cannot Match Product: "%s" In Dictionary %s'
-                        % (product_code, dic), extra=self.LOGGER_EXTRA)
+                    self.unmatched('Product', product_code)
 
             else:
                 # translate detail objects to "multi" DailyTran
                 for dic in products:
                     product_code = dic.get('ProductNo')
-                    product = self.PRODUCT_QS.filter(code=product_code).first()
+                    product = self.INDEX.get_product(product_code)
                     if product:
                         tran = DailyTran(
                             product=product,
@@ -94,15 +91,12 @@ class Api(AbstractApi):
                         )
                         trans.append(tran)
                     else:
-                        self.LOGGER.warning(
-                            'Cannot Match Product: "%s" In Dictionary %s'
-                            % (product_code, dic), extra=self.LOGGER_EXTRA)
+                        self.unmatched('Product', product_code)
 
             return trans
 
         if products and not source:
-            self.LOGGER.warning('Cannot Match Source: "%s" In Dictionary %s'
-                                % (source_code, dic), extra=self.LOGGER_EXTRA)
+            self.unmatched('Source', source_code)
             return dic
 
         else:
@@ -139,28 +133,7 @@ class Api(AbstractApi):
 
         if data:
             # data should look like [[A, B, C], [D, E], {}, [F], {}...] after loads
-            for lst in data:
-                for obj in lst:
-                    if isinstance(obj, DailyTran):
-                        try:
-                            # update if exists
-                            daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                                     & Q(product=obj.product))
-                            if obj.source:
-                                daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                            if daily_tran_qs.count() > 1:
-                                # log as duplicate
-                                items = str(daily_tran_qs.values_list('id', flat=True))
-                                self.LOGGER.warning('Find duplicate DailyTran item: %s' % items,
-                                                    extra=self.LOGGER_EXTRA)
-
-                            elif daily_tran_qs.count() == 1:
-                                daily_tran_qs.update(avg_price=obj.avg_price,
-                                                     volume=obj.volume)
-                            else:
-                                if obj.avg_price > 0:
-                                    obj.save()
-
-                        except Exception as e:
-                            self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+            trans = [obj for lst in data for obj in lst if isinstance(obj, DailyTran)]
+            self.METRICS.add(fetched=len(data))
+
+            self.upsert(trans, fields=('avg_price', 'volume'), insert_condition=lambda obj: obj.avg_price > 0)
@@ -5,11 +5,12 @@ from typing import List
 
 import pandas as pd
 import urllib3
-from pandas import Series
 from requests import Response
 
 from apps.dailytrans.models import DailyTran
 from .abstract import AbstractApi
+from .store import skip_applied
+from .upsert import DailyTranUpserter
 from .utils import date_transfer
 
 urllib3.disable_warnings()
@@ -30,6 +31,9 @@ class Api(AbstractApi):
     ROC_FORMAT = False
     SEP = '/'
 
+    # 單次請求最多涵蓋 31 天，回傳資料依日期分組寫入
+    MAX_WINDOW_DAYS = 31
+
     # Filters
     START_DATE_FILTER = 'startYear=%s&startMonth=%s&startDay=%s'
     END_DATE_FILTER = 'endYear=%s&endMonth=%s&endDay=%s'
@@ -47,8 +51,8 @@ class Api(AbstractApi):
 
         product_name = dic.get('PRODUCTNAME')
         source_name = dic.get('ORGNAME')
-        product = self.PRODUCT_QS.filter(code=product_name).first()
-        source = self.SOURCE_QS.filter(name=source_name).first()
+        product = self.INDEX.get_product(product_name)
+        source = self.INDEX.get_source_by_name(source_name)
         if product and source:
             tran = DailyTran(
                 product=product,
@@ -59,11 +63,9 @@ class Api(AbstractApi):
             return tran
         else:
             if product_name and not product:
-                self.LOGGER.warning('Cannot Match Product: %s' % (product_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_name)
             if source_name and source_name != '當日平均價' and not source:
-                self.LOGGER.warning('Cannot Match Source: %s' % (source_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     # TODO: to be removed after the API is fixed
@@ -74,8 +76,8 @@ class Api(AbstractApi):
 
         product_name = "青香蕉下品(內銷)"
         source_name = dic.get('ORGNAME')
-        product = self.PRODUCT_QS.filter(code=product_name).first()
-        source = self.SOURCE_QS.filter(name=source_name).first()
+        product = self.INDEX.get_product(product_name)
+        source = self.INDEX.get_source_by_name(source_name)
         if product and source:
             tran = DailyTran(
                 product=product,
@@ -86,11 +88,9 @@ class Api(AbstractApi):
             return tran
         else:
             if product_name and not product:
-                self.LOGGER.warning('Cannot Match Product: %s' % (product_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_name)
             if source_name and source_name != '當日平均價' and not source:
-                self.LOGGER.warning('Cannot Match Source: %s' % (source_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     # TODO: to be removed after the API is fixed
@@ -118,8 +118,8 @@ class Api(AbstractApi):
         else:
             date = f'{YEAR}/{MONTH}/{PERIOD}'
 
-        product = self.PRODUCT_QS.filter(code=product_name).first()
-        source = self.SOURCE_QS.filter(name=source_name).first()
+        product = self.INDEX.get_product(product_name)
+        source = self.INDEX.get_source_by_name(source_name)
         if product and source:
             tran = DailyTran(
                 product=product,
@@ -130,20 +130,18 @@ class Api(AbstractApi):
             return tran
         else:
             if product_name and not product:
-                self.LOGGER.warning('Cannot Match Product: %s' % (product_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_name)
             if source_name and not source:
-                self.LOGGER.warning('Cannot Match Source: %s' % (source_name),
-                                    extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     @property
     def sources(self):
-        return self.SOURCE_QS.values_list('name', flat=True)
+        return [source.name for source in self.INDEX.sources]
 
     @property
     def products(self):
-        return self.PRODUCT_QS.values_list('code', flat=True)
+        return [product.code for product in self.INDEX.products]
 
     @staticmethod
     def _access_garlic_data_from_api(data: dict):
@@ -280,6 +278,13 @@ class Api(AbstractApi):
 
         return results
 
+    def count_rows(self, response: Response) -> int:
+        try:
+            return len(response.json().get('DATASET') or [])
+        except Exception:
+            return 0
+
+    @skip_applied
     def load(self, responses: List[Response]):
         """
         Load data from the API response.
@@ -307,6 +312,7 @@ class Api(AbstractApi):
             return
 
         data_api = self._convert_to_data_frame(data)
+        self.METRICS.add(fetched=len(data), matched=len(data_api))
 
         try:
             if not data_api.empty:
@@ -325,33 +331,19 @@ class Api(AbstractApi):
         # due to merge two data with date, product id and source id, there are two average prices data that are from
         # Api and DB respectively, we can compare these two and decide whether we should update or delete.
         condition = (data_merge['avg_price_x'] != data_merge['avg_price_y'])
+        data_changed = data_merge[condition].fillna('')
+
+        if data_changed.empty:
+            return
+
+        upserter = DailyTranUpserter(fields=('avg_price',), logger=self.LOGGER, logger_extra=self.LOGGER_EXTRA,
+                                     metrics=self.METRICS)
 
-        if not data_merge[condition].empty:
-            for _, value in data_merge[condition].fillna('').iterrows():
-                series: Series = value
-
-                try:
-                    # get the existed DailyTran record
-                    existed_tran = DailyTran.objects.get(id=int(series['id'] or 0))
-
-                    # We set the `not_updated` field to -999 to indicate that the record has been added manually
-                    # and should not be updated or deleted by the system.
-                    if series['avg_price_x'] and existed_tran.not_updated >= 0:
-                        # if the avg_price in API is not None, update the existed record
-                        self._update_data(series, existed_tran)
-                    else:
-                        if existed_tran.not_updated < 0:
-                            continue
-
-                        # if the avg_price in API is None, delete the existed record
-                        existed_tran.delete()
-                        self.LOGGER.warning(msg=f"The DailyTran data of the product: {series['product__code']} "
-                                                f"on {series['date'].strftime('%Y-%m-%d')} "
-                                                f"from source: {series['source__name']} with\n"
-                                                f"avg_price: {series['avg_price_y']}\n has been deleted.")
-                except Exception as e:
-                    # if no existed record is found, save the data as a new record
-                    self._save_new_data(series)
+        # if the avg_price in API is None, delete the existed records
+        upserter.delete(data_changed.loc[data_changed['avg_price_x'] == '', 'id'])
+
+        # if the avg_price in API is not None, update the existed records or save them as new records
+        upserter.upsert(self._convert_to_daily_trans(data_changed[data_changed['avg_price_x'] != '']))
 
     def _compare_data_from_api_and_db(self, data: pd.DataFrame) -> pd.DataFrame:
         """
@@ -377,7 +369,7 @@ class Api(AbstractApi):
         data['date'] = data['date'].apply(lambda x: datetime.datetime.strptime(x, '%Y/%m/%d').date())
 
         daily_tran_qs = DailyTran.objects.filter(
-            date=data['date'].iloc[0], product__type=self.TYPE, product__config=self.CONFIG
+            date__in=set(data['date']), product__type=self.TYPE, product__config=self.CONFIG
         )
         data_db = (
             pd.DataFrame(list(daily_tran_qs.values(*use_columns)))
@@ -387,42 +379,27 @@ class Api(AbstractApi):
 
         return data.merge(data_db, on=merged_by_columns, how='outer')
 
-    def _update_data(self, series: Series, existed_tran: DailyTran):
+    def _convert_to_daily_trans(self, data: pd.DataFrame) -> List[DailyTran]:
         """
-        Update the data in DB with the data from API.
+        Convert the merged data to `DailyTran` objects, products are fetched once for all rows.
 
-        :param series: data from API that convert to Pandas `Series`
-        :param existed_tran: the existed record in DB
+        :param data: merged DataFrame from `_compare_data_from_api_and_db`
         """
 
-        # update the existed record with the new data
-        # the avg_price_x is the value from API, it's newer than the value in DB
-        existed_tran.avg_price = series['avg_price_x']
-
-        existed_tran.save()
-        self.LOGGER.info(
-            msg=f"The data of the product: {series['product__code']} on"
-                f" {series['date'].strftime('%Y-%m-%d')} has been updated.")
+        products = {}
+        for product in self.MODEL.objects.filter(code__in=set(data['product__code'])):
+            products.setdefault(product.code, []).append(product)
 
-    def _save_new_data(self, series: Series):
-        """
-        Save the data in DB.
+        sources = {name: self.INDEX.get_source_by_name(name) for name in set(data['source__name'])}
 
-        :param series: data from API that convert to Pandas `Series`
-        """
-        # get the products from DB
-        products = self.MODEL.objects.filter(code=series['product__code'])
-
-        # get the source from DB
-        source = self.SOURCE_QS.get(name=series['source__name'])
-
-        # create a list of new records
-        new_trans_list = [DailyTran(
-            product=product,
-            source=source,
-            avg_price=series['avg_price_x'],
-            date=series['date']
-        ) for product in products]
-
-        # bulk create the new records
-        DailyTran.objects.bulk_create(new_trans_list)
+        return [
+            DailyTran(
+                product=product,
+                source=sources[series['source__name']],
+                avg_price=series['avg_price_x'],
+                date=series['date']
+            )
+            for _, series in data.iterrows()
+            if sources[series['source__name']]
+            for product in products.get(series['product__code'], [])
+        ]
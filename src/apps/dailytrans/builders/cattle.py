@@ -1,8 +1,8 @@
-from django.db.models import Q
 import datetime
 import json
 from .utils import date_transfer
 from .abstract import AbstractApi
+from .store import skip_applied
 from apps.dailytrans.models import DailyTran
 
 
@@ -29,7 +29,7 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         product_code = dic.get('item')
-        product = self.PRODUCT_QS.filter(code=product_code).first()
+        product = self.INDEX.get_product(product_code)
 
         if product:
             tran = DailyTran(
@@ -40,8 +40,7 @@ class Api(AbstractApi):
             return tran
         else:
             if not product:
-                self.LOGGER.warning('Cannot Match Product: "%s" In Dictionary %s'
-                                    % (product_code, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_code)
             return dic
 
     def request(self, date=None, code=None):
@@ -64,30 +63,14 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
 
         # data should look like [D, B, {}, C, {}...] after loads
-        for obj in data:
-            if isinstance(obj, DailyTran):
-                try:
-                    # update if exists
-                    daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                             & Q(product=obj.product))
-
-                    if daily_tran_qs.count() > 1:
-                        # log as duplicate
-                        items = str(daily_tran_qs.values_list('id', flat=True))
-
-                        self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                    elif daily_tran_qs.count() == 1:
-                        daily_tran_qs.update(avg_price=obj.avg_price)
-                    else:
-                        if obj.avg_price > 0:
-                            obj.save()
-
-                except Exception as e:
-                    self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for obj in data if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_price',), insert_condition=lambda obj: obj.avg_price > 0)
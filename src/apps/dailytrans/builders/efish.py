@@ -1,8 +1,8 @@
-from django.db.models import Q
 import datetime
 import json
 from .utils import date_transfer
 from .abstract import AbstractApi
+from .store import skip_applied
 from apps.dailytrans.models import DailyTran
 
 
@@ -41,7 +41,7 @@ class Api(AbstractApi):
         product_code = dic.get('fishId')
         # It should get the right product "Origin" object, not "Wholesale"
         # Remember to provide type_id to Api initialization to limit PRODUCT_QS
-        product = self.PRODUCT_QS.filter(code=product_code).first()
+        product = self.INDEX.get_product(product_code)
         if product:
             children = product.children()
             lst = []
@@ -54,7 +54,7 @@ class Api(AbstractApi):
                     self.LOGGER.exception('%s, dic: %s ' % (e, dic), extra=self.LOGGER_EXTRA)
             return lst
         else:
-            self.LOGGER.warning('Cannot Match Product: %s' % product_code, extra=self.LOGGER_EXTRA)
+            self.unmatched('Product', product_code)
             return dic
 
     def request(self, start_date=None, end_date=None, source=None, code=None, name=None):
@@ -94,31 +94,14 @@ class Api(AbstractApi):
 
         return self.get(url, headers=headers, verify=False)
 
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
 
         # data should look like [[A,B,C], [A,B,C], ..] after loads
-        for lst in data:
-            for obj in lst:
-                try:
-                    if isinstance(obj, DailyTran):
-                        # update if exists
-                        daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                                 & Q(product=obj.product))
-                        if obj.source:
-                            daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                        if daily_tran_qs.count() > 1:
-                            # log as duplicate
-                            items = str(daily_tran_qs.values_list('id', flat=True))
-                            self.LOGGER.warning('API Warning: Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                        elif daily_tran_qs.count() == 1:
-                            daily_tran_qs.update(avg_price=obj.avg_price)
-                        else:
-                            if obj.avg_price > 0:
-                                obj.save()
-                except Exception as e:
-                    self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for lst in data for obj in lst if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_price',), insert_condition=lambda obj: obj.avg_price > 0)
@@ -1,9 +1,9 @@
-from django.db.models import Q
 import datetime
 import json
 import math
 from .utils import date_transfer
 from .abstract import AbstractApi
+from .store import skip_applied
 from apps.dailytrans.models import DailyTran
 
 
@@ -60,11 +60,11 @@ class Api(AbstractApi):
         source_name = dic.get('市場名稱')
         if source_name:
             source_name = source_name.strip()
-        source = self.SOURCE_QS.filter_by_name(source_name).first()
+        source = self.INDEX.match_source(source_name)
 
         if source:
             lst = []
-            for obj in self.PRODUCT_QS.all():
+            for obj in self.INDEX.products:
                 if obj.track_item:
                     try:
                         tran = create_tran(obj, source)
@@ -74,8 +74,7 @@ class Api(AbstractApi):
             return lst
         else:
             # log as cannot find source item
-            self.LOGGER.warning('Cannot Match Source: "%s" In Dictionary %s'
-                                % (source_name, dic), extra=self.LOGGER_EXTRA)
+            self.unmatched('Source', source_name)
             return dic
 
     def request(self, date, source=None):
@@ -97,37 +96,30 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    def _is_valid(self, obj):
+        """
+        判斷新資料是否需要新增
+        """
+
+        # 宜蘭縣、新竹縣、苗栗縣、花蓮縣155公斤以上已納入規格豬，這裡不進以排除重複計算
+        if obj.product_id == 70005 and obj.source_id in [40007, 40009, 40010, 40017]:
+            return False
+
+        if (obj.volume or 0) + (obj.avg_price or 0) + (obj.avg_weight or 0) > 0:
+            return True
+
+        if not math.isclose((obj.volume or 0) + (obj.avg_price or 0) + (obj.avg_weight or 0), 0):
+            self.LOGGER.warning('Find not valid hog DailyTran item: %s' % str(obj), extra=self.LOGGER_EXTRA)
+
+        return False
+
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
         # data should look like [[A,B,C], [A,B,C], ..] after loads
-        for lst in data:
-            for obj in lst:
-                try:
-                    if isinstance(obj, DailyTran):
-                        # update if exists
-                        daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                                 & Q(product=obj.product))
-                        if obj.source:
-                            daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                        if daily_tran_qs.count() > 1:
-                            # log as duplicate
-                            items = str(daily_tran_qs.values_list('id', flat=True))
-                            self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                        elif daily_tran_qs.count() == 1:
-                            daily_tran_qs.update(avg_price=obj.avg_price,
-                                                 volume=obj.volume,
-                                                 avg_weight=obj.avg_weight)
-                        else:
-                            # 宜蘭縣、新竹縣、苗栗縣、花蓮縣155公斤以上已納入規格豬，這裡不進以排除重複計算
-                            if obj.product.id == 70005 and obj.source.id in [40007, 40009, 40010, 40017]:
-                                pass
-                            elif (obj.volume or 0) + (obj.avg_price or 0) + (obj.avg_weight or 0) > 0:
-                                obj.save()
-                            elif not math.isclose(obj.volume + obj.avg_price + obj.avg_weight, 0):
-                                self.LOGGER.warning('Find not valid hog DailyTran item: %s' % str(obj), extra=self.LOGGER_EXTRA)
-                except Exception as e:
-                    self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for lst in data for obj in lst if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_price', 'volume', 'avg_weight'), insert_condition=self._is_valid)
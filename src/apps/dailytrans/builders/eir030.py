@@ -5,6 +5,8 @@ import pandas as pd
 
 from apps.dailytrans.models import DailyTran
 from .abstract import AbstractApi
+from .store import skip_applied
+from .upsert import DailyTranUpserter
 from .utils import date_transfer
 
 
@@ -15,6 +17,12 @@ class Api(AbstractApi):
     ROC_FORMAT = True
     SEP = '.'
 
+    # 單次請求最多涵蓋 31 天，回傳資料依日期分組寫入
+    MAX_WINDOW_DAYS = 31
+
+    # data.moa.gov.tw 開放資料單次最多回傳 1000 筆，超過的資料會被截斷
+    MAX_ROWS = 1000
+
     # Filters
     START_DATE_FILTER = 'StartDate=%s'
     END_DATE_FILTER = 'EndDate=%s'
@@ -32,9 +40,9 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         product_code = dic.get('product__code')
-        products = self.PRODUCT_QS.filter(code=product_code).all()
+        products = self.INDEX.get_products(product_code)
         source_name = dic.get('source__name')
-        source = self.SOURCE_QS.filter_by_name(source_name).first()
+        source = self.INDEX.match_source(source_name)
         if products and source:
             trans = [
                 DailyTran(
@@ -51,11 +59,9 @@ class Api(AbstractApi):
             return trans
         else:
             if not products:
-                self.LOGGER.warning('Cannot Match Product: "%s" In Dictionary %s'
-                                    % (product_code, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_code)
             if not source:
-                self.LOGGER.warning('Cannot Match Source: "%s" In Dictionary %s'
-                                    % (source_name, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     def request(self, start_date=None, end_date=None, source=None, code=None, tc_type=None):
@@ -96,6 +102,13 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    def count_rows(self, response):
+        try:
+            return len(json.loads(response.text))
+        except Exception:
+            return 0
+
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
@@ -106,7 +119,9 @@ class Api(AbstractApi):
         data = pd.DataFrame(data,
                             columns=['上價', '中價', '下價', '平均價', '交易量', '交易日期', '作物代號', '市場名稱',
                                      '種類代碼'])
+        fetched = len(data)
         data = data[data['作物代號'].isin(self.target_items)]
+        self.METRICS.add(fetched=fetched, matched=len(data))
 
         try:
             if not data.empty:
@@ -121,24 +136,17 @@ class Api(AbstractApi):
                              data_merge['low_price_x'] != data_merge['low_price_y']) | (
                              data_merge['mid_price_x'] != data_merge['mid_price_y']) | (
                              data_merge['volume_x'] != data_merge['volume_y']))
-        if not data_merge[condition].empty:
-            for _, value in data_merge[condition].fillna('').iterrows():
-                try:
-                    existed_tran = DailyTran.objects.get(id=int(value['id'] or 0))
-                    if value['avg_price_x']:
-                        self._update_data(value, existed_tran)
-                    else:
-                        existed_tran.delete()
-                        self.LOGGER.warning(msg=f"The DailyTran data of the product: {value['product__code']} "
-                                                f"on {value['date'].strftime('%Y-%m-%d')} "
-                                                f"from source: {value['source__name']} with\n"
-                                                f"up_price: {value['up_price_y']}\n"
-                                                f"mid_price: {value['mid_price_y']}\n"
-                                                f"low_price: {value['low_price_y']}\n"
-                                                f"avg_price: {value['avg_price_y']}\n"
-                                                f"volume: {value['volume_y']} has been deleted.")
-                except Exception as e:
-                    self._save_new_data(value)
+        data_changed = data_merge[condition].fillna('')
+
+        if data_changed.empty:
+            return
+
+        upserter = DailyTranUpserter(fields=('up_price', 'mid_price', 'low_price', 'avg_price', 'volume'),
+                                     logger=self.LOGGER, logger_extra=self.LOGGER_EXTRA, metrics=self.METRICS)
+
+        # 平均價為空代表 API 已無此筆資料，刪除既有資料
+        upserter.delete(data_changed.loc[data_changed['avg_price_x'] == '', 'id'])
+        upserter.upsert(self._convert_to_daily_trans(data_changed[data_changed['avg_price_x'] != '']))
 
     def _compare_data_from_api_and_db(self, data: pd.DataFrame):
         columns = {
@@ -159,7 +167,8 @@ class Api(AbstractApi):
         data['source__name'] = data['source__name'].str.replace('台', '臺')
         data['product__code'] = data['product__code'].astype(str)
 
-        data_db = DailyTran.objects.filter(date=data['date'].iloc[0], product__type=1, product__config=self.CONFIG)
+        data_db = DailyTran.objects.filter(date__in=set(data['date']), product__type=1,
+                                          product__config=self.CONFIG)
         data_db = pd.DataFrame(list(data_db.values('id', 'product__id', 'product__code', 'up_price', 'mid_price',
                                                    'low_price', 'avg_price', 'volume', 'date', 'source__name'))) \
             if data_db else pd.DataFrame(columns=['id', 'product__id', 'product__code', 'up_price', 'mid_price',
@@ -167,28 +176,24 @@ class Api(AbstractApi):
 
         return data.merge(data_db, on=['date', 'product__code', 'source__name'], how='outer')
 
-    def _update_data(self, value, existed_tran):
-        existed_tran.up_price = value['up_price_x']
-        existed_tran.mid_price = value['mid_price_x']
-        existed_tran.low_price = value['low_price_x']
-        existed_tran.avg_price = value['avg_price_x']
-        existed_tran.volume = value['volume_x']
-        existed_tran.save()
-        self.LOGGER.info(
-            msg=f"The data of the product: {value['product__code']} on"
-                f" {value['date'].strftime('%Y-%m-%d')} has been updated.")
-
-    def _save_new_data(self, value):
-        products = self.MODEL.objects.filter(code=value['product__code'])
-        source = self.SOURCE_QS.filter_by_name(value['source__name']).first()
-        new_trans = [DailyTran(
-            product=product,
-            source=source,
-            up_price=value['up_price_x'],
-            mid_price=value['mid_price_x'],
-            low_price=value['low_price_x'],
-            avg_price=value['avg_price_x'],
-            volume=value['volume_x'],
-            date=value['date']
-        ) for product in products]
-        DailyTran.objects.bulk_create(new_trans)
+    def _convert_to_daily_trans(self, data: pd.DataFrame):
+        products = {}
+        for product in self.MODEL.objects.filter(code__in=set(data['product__code'])):
+            products.setdefault(product.code, []).append(product)
+
+        sources = {name: self.INDEX.match_source(name) for name in set(data['source__name'])}
+
+        return [
+            DailyTran(
+                product=product,
+                source=sources[value['source__name']],
+                up_price=value['up_price_x'],
+                mid_price=value['mid_price_x'],
+                low_price=value['low_price_x'],
+                avg_price=value['avg_price_x'],
+                volume=value['volume_x'],
+                date=value['date']
+            )
+            for _, value in data.iterrows()
+            for product in products.get(value['product__code'], [])
+        ]
@@ -1,6 +1,5 @@
 import datetime
 import json
-import time
 from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
@@ -9,10 +8,12 @@ from urllib.parse import urlparse, parse_qs
 import pandas as pd
 from bs4 import BeautifulSoup
 from bs4.element import ResultSet
-from requests import Response, post
+from requests import Response
 
 from apps.dailytrans.models import DailyTran
 from .abstract import AbstractApi
+from .store import skip_applied
+from .upsert import DailyTranUpserter
 from .utils import date_transfer
 
 
@@ -23,6 +24,12 @@ class Api(AbstractApi):
     ROC_FORMAT = True
     SEP = ''
 
+    # 單次請求最多涵蓋 31 天，回傳資料依日期分組寫入
+    MAX_WINDOW_DAYS = 31
+
+    # data.moa.gov.tw 開放資料單次最多回傳 1000 筆，超過的資料會被截斷
+    MAX_ROWS = 1000
+
     # Filters
     START_DATE_FILTER = 'StartDate=%s'
     END_DATE_FILTER = 'EndDate=%s'
@@ -41,9 +48,9 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         product_code = dic.get('品種代碼')
-        product = self.PRODUCT_QS.filter(code=product_code).first()
+        product = self.INDEX.get_product(product_code)
         source_name = dic.get('市場名稱')
-        source = self.SOURCE_QS.filter_by_name(source_name).first()
+        source = self.INDEX.match_source(source_name)
         if product and source:
             tran = DailyTran(
                 product=product,
@@ -58,11 +65,9 @@ class Api(AbstractApi):
             return tran
         else:
             if not product and dic.get('魚貨名稱') != "休市":
-                self.LOGGER.warning('Cannot Match Product: "%s" In Dictionary %s'
-                                    % (product_code, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_code)
             if not source:
-                self.LOGGER.warning('Cannot Match Source: "%s" In Dictionary %s'
-                                    % (source_name, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     def request(self, start_date=None, end_date=None, source=None, code=None, name=None):
@@ -104,6 +109,13 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    def count_rows(self, response):
+        try:
+            return len(json.loads(response.text))
+        except Exception:
+            return 0
+
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
@@ -115,7 +127,9 @@ class Api(AbstractApi):
         data = pd.DataFrame(data,
                             columns=['上價', '中價', '下價', '平均價', '交易量', '交易日期', '品種代碼', '市場名稱',
                                      '魚貨名稱'])
+        fetched = len(data)
         data = data[data['品種代碼'].isin(self.target_items)]
+        self.METRICS.add(fetched=fetched, matched=len(data))
         try:
             if not data.empty:
                 self._access_data_from_api(data)
@@ -131,28 +145,17 @@ class Api(AbstractApi):
                 (data_merge['mid_price_x'] != data_merge['mid_price_y']) |
                 (data_merge['volume_x'] != data_merge['volume_y'])
         )
+        data_changed = data_merge[condition].fillna('')
+
+        if data_changed.empty:
+            return
+
+        upserter = DailyTranUpserter(fields=('up_price', 'mid_price', 'low_price', 'avg_price', 'volume'),
+                                     logger=self.LOGGER, logger_extra=self.LOGGER_EXTRA, metrics=self.METRICS)
 
-        if not data_merge[condition].empty:
-            for _, value in data_merge[condition].fillna('').iterrows():
-                try:
-                    existed_tran = DailyTran.objects.get(id=int(value['id'] or 0))
-
-                    if value['avg_price_x']:
-                        self._update_data(value, existed_tran)
-                    else:
-                        existed_tran.delete()
-                        self.LOGGER.warning(msg=f"The DailyTran data of the product: {value['product__code']} "
-                                                f"on {value['date'].strftime('%Y-%m-%d')} "
-                                                f"from source: {value['source__name']} with\n"
-                                                f"up_price: {value['up_price_y']}\n"
-                                                f"mid_price: {value['mid_price_y']}\n"
-                                                f"low_price: {value['low_price_y']}\n"
-                                                f"avg_price: {value['avg_price_y']}\n"
-                                                f"volume: {value['volume_y']} has been deleted.")
-                except DailyTran.DoesNotExist:
-                    self._save_new_data(value)
-                except Exception as e:
-                    self.LOGGER.exception(f'exception: {e}', extra=self.LOGGER_EXTRA)
+        # 平均價為空代表 API 已無此筆資料，刪除既有資料
+        upserter.delete(data_changed.loc[data_changed['avg_price_x'] == '', 'id'])
+        upserter.upsert(self._convert_to_daily_trans(data_changed[data_changed['avg_price_x'] != '']))
 
     def _compare_data_from_api_and_db(self, data: pd.DataFrame):
         columns = {
@@ -172,7 +175,8 @@ class Api(AbstractApi):
         data['source__name'] = data['source__name'].str.replace('台', '臺')
         data['product__code'] = data['product__code'].astype(str)
 
-        data_db = DailyTran.objects.filter(date=data['date'].iloc[0], product__type=1, product__config=self.CONFIG)
+        data_db = DailyTran.objects.filter(date__in=set(data['date']), product__type=1,
+                                          product__config=self.CONFIG)
         data_db = pd.DataFrame(list(data_db.values('id', 'product__id', 'product__code', 'up_price', 'mid_price',
                                                    'low_price', 'avg_price', 'volume', 'date', 'source__name'))) \
             if data_db else pd.DataFrame(columns=['id', 'product__id', 'product__code', 'up_price', 'mid_price',
@@ -180,32 +184,27 @@ class Api(AbstractApi):
 
         return data.merge(data_db, on=['date', 'product__code', 'source__name'], how='outer')
 
-    def _update_data(self, value, existed_tran):
-        existed_tran.up_price = value['up_price_x']
-        existed_tran.mid_price = value['mid_price_x']
-        existed_tran.low_price = value['low_price_x']
-        existed_tran.avg_price = value['avg_price_x']
-        existed_tran.volume = value['volume_x']
-        existed_tran.save()
-        self.LOGGER.info(
-            msg=f"The data of the product: {value['product__code']} on"
-                f" {value['date'].strftime('%Y-%m-%d')} has been updated."
-        )
+    def _convert_to_daily_trans(self, data: pd.DataFrame):
+        products = {}
+        for product in self.MODEL.objects.filter(code__in=set(data['product__code'])):
+            products.setdefault(product.code, []).append(product)
 
-    def _save_new_data(self, value):
-        products = self.MODEL.objects.filter(code=value['product__code'])
-        source = self.SOURCE_QS.filter_by_name(value['source__name']).first()
-        new_trans = [DailyTran(
-            product=product,
-            source=source,
-            up_price=value['up_price_x'],
-            mid_price=value['mid_price_x'],
-            low_price=value['low_price_x'],
-            avg_price=value['avg_price_x'],
-            volume=value['volume_x'],
-            date=value['date']
-        ) for product in products]
-        DailyTran.objects.bulk_create(new_trans)
+        sources = {name: self.INDEX.match_source(name) for name in set(data['source__name'])}
+
+        return [
+            DailyTran(
+                product=product,
+                source=sources[value['source__name']],
+                up_price=value['up_price_x'],
+                mid_price=value['mid_price_x'],
+                low_price=value['low_price_x'],
+                avg_price=value['avg_price_x'],
+                volume=value['volume_x'],
+                date=value['date']
+            )
+            for _, value in data.iterrows()
+            for product in products.get(value['product__code'], [])
+        ]
 
 
 class HTMLParser:
@@ -415,7 +414,6 @@ class ScrapperApi(Api):
     """
 
     MAX_RETRY = 3
-    SLEEP_TIME = 3
     URL = 'https://efish.fa.gov.tw/efish/statistics/daysinglemarketmultifish.htm'
     HEADERS = {
         'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -542,28 +540,10 @@ class ScrapperApi(Api):
 
     def _make_request(self, url, params, headers) -> Response:
         """
-        發送 POST 請求，並回傳 response 物件，若發生錯誤則嘗試重新連線
+        發送 POST 請求，並回傳 response 物件，若發生錯誤則由 Fetcher 重試
         """
 
-        retry_count = 0
-
-        while retry_count < self.MAX_RETRY:
-            try:
-                retry_count += 1
-                resp = post(url, params=params, headers=headers)
-                self.LOGGER_EXTRA['request_url'] = resp.request.url
-
-                if resp.status_code != 200:
-                    self.LOGGER.warning(f'Connection refused, retry {retry_count} time', extra=self.LOGGER_EXTRA)
-                    time.sleep(self.SLEEP_TIME)
-
-                    continue
-
-                return resp
-            except Exception as e:
-                self.LOGGER.exception(f'exception: {e}, retry {retry_count} time', extra=self.LOGGER_EXTRA)
-
-        return Response()
+        return self.fetch('POST', url, params=params, headers=headers, max_retry=self.MAX_RETRY)
 
     def _convert_to_dataframe(self, responses: List[Response]) -> pd.DataFrame:
         for resp in responses:
@@ -593,6 +573,7 @@ class ScrapperApi(Api):
         with ThreadPoolExecutor(max_workers=6) as executor:
             return list(executor.map(self._make_request, self.urls_list, self.params_list, self.headers_list))
 
+    @skip_applied
     def loads(self, responses: List[Response]):
         df = self._convert_to_dataframe(responses)
 
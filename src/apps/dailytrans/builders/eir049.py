@@ -2,10 +2,10 @@ import datetime
 import json
 import re
 
-from django.db.models import Q
 
 from apps.dailytrans.models import DailyTran
 from .abstract import AbstractApi
+from .store import skip_applied
 from .utils import date_transfer
 
 
@@ -29,8 +29,8 @@ class Api(AbstractApi):
 
         def create_tran(obj):
             if '公' in dic.get(obj.code):
-                obj_male = self.PRODUCT_QS.get(code=f'{obj.code}公')
-                obj_female = self.PRODUCT_QS.get(code=f'{obj.code}母')
+                obj_male = self.INDEX.get_product(f'{obj.code}公')
+                obj_female = self.INDEX.get_product(f'{obj.code}母')
                 matches = re.findall(r'(?P<label>\w+)：(?P<value>\d+\.\d+)', dic.get(obj.code))
                 prices = {}
                 for label, value in matches:
@@ -59,7 +59,7 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         lst = []
-        for obj in self.PRODUCT_QS.all():
+        for obj in self.INDEX.products:
             if obj.track_item and dic.get(obj.code):
                 try:
                     trans = create_tran(obj)
@@ -101,30 +101,13 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
         # data should look like [[A,B,C], [A,B,C], ..] after loads
-        for lst in data:
-            for obj in lst:
-                if isinstance(obj, DailyTran):
-                    try:
-                        # update if exists
-                        daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                                 & Q(product=obj.product))
-                        if obj.source:
-                            daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                        if daily_tran_qs.count() > 1:
-                            # log as duplicate
-                            items = str(daily_tran_qs.values_list('id', flat=True))
-                            self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                        elif daily_tran_qs.count() == 1:
-                            daily_tran_qs.update(avg_price=obj.avg_price)
-                        else:
-                            obj.save()
-
-                    except Exception as e:
-                        self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for lst in data for obj in lst if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_price',))
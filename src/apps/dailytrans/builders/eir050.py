@@ -1,8 +1,8 @@
-from django.db.models import Q
 import datetime
 import json
 from .utils import date_transfer
 from .abstract import AbstractApi
+from .store import skip_applied
 from apps.dailytrans.models import DailyTran
 
 
@@ -42,7 +42,7 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         lst = []
-        for obj in self.PRODUCT_QS.all():
+        for obj in self.INDEX.products:
             if obj.track_item and dic.get(obj.code):
                 try:
                     tran = create_tran(obj)
@@ -84,29 +84,13 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
         # data should look like [[A,B,C], [A,B,C], ..] after loads
-        for lst in data:
-            for obj in lst:
-                if isinstance(obj, DailyTran):
-                    try:
-                        # update if exists
-                        daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                                 & Q(product=obj.product))
-                        if obj.source:
-                            daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                        if daily_tran_qs.count() > 1:
-                            # log as duplicate
-                            items = str(daily_tran_qs.values_list('id', flat=True))
-                            self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                        elif daily_tran_qs.count() == 1:
-                            daily_tran_qs.update(avg_price=obj.avg_price)
-                        else:
-                            obj.save()
-                    except Exception as e:
-                        self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for lst in data for obj in lst if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_price',))
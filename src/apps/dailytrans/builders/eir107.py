@@ -1,8 +1,8 @@
-from django.db.models import Q
 import datetime
 import json
 from .utils import date_transfer
 from .abstract import AbstractApi
+from .store import skip_applied
 from apps.dailytrans.models import DailyTran
 
 
@@ -35,9 +35,9 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         product_code = dic.get('productID')
-        product = self.PRODUCT_QS.filter(code=product_code).first()
+        product = self.INDEX.get_product(product_code)
         source_name = dic.get('shortName')
-        source = self.SOURCE_QS.filter_by_name(source_name).first()
+        source = self.INDEX.match_source(source_name)
         if product and source:
             tran = DailyTran(
                 product=product,
@@ -50,11 +50,9 @@ class Api(AbstractApi):
             return tran
         else:
             if not product:
-                self.LOGGER.warning('Cannot Match Product: "%s" In Dictionary %s'
-                                    % (product_code, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_code)
             if not source:
-                self.LOGGER.warning('Cannot Match Source: "%s" In Dictionary %s'
-                                    % (source_name, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Source', source_name)
             return dic
 
     def request(self, date=None, source=None, code=None):
@@ -94,30 +92,13 @@ class Api(AbstractApi):
 
         return self.get(url)
 
+    @skip_applied
     def load(self, response):
         data = []
         if response.text:
             data = json.loads(response.text, object_hook=self.hook)
         # data should look like [D, B, {}, C, {}...] after loads
-        for obj in data:
-            if isinstance(obj, DailyTran):
-                try:
-                    # update if exists
-                    daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                             & Q(product=obj.product))
-                    if obj.source:
-                        daily_tran_qs = daily_tran_qs.filter(source=obj.source)
-
-                    if daily_tran_qs.count() > 1:
-                        # log as duplicate
-                        items = str(daily_tran_qs.values_list('id', flat=True))
-                        self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                    elif daily_tran_qs.count() == 1:
-                        daily_tran_qs.update(avg_weight=obj.avg_weight,
-                                             avg_price=obj.avg_price,
-                                             volume=obj.volume)
-                    else:
-                        obj.save()
-                except Exception as e:
-                    self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        trans = [obj for obj in data if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
+
+        self.upsert(trans, fields=('avg_weight', 'avg_price', 'volume'))
@@ -0,0 +1,201 @@
+import datetime
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class Fetcher(object):
+    """
+    所有 builder 共用的 HTTP 連線層:
+    - 以單一 requests.Session 重複使用 keep-alive 連線(connection pool)
+    - 每個請求都有 timeout
+    - 失敗時以指數退避(exponential backoff) + 隨機抖動(jitter)重試，伺服器有回傳 Retry-After 時以其為準
+    - 依 host 限制同時連線數，避免大量請求打爆 data.moa.gov.tw 等資料來源
+    - `map` 可一次送出整個日期區間的請求，並依完成順序取得結果
+    """
+
+    TIMEOUT = (10, 60)
+    MAX_RETRY = 5
+    BACKOFF_BASE = 2
+    BACKOFF_MAX = 60
+    MAX_WORKERS = 8
+    HOST_CONCURRENCY = {}
+    DEFAULT_HOST_CONCURRENCY = 2
+
+    # 只有以下狀態碼或連線失敗時才重試，其他錯誤(例如 404)重試也不會有不同結果
+    RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, **options):
+        """
+        :param options: 覆寫預設值，key 與 settings.DAILYTRAN_BUILDER_HTTP 相同(TIMEOUT, MAX_RETRY etc.)
+        """
+
+        for key, value in options.items():
+            if not hasattr(self, key):
+                raise NotImplementedError('Unknown fetcher option %s' % key)
+            setattr(self, key, value)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.MAX_WORKERS, pool_maxsize=self.MAX_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._host_semaphores = {}
+
+    def _semaphore(self, url):
+        host = urlparse(url).netloc
+
+        with self._lock:
+            if host not in self._host_semaphores:
+                limit = self.HOST_CONCURRENCY.get(host, self.DEFAULT_HOST_CONCURRENCY)
+                self._host_semaphores[host] = threading.BoundedSemaphore(limit)
+
+            return self._host_semaphores[host]
+
+    def backoff(self, retry_count, response=None):
+        """
+        計算第 `retry_count` 次重試前需等待的秒數
+
+        :param retry_count: int，從 1 開始
+        :param response: requests.Response，若有 Retry-After header 則以其為準
+        """
+
+        retry_after = self._parse_retry_after(response)
+
+        if retry_after is not None:
+            return min(retry_after, self.BACKOFF_MAX)
+
+        # full jitter: 0 ~ min(BACKOFF_MAX, BACKOFF_BASE * 2 ^ (retry_count - 1))
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (retry_count - 1)))
+
+    @staticmethod
+    def _parse_retry_after(response):
+        if response is None:
+            return None
+
+        value = response.headers.get('Retry-After')
+
+        if not value:
+            return None
+
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+
+        # Retry-After 也可能是 HTTP-date 格式
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        now = datetime.datetime.now(retry_at.tzinfo)
+
+        return max((retry_at - now).total_seconds(), 0)
+
+    def request(self, method, url, logger=None, logger_extra=None, max_retry=None, **kwargs):
+        """
+        發送請求，失敗時根據狀況重試
+
+        :param method: str，'GET'、'POST' etc.
+        :param url: str
+        :param logger: logging.Logger，重試時寫入 log
+        :param logger_extra: dict，寫入 log 時的 extra 參數，`request_url` 會被更新為實際的請求網址
+        :param max_retry: int，覆寫預設的最大重試次數
+        :param kwargs: 傳給 requests.Session.request 的參數(params, headers, verify etc.)
+        :return: requests.Response，重試次數用完仍連線失敗時回傳空的 Response(status_code 為 None)
+        """
+
+        logger = logger or logging.getLogger('aprp')
+        logger_extra = logger_extra if logger_extra is not None else {}
+        max_retry = self.MAX_RETRY if max_retry is None else max_retry
+        kwargs.setdefault('timeout', self.TIMEOUT)
+
+        semaphore = self._semaphore(url)
+        response = requests.Response()
+        retry_count = 0
+
+        while True:
+            with semaphore:
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    logger_extra['request_url'] = response.request.url
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    response = requests.Response()
+                    logger.warning(f'Connection error: {e}', extra=logger_extra)
+
+            if response.status_code == 200:
+                return response
+
+            if response.status_code is not None and response.status_code not in self.RETRY_STATUS:
+                logger.error(f'Request failed, status code: {response.status_code}', extra=logger_extra)
+                return response
+
+            retry_count += 1
+
+            if retry_count > max_retry:
+                return response
+
+            wait = self.backoff(retry_count, response)
+            logger.error(
+                f'Connection Refused, Retry {retry_count} Time After {wait:.1f} Seconds',
+                extra=logger_extra,
+            )
+
+            # 等待時不佔用 host 的連線數
+            time.sleep(wait)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def map(self, func, iterable, max_workers=None):
+        """
+        以多執行緒執行 `func(item)`，並依完成順序回傳 (item, result)
+        同一 host 的同時連線數仍受 HOST_CONCURRENCY 限制
+
+        :param func: callable，通常為 builder 的 request 方法
+        :param iterable: Iterable，傳給 func 的參數
+        :param max_workers: int，預設為 MAX_WORKERS
+        :return: Generator[Tuple[item, result]]，func 發生例外時 result 為該例外
+        """
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS) as executor:
+            futures = {executor.submit(func, item): item for item in iterable}
+
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+
+                yield futures[future], result
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    取得 process 共用的 Fetcher，設定取自 settings.DAILYTRAN_BUILDER_HTTP
+    """
+
+    global _fetcher
+
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher(**getattr(settings, 'DAILYTRAN_BUILDER_HTTP', {}))
+
+        return _fetcher
@@ -0,0 +1,83 @@
+from types import MappingProxyType
+
+
+class LookupIndex(object):
+    """
+    於 builder 初始化時一次取出所有品項與來源，建立不可變的查詢索引，
+    讓 hook 解析 API 回傳資料時不需要再對資料庫做任何查詢。
+
+    查詢結果與原本的 QuerySet 寫法一致:
+    - get_product(code)         -> PRODUCT_QS.filter(code=code).first()
+    - get_products(code)        -> PRODUCT_QS.filter(code=code)
+    - get_source_by_code(code)  -> SOURCE_QS.filter(code=code).first()
+    - get_source_by_name(name)  -> SOURCE_QS.filter(name=name).first()
+    - match_source(name)        -> SOURCE_QS.filter_by_name(name).first()
+    """
+
+    def __init__(self, products, sources):
+        """
+        :param products: Iterable[AbstractProduct]，需依 id 排序
+        :param sources: Iterable[Source]，需依 id 排序
+        """
+
+        self.products = tuple(products)
+        self.sources = tuple(sources)
+
+        products_by_code = {}
+        for product in self.products:
+            products_by_code.setdefault(product.code, []).append(product)
+
+        sources_by_code = {}
+        sources_by_name = {}
+        for source in self.sources:
+            sources_by_code.setdefault(source.code, source)
+            sources_by_name.setdefault(source.name, []).append(source)
+
+        self._products_by_code = MappingProxyType({k: tuple(v) for k, v in products_by_code.items()})
+        self._sources_by_code = MappingProxyType(sources_by_code)
+        self._sources_by_name = MappingProxyType({k: tuple(v) for k, v in sources_by_name.items()})
+
+        # 將不重複的品項 code 欄位取出來(code 若無對應代碼則可能與品項名稱相同(或是空): 柿子-甜柿(Z4), 柳橙(柳橙) etc.)
+        self.codes = frozenset(self._products_by_code.keys())
+
+    def get_products(self, code):
+        return self._products_by_code.get(code, ())
+
+    def get_product(self, code):
+        products = self.get_products(code)
+
+        return products[0] if products else None
+
+    def get_source_by_code(self, code):
+        return self._sources_by_code.get(code)
+
+    def get_source_by_name(self, name):
+        sources = self._sources_by_name.get(name)
+
+        return sources[0] if sources else None
+
+    def match_source(self, name, type_id=None):
+        """
+        與 `SourceQuerySet.filter_by_name` 相同的比對邏輯: 先以名稱完全比對，找不到時再比對 alias(不分大小寫，包含即可)
+
+        :param name: 來源名稱，'台' 會被轉換為 '臺'
+        :param type_id: 若有傳入則只比對該供應階段的來源
+        """
+
+        if not isinstance(name, str):
+            raise TypeError
+
+        name = name.replace('台', '臺')
+        sources = [
+            source for source in self._sources_by_name.get(name, ())
+            if type_id is None or source.type_id == type_id
+        ]
+
+        if not sources:
+            lower_name = name.lower()
+            sources = [
+                source for source in self.sources
+                if lower_name in (source.alias or '').lower() and (type_id is None or source.type_id == type_id)
+            ]
+
+        return sources[0] if sources else None
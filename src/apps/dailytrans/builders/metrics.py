@@ -0,0 +1,191 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+db_logger = logging.getLogger('aprp')
+
+_local = threading.local()
+
+
+class BuilderMetrics(object):
+    """
+    單次 `director` 執行期間的統計數據，執行結束後寫入一筆 BuilderRun，取代逐筆寫入 log 的做法:
+    - fetched/matched/unmatched: API 回傳筆數、成功對應品項及來源的筆數、無法對應的筆數
+    - inserted/updated/deleted/unchanged/skipped: 寫入資料庫的結果
+    - requests/bytes 及每次請求的耗時: HTTP 請求數、下載量及延遲
+    - stages: 各階段累計耗時(秒)
+    - unmatched_codes: 無法對應的品項/來源，以 'Product: LA1' 的形式累計次數
+
+    Fetcher 會以多執行緒送出請求，所有寫入都需取得 lock
+    """
+
+    COUNTERS = ('fetched', 'matched', 'unmatched', 'inserted', 'updated', 'deleted', 'unchanged', 'skipped',
+                'requests', 'bytes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.latencies = []
+        self.stages = Counter()
+        self.unmatched_codes = Counter()
+        self.reported_codes = Counter()
+        self.type_code = None
+        # 由 `director` 建立時為 job 名稱
+        self.job = None
+        # 是否在另一個 `director` 中執行，巢狀執行的數據會併入外層，只由最外層寫入 BuilderRun
+        self.nested = False
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                if name not in self.COUNTERS:
+                    raise NotImplementedError('Counter %s not supported' % name)
+
+                self.counters[name] += value or 0
+
+    def record_response(self, response, elapsed):
+        """
+        :param response: requests.Response
+        :param elapsed: float，請求耗時(秒，含重試)
+        """
+
+        try:
+            size = len(response.content or b'')
+        except Exception:
+            size = 0
+
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['bytes'] += size
+            self.latencies.append(elapsed)
+            self.stages['http'] += elapsed
+
+    def record_unmatched(self, kind, value):
+        """
+        :param kind: str，Product 或 Source
+        :param value: 無法對應的代碼或名稱
+        """
+
+        with self._lock:
+            self.counters['unmatched'] += 1
+            self.unmatched_codes['%s: %s' % (kind, value)] += 1
+
+    def record_upsert(self, result, elapsed=0):
+        """
+        :param result: UpsertResult
+        :param elapsed: float，寫入資料庫耗時(秒)
+        """
+
+        self.add(**result._asdict())
+
+        with self._lock:
+            self.stages['upsert'] += elapsed
+
+    def merge(self, other):
+        with self._lock:
+            self.counters.update(other.counters)
+            self.latencies.extend(other.latencies)
+            self.stages.update(other.stages)
+            self.unmatched_codes.update(other.unmatched_codes)
+            self.reported_codes.update(other.reported_codes)
+            self.type_code = self.type_code or other.type_code
+
+    def percentile(self, q):
+        """
+        以 nearest-rank 計算請求耗時的百分位數
+
+        :param q: 0 ~ 100
+        :return: float，沒有請求時回傳 None
+        """
+
+        if not self.latencies:
+            return None
+
+        latencies = sorted(self.latencies)
+        index = max(int(round(q / 100 * len(latencies))) - 1, 0)
+
+        return latencies[min(index, len(latencies) - 1)]
+
+    @staticmethod
+    def unmatched_summary(codes, limit=50):
+        return ', '.join('%s x%d' % (code, count) for code, count in codes.most_common(limit))
+
+    def save(self, job, start_date=None, end_date=None, success=False, duration=None, msg=''):
+        """
+        寫入一筆 BuilderRun，並將無法對應的品項/來源彙整成一筆 log(巢狀執行時已由內層寫入的不再重複寫入)
+
+        :param job: str，direct function 的路徑
+        :param duration: datetime.timedelta
+        :return: BuilderRun，未啟用或寫入失敗時回傳 None
+        """
+
+        from apps.dailytrans.models import BuilderRun
+
+        pending = self.unmatched_codes - self.reported_codes
+
+        if pending:
+            db_logger.warning('Cannot Match %d Items: %s' % (sum(pending.values()), self.unmatched_summary(pending)),
+                              extra={'type_code': self.type_code})
+            self.reported_codes.update(pending)
+
+        if not getattr(settings, 'DAILYTRAN_BUILDER_METRICS', True):
+            return
+
+        try:
+            return BuilderRun.objects.create(
+                job=job,
+                type_code=self.type_code,
+                start_date=start_date,
+                end_date=end_date,
+                success=success,
+                duration=duration.total_seconds() if duration is not None else None,
+                latency_p50=self.percentile(50),
+                latency_p95=self.percentile(95),
+                latency_max=max(self.latencies) if self.latencies else None,
+                stages={name: round(seconds, 3) for name, seconds in self.stages.items()},
+                unmatched_codes=dict(self.unmatched_codes),
+                msg=str(msg or ''),
+                **{name if name != 'bytes' else 'bytes_downloaded': self.counters[name] for name in self.COUNTERS}
+            )
+        except Exception as e:
+            db_logger.exception(e)
+
+
+def current_metrics():
+    """
+    回傳目前執行中的 BuilderMetrics，不在 `director` 中執行時回傳 None
+    """
+
+    stack = getattr(_local, 'stack', None)
+
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def builder_run(job=None):
+    """
+    建立一個新的 BuilderMetrics 作為目前執行中的統計，於此期間建立的 AbstractApi 都會寫入此統計
+    巢狀執行時(例如 apps.crops.builder.direct 呼叫各個子 direct)，結束後會將數據併入外層
+
+    :param job: str，`director` 的 job 名稱，外層已有 job 時此次執行標記為 nested
+    """
+
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+
+    metrics = BuilderMetrics()
+    metrics.job = job
+    metrics.nested = any(outer.job for outer in _local.stack)
+    _local.stack.append(metrics)
+
+    try:
+        yield metrics
+    finally:
+        _local.stack.pop()
+
+        if _local.stack:
+            _local.stack[-1].merge(metrics)
@@ -1,4 +1,3 @@
-from django.db.models import Q
 import datetime
 import json
 from .utils import date_transfer
@@ -35,7 +34,7 @@ class Api(AbstractApi):
                 dic[key] = value.strip()
 
         product_code = dic.get('item')
-        product = self.PRODUCT_QS.filter(code=product_code).first()
+        product = self.INDEX.get_product(product_code)
 
         if product:
             tran = DailyTran(
@@ -48,8 +47,7 @@ class Api(AbstractApi):
             return tran
         else:
             if not product:
-                self.LOGGER.warning('Cannot Match Product: "%s" In Dictionary %s'
-                                    % (product_code, dic), extra=self.LOGGER_EXTRA)
+                self.unmatched('Product', product_code)
             return dic
 
     def request(self, start_date=None, end_date=None, id=None, source=None, code=None, name=None):
@@ -354,24 +352,7 @@ class Api(AbstractApi):
             data = json.loads(response, object_hook=self.hook)
 
         # data should look like [D, B, {}, C, {}...] after loads
-        for obj in data:
-            if isinstance(obj, DailyTran):
-                try:
-                    # update if exists
-                    daily_tran_qs = DailyTran.objects.filter(Q(date__exact=obj.date)
-                                                             & Q(product=obj.product))
+        trans = [obj for obj in data if isinstance(obj, DailyTran)]
+        self.METRICS.add(fetched=len(data))
 
-                    if daily_tran_qs.count() > 1:
-                        # log as duplicate
-                        items = str(daily_tran_qs.values_list('id', flat=True))
-
-                        self.LOGGER.warning('Find duplicate DailyTran item: %s' % items, extra=self.LOGGER_EXTRA)
-
-                    elif daily_tran_qs.count() == 1:
-                        daily_tran_qs.update(avg_price=obj.avg_price)
-                    else:
-                        if obj.avg_price > 0:
-                            obj.save()
-
-                except Exception as e:
-                    self.LOGGER.exception(e, extra=self.LOGGER_EXTRA)
+        self.upsert(trans, fields=('avg_price',), insert_condition=lambda obj: obj.avg_price > 0)
@@ -0,0 +1,228 @@
+import csv
+import datetime
+import io
+import time
+from itertools import islice
+
+from django.db import connection, transaction
+
+from apps.dailytrans.models import DailyTran, DailyTranAggregate
+from .upsert import DailyTranUpserter, UpsertResult
+
+
+class DailyTranCopyImporter(DailyTranUpserter):
+    """
+    `DailyTranUpserter` 的 COPY 版本，用於大量資料(歷史資料回補、匯入備份檔):
+    1. 以 PostgreSQL COPY 將資料串流寫入暫存表(TEMP TABLE，不寫 WAL，交易結束後自動刪除)
+    2. 以單一 SQL 將暫存表合併至 dailytrans_dailytran，並回傳新增/更新/未異動/略過的筆數
+    3. 以暫存表的 key 重新計算 DailyTranAggregate
+
+    合併規則與 `DailyTranUpserter.upsert` 相同:
+    - 以 product/source/date 為 key，同一批資料中 key 重複時以最後一筆為主
+    - `not_updated < 0` 的資料為人工新增或修改，不會被更新
+    - 只更新 `fields` 指定的欄位，新增時寫入所有價格/交易量/重量欄位
+    - 新增時使用 ON CONFLICT DO NOTHING，合併期間其他 process 已新增相同 key 的資料，會再合併一次改為更新
+    """
+
+    COPY_BATCH_SIZE = 100000
+    # 因 key 衝突而重新合併的次數上限，仍衝突的資料計為略過
+    MAX_MERGE_ATTEMPTS = 3
+    STAGING_TABLE = 'dailytrans_dailytran_staging'
+    KEY_COLUMNS = ('product_id', 'source_id', 'date')
+
+    @property
+    def columns(self):
+        return self.KEY_COLUMNS + self.FIELDS + ('insertable',)
+
+    def upsert(self, trans, insert_condition=None):
+        """
+        :param trans: Iterable[DailyTran]，尚未存檔的 DailyTran
+        :param insert_condition: callable，回傳 False 的資料不會新增，但仍會更新既有資料
+        :return: UpsertResult
+        """
+
+        rows = (
+            dict(
+                {field: getattr(tran, field) for field in self.FIELDS},
+                product_id=tran.product_id,
+                source_id=tran.source_id,
+                date=tran.date,
+                insertable=insert_condition is None or bool(insert_condition(tran)),
+            )
+            for tran in trans
+        )
+
+        return self.import_rows(rows)
+
+    def import_rows(self, rows):
+        """
+        :param rows: Iterable[dict]，key 為 product_id, source_id, date 及價格/交易量/重量欄位，
+                     可另外傳入 insertable(預設為 True)
+        :return: UpsertResult
+        """
+
+        rows = iter(rows)
+        start = time.monotonic()
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self._create_staging_table(cursor)
+
+                while True:
+                    batch = list(islice(rows, self.COPY_BATCH_SIZE))
+
+                    if not batch:
+                        break
+
+                    self._copy(cursor, batch)
+
+                self._create_partitions(cursor)
+                result = self._merge(cursor)
+
+            if result.inserted or result.updated:
+                DailyTranAggregate.objects.refresh_from_table(self.STAGING_TABLE)
+
+        if self.metrics:
+            self.metrics.record_upsert(result, time.monotonic() - start)
+
+        return result
+
+    def _create_staging_table(self, cursor):
+        # 同一個交易中重複匯入時，前一次的暫存表尚未被刪除
+        cursor.execute('DROP TABLE IF EXISTS {table}'.format(table=self.STAGING_TABLE))
+        cursor.execute(
+            'CREATE TEMP TABLE {table} ('
+            'seq bigserial, product_id integer NOT NULL, source_id integer, date date NOT NULL, {fields}, '
+            'insertable boolean NOT NULL DEFAULT true, merged boolean NOT NULL DEFAULT false'
+            ') ON COMMIT DROP'.format(
+                table=self.STAGING_TABLE,
+                fields=', '.join('%s double precision' % field for field in self.FIELDS),
+            )
+        )
+
+    def _copy(self, cursor, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row in rows:
+            # COPY 指定欄位時不會套用欄位預設值，未傳入 insertable 時需寫入 True
+            insertable = row.get('insertable')
+            row = dict(row, insertable=True if insertable is None or insertable == '' else insertable)
+            writer.writerow([self._to_csv(row.get(column)) for column in self.columns])
+
+        buffer.seek(0)
+
+        # Django 的 cursor wrapper 沒有 copy_expert，需使用 psycopg2 原生的 cursor
+        cursor.cursor.copy_expert(
+            'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)'.format(
+                table=self.STAGING_TABLE, columns=', '.join(self.columns)
+            ),
+            buffer,
+        )
+
+    @staticmethod
+    def _to_csv(value):
+        # CSV 格式中未加引號的空字串代表 NULL
+        if value is None or value == '':
+            return ''
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        return value
+
+    def _create_partitions(self, cursor):
+        # 匯入的資料可能包含尚未建立分區的年度
+        cursor.execute('SELECT MIN(date), MAX(date) FROM {table}'.format(table=self.STAGING_TABLE))
+        start_date, end_date = cursor.fetchone()
+
+        if start_date and end_date:
+            DailyTran.objects.create_partitions(start_date.year, end_date.year)
+
+    def _merge(self, cursor):
+        """
+        將暫存表中尚未合併的資料合併至 dailytrans_dailytran，因 key 衝突而未新增的資料保留為未合併並再合併一次
+
+        :return: UpsertResult
+        """
+
+        counts = dict(inserted=0, updated=0, unchanged=0, skipped=0)
+
+        for attempt in range(1, self.MAX_MERGE_ATTEMPTS + 1):
+            cursor.execute(self._merge_sql())
+            staged, inserted, updated, updatable, conflicted = cursor.fetchone()
+
+            counts['inserted'] += inserted
+            counts['updated'] += updated
+            counts['unchanged'] += updatable - updated
+            counts['skipped'] += staged - inserted - updatable - conflicted
+
+            if not conflicted:
+                break
+
+            if attempt == self.MAX_MERGE_ATTEMPTS:
+                counts['skipped'] += conflicted
+
+        return UpsertResult(**counts)
+
+    def _merge_sql(self):
+        meta = DailyTran._meta
+        table = meta.db_table
+        columns = {field: meta.get_field(field).column for field in self.FIELDS}
+
+        # product/source/date 為唯一值(source 為空時為 partial unique index)，每筆暫存資料最多對應一筆既有紀錄
+        return '''
+            WITH staged AS (
+                SELECT DISTINCT ON (product_id, source_id, date) *
+                FROM {staging}
+                WHERE NOT merged
+                ORDER BY product_id, source_id, date, seq DESC
+            ),
+            matched AS (
+                SELECT s.seq, t.id AS target_id, t.not_updated
+                FROM staged s
+                LEFT JOIN {table} t
+                    ON t.product_id = s.product_id AND t.date = s.date AND t.source_id IS NOT DISTINCT FROM s.source_id
+            ),
+            updated AS (
+                UPDATE {table} AS t SET {sets}, update_time = now()
+                FROM staged s JOIN matched m ON m.seq = s.seq
+                WHERE t.id = m.target_id AND t.date = s.date AND m.not_updated >= 0 AND ({changed})
+                RETURNING t.id
+            ),
+            inserted AS (
+                INSERT INTO {table} (product_id, source_id, date, {insert_columns}, not_updated, update_time,
+                                     create_time)
+                SELECT s.product_id, s.source_id, s.date, {insert_values}, 0, now(), now()
+                FROM staged s JOIN matched m ON m.seq = s.seq
+                WHERE m.target_id IS NULL AND s.insertable
+                ON CONFLICT DO NOTHING
+                RETURNING product_id, source_id, date
+            ),
+            conflicted AS (
+                SELECT s.seq
+                FROM staged s JOIN matched m ON m.seq = s.seq
+                WHERE m.target_id IS NULL AND s.insertable AND NOT EXISTS (
+                    SELECT 1 FROM inserted i
+                    WHERE i.product_id = s.product_id AND i.date = s.date
+                        AND i.source_id IS NOT DISTINCT FROM s.source_id
+                )
+            ),
+            merged AS (
+                UPDATE {staging} SET merged = true
+                WHERE NOT merged AND seq NOT IN (SELECT seq FROM conflicted)
+            )
+            SELECT
+                (SELECT COUNT(*) FROM staged),
+                (SELECT COUNT(*) FROM inserted),
+                (SELECT COUNT(*) FROM updated),
+                (SELECT COUNT(*) FROM matched WHERE target_id IS NOT NULL AND not_updated >= 0),
+                (SELECT COUNT(*) FROM conflicted)
+        '''.format(
+            staging=self.STAGING_TABLE,
+            table=table,
+            sets=', '.join('{} = s.{}'.format(columns[field], field) for field in self.fields),
+            changed=' OR '.join('t.{} IS DISTINCT FROM s.{}'.format(columns[field], field) for field in self.fields),
+            insert_columns=', '.join(columns[field] for field in self.FIELDS),
+            insert_values=', '.join('s.%s' % field for field in self.FIELDS),
+        )
@@ -0,0 +1,224 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import wraps
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from django.conf import settings
+
+
+class ResponseStore(object):
+    """
+    將 builder 抓取到的原始資料壓縮後存放於硬碟，以內容的 sha256 作為檔名(content-addressed)
+
+    目錄結構:
+    - <ROOT>/blobs/<digest[:2]>/<digest>.gz: gzip 壓縮後的原始資料，相同內容只會存一份
+    - <ROOT>/refs/<API_NAME>/<key>.json: 以 API_NAME + 正規化後的請求參數為 key，記錄最新一次抓到的 digest
+      及最後一次成功寫入資料庫(applied)的 digest
+
+    replay 模式下不會發送任何請求，直接以最新一次存下來的資料建立 Response
+    """
+
+    def __init__(self, root, replay=False):
+        """
+        :param root: str，存放資料的根目錄
+        :param replay: bool，是否以存下來的資料重跑 `load`，不連線
+        """
+
+        self.root = root
+        self.replay = replay
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(method, url, params=None):
+        """
+        將請求正規化成固定格式的字串，query string 與 params 合併後依 key 排序
+
+        :param method: str，'GET'、'POST' etc.
+        :param url: str
+        :param params: dict，requests 的 params 參數
+        """
+
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        query.extend((str(k), str(v)) for k, v in (params or {}).items())
+
+        return '{} {}://{}{}?{}'.format(method.upper(), parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)))
+
+    def key(self, method, url, params=None):
+        return hashlib.sha1(self.normalize(method, url, params).encode('utf8')).hexdigest()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], '%s.gz' % digest)
+
+    def _ref_path(self, api_name, key):
+        return os.path.join(self.root, 'refs', api_name, '%s.json' % key)
+
+    @staticmethod
+    def _write(path, content):
+        """
+        先寫入暫存檔再取代，避免多執行緒或中斷時留下不完整的檔案
+        """
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+
+        os.replace(tmp, path)
+
+    def _read_ref(self, api_name, key):
+        try:
+            with open(self._ref_path(api_name, key), encoding='utf8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_ref(self, api_name, key, ref):
+        self._write(self._ref_path(api_name, key), json.dumps(ref, ensure_ascii=False).encode('utf8'))
+
+    def save(self, api_name, method, url, params, response):
+        """
+        儲存成功(status code 200)的 response，並在 response 上標記 `store_key` 及 `store_digest`
+
+        :return: requests.Response
+        """
+
+        if response.status_code != 200:
+            return response
+
+        key = self.key(method, url, params)
+        content = response.content or b''
+        digest = hashlib.sha256(content).hexdigest()
+
+        if not os.path.exists(self._blob_path(digest)):
+            self._write(self._blob_path(digest), gzip.compress(content))
+
+        with self._lock:
+            ref = self._read_ref(api_name, key)
+            ref.update({
+                'request': self.normalize(method, url, params),
+                'digest': digest,
+                'encoding': response.encoding,
+                'fetched_at': datetime.datetime.now().isoformat(),
+            })
+            self._write_ref(api_name, key, ref)
+
+        response.store_key = key
+        response.store_digest = digest
+
+        return response
+
+    def load(self, api_name, method, url, params=None):
+        """
+        以最新一次存下來的資料建立 Response，找不到資料時回傳空的 Response(status_code 為 None)
+        """
+
+        key = self.key(method, url, params)
+        ref = self._read_ref(api_name, key)
+        response = requests.Response()
+        response.url = url
+        response.request = requests.Request(method, url, params=params).prepare()
+
+        if not ref:
+            return response
+
+        with open(self._blob_path(ref['digest']), 'rb') as f:
+            response._content = gzip.decompress(f.read())
+
+        response.status_code = 200
+        response.encoding = ref.get('encoding')
+        response.store_key = key
+        response.store_digest = ref['digest']
+
+        return response
+
+    def is_applied(self, api_name, key, digest):
+        return self._read_ref(api_name, key).get('applied') == digest
+
+    def mark_applied(self, api_name, key, digest):
+        with self._lock:
+            ref = self._read_ref(api_name, key)
+            ref['applied'] = digest
+            self._write_ref(api_name, key, ref)
+
+
+class _ErrorCounter(logging.Handler):
+    """
+    計算目前執行緒寫入的 ERROR 以上等級 log 數量，用來判斷 `load` 是否成功(各 builder 的 load 會自行攔截例外)
+    """
+
+    def __init__(self):
+        super(_ErrorCounter, self).__init__(level=logging.ERROR)
+        self.thread = threading.get_ident()
+        self.count = 0
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.count += 1
+
+
+def skip_applied(func):
+    """
+    用來包裝 builder 的 `load` 方法:
+    傳入的 response 若與上次成功寫入資料庫的內容完全相同，則略過解析與比對；
+    `load` 過程中沒有任何錯誤 log 時，將這次的內容標記為已寫入
+    未啟用 ResponseStore 或傳入的資料不是由 store 存下來的 response 時，直接執行 `load`
+    """
+
+    @wraps(func)
+    def wrapper(self, response, *args, **kwargs):
+        store = self.STORE
+        responses = response if isinstance(response, (list, tuple)) else [response]
+
+        if store is None or not responses or not all(getattr(r, 'store_key', None) for r in responses):
+            return func(self, response, *args, **kwargs)
+
+        if not store.replay and all(store.is_applied(self.API_NAME, r.store_key, r.store_digest) for r in responses):
+            return
+
+        counter = _ErrorCounter()
+        self.LOGGER.addHandler(counter)
+
+        try:
+            result = func(self, response, *args, **kwargs)
+        finally:
+            self.LOGGER.removeHandler(counter)
+
+        if not counter.count:
+            for r in responses:
+                store.mark_applied(self.API_NAME, r.store_key, r.store_digest)
+
+        return result
+
+    return wrapper
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    取得 process 共用的 ResponseStore，設定取自 settings.DAILYTRAN_BUILDER_STORE，未設定 ROOT 時回傳 None
+    """
+
+    global _store
+
+    config = getattr(settings, 'DAILYTRAN_BUILDER_STORE', {})
+
+    if not config.get('ROOT'):
+        return None
+
+    with _store_lock:
+        if _store is None:
+            _store = ResponseStore(config['ROOT'], replay=config.get('REPLAY', False))
+
+        return _store
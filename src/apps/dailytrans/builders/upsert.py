@@ -0,0 +1,263 @@
+import logging
+import time
+from collections import namedtuple, OrderedDict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.dailytrans.models import DailyTran, DailyTranAggregate, as_date
+
+
+UpsertResult = namedtuple('UpsertResult', ('inserted', 'updated', 'deleted', 'unchanged', 'skipped'))
+UpsertResult.__new__.__defaults__ = (0, 0, 0, 0, 0)
+
+
+class DailyTranUpserter(object):
+    """
+    以批次(set-based)的方式將整批 DailyTran 寫入資料庫，取代各 builder 逐筆 filter/count/save 的流程。
+
+    每次 `upsert` 固定只會產生:
+    1. 一次 SELECT 取出這批資料對應的既有紀錄(以 product/source/date 為 key)
+    2. 一次(或依 BATCH_SIZE 切分的數次) INSERT ... ON CONFLICT DO NOTHING 新增資料
+    3. 一次(或依 BATCH_SIZE 切分的數次) UPDATE ... FROM (VALUES ...) 更新有異動的資料
+
+    SELECT 之後其他 process(例如排程與 backfill 同時執行)已新增相同 key 的資料時，INSERT 不會新增，
+    這些資料會重新取出既有紀錄後改為更新(與 `DailyTranCopyImporter` 的合併方式相同)。
+
+    `not_updated < 0` 代表該筆資料為人工新增或修改，不會被更新或刪除。
+    新增、更新或刪除後會在同一個交易中重新計算對應的 DailyTranAggregate。
+    """
+
+    BATCH_SIZE = 1000
+    FIELDS = ('up_price', 'mid_price', 'low_price', 'avg_price', 'avg_weight', 'volume')
+
+    def __init__(self, fields=None, logger=None, logger_extra=None, metrics=None):
+        """
+        :param fields: 需比對及更新的欄位，預設為所有價格/交易量/重量欄位
+        :param logger: logging.Logger，未傳入時使用 'aprp'
+        :param logger_extra: dict，寫入 log 時的 extra 參數
+        :param metrics: BuilderMetrics，傳入時會記錄寫入結果及耗時
+        """
+
+        self.fields = tuple(fields or self.FIELDS)
+
+        for field in self.fields:
+            if field not in self.FIELDS:
+                raise NotImplementedError('Field %s can not be upserted' % field)
+
+        self.LOGGER = logger or logging.getLogger('aprp')
+        self.LOGGER_EXTRA = logger_extra or {}
+        self.metrics = metrics
+
+    @staticmethod
+    def key(tran):
+        return tran.product_id, tran.source_id, tran.date
+
+    def _fetch_existing(self, keys):
+        """
+        以單一查詢取出這批 key 對應的既有紀錄，回傳 {key: row}(product/source/date 為唯一值)
+        """
+
+        existing = {}
+
+        if not keys:
+            return existing
+
+        product_ids = {key[0] for key in keys}
+        dates = [key[2] for key in keys]
+
+        qs = DailyTran.objects.filter(
+            product_id__in=product_ids, date__range=(min(dates), max(dates))
+        ).values('id', 'product_id', 'source_id', 'date', 'not_updated', *self.fields)
+
+        for row in qs:
+            key = (row['product_id'], row['source_id'], row['date'])
+
+            if key in keys:
+                existing[key] = row
+
+        return existing
+
+    def _is_changed(self, row, tran):
+        return any(row[field] != getattr(tran, field) for field in self.fields)
+
+    def upsert(self, trans, insert_condition=None):
+        """
+        將整批 DailyTran 依 product/source/date 比對後，新增或更新至資料庫
+
+        :param trans: Iterable[DailyTran]，尚未存檔的 DailyTran
+        :param insert_condition: callable，回傳 False 的資料不會新增(例如價格為 0)，但仍會更新既有資料
+        :return: UpsertResult
+        """
+
+        start = time.monotonic()
+
+        # 同一批資料中 key 重複時以最後一筆為主
+        incoming = OrderedDict()
+        for tran in trans:
+            incoming[self.key(tran)] = tran
+
+        existing = self._fetch_existing(set(incoming.keys()))
+        to_create, to_update, unchanged, skipped = self._classify(incoming, existing, insert_condition)
+        created = []
+
+        with transaction.atomic():
+            for i in range(0, len(to_create), self.BATCH_SIZE):
+                batch = to_create[i:i + self.BATCH_SIZE]
+                conflicts = self._bulk_insert(batch)
+                conflict_ids = {id(tran) for tran in conflicts}
+                created.extend(tran for tran in batch if id(tran) not in conflict_ids)
+
+                if conflicts:
+                    # 其他 process 已新增相同 key 的資料，依其既有紀錄改為更新
+                    conflicted = OrderedDict((self.key(tran), tran) for tran in conflicts)
+                    _, updates, conflict_unchanged, conflict_skipped = self._classify(
+                        conflicted, self._fetch_existing(set(conflicted.keys())), lambda tran: False
+                    )
+                    to_update.extend(updates)
+                    unchanged += conflict_unchanged
+                    skipped += conflict_skipped
+
+            for i in range(0, len(to_update), self.BATCH_SIZE):
+                self._bulk_update(to_update[i:i + self.BATCH_SIZE])
+
+            DailyTranAggregate.objects.refresh(
+                [self.key(tran) for tran in created] + [self.key(tran) for _, tran in to_update]
+            )
+
+        result = UpsertResult(inserted=len(created), updated=len(to_update), unchanged=unchanged, skipped=skipped)
+
+        if self.metrics:
+            self.metrics.record_upsert(result, time.monotonic() - start)
+
+        return result
+
+    def _classify(self, incoming, existing, insert_condition=None):
+        """
+        依既有紀錄將資料分為新增、更新、未異動及略過
+
+        :param incoming: OrderedDict[key, DailyTran]
+        :param existing: `_fetch_existing` 的結果
+        :return: (to_create, to_update, unchanged, skipped)
+        """
+
+        to_create = []
+        to_update = []
+        unchanged = 0
+        skipped = 0
+
+        for key, tran in incoming.items():
+            row = existing.get(key)
+
+            if not row:
+                if insert_condition is None or insert_condition(tran):
+                    to_create.append(tran)
+                else:
+                    skipped += 1
+
+            # We set the `not_updated` field to -999 to indicate that the record has been added manually
+            # and should not be updated or deleted by the system.
+            elif row['not_updated'] < 0:
+                skipped += 1
+
+            elif self._is_changed(row, tran):
+                to_update.append((row['id'], tran))
+
+            else:
+                unchanged += 1
+
+        return to_create, to_update, unchanged, skipped
+
+    def _bulk_insert(self, trans):
+        """
+        以 INSERT ... ON CONFLICT DO NOTHING 一次新增多筆資料，
+        已存在相同 key(unique_together 及 source 為空時的 partial unique index)的資料不會新增
+
+        :param trans: List[DailyTran]
+        :return: List[DailyTran]，因 key 已存在而沒有新增的資料
+        """
+
+        meta = DailyTran._meta
+        fields = [meta.get_field(field) for field in ('product', 'source', 'date') + self.FIELDS + ('not_updated',)]
+        placeholder = '({})'.format(', '.join(['%s'] * (len(fields) + 2)))
+
+        now = timezone.now()
+        params = []
+        for tran in trans:
+            params.extend(field.get_db_prep_save(getattr(tran, field.attname), connection) for field in fields)
+            params.extend([now, now])
+
+        sql = 'INSERT INTO {table} ({columns}, {update_time}, {create_time}) VALUES {values} ' \
+              'ON CONFLICT DO NOTHING RETURNING {product}, {source}, {date}'.format(
+                table=meta.db_table,
+                columns=', '.join(field.column for field in fields),
+                update_time=meta.get_field('update_time').column,
+                create_time=meta.get_field('create_time').column,
+                values=', '.join([placeholder] * len(trans)),
+                product=meta.get_field('product').column,
+                source=meta.get_field('source').column,
+                date=meta.get_field('date').column,
+              )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            inserted = set(cursor.fetchall())
+
+        return [tran for tran in trans if (tran.product_id, tran.source_id, as_date(tran.date)) not in inserted]
+
+    def _bulk_update(self, rows):
+        """
+        以 UPDATE ... FROM (VALUES ...) 一次更新多筆資料
+
+        :param rows: List[Tuple[int, DailyTran]]，(既有紀錄 id, 新資料)
+        """
+
+        meta = DailyTran._meta
+        columns = [meta.get_field(field).column for field in self.fields]
+        placeholder = '(%s, {})'.format(', '.join(['%s::double precision'] * len(columns)))
+
+        # 第一個參數為 update_time，其後依序為 VALUES 的內容
+        params = [timezone.now()]
+        for pk, tran in rows:
+            params.append(pk)
+            params.extend(getattr(tran, field) for field in self.fields)
+
+        sql = 'UPDATE {table} AS t SET {sets}, {update_time} = %s FROM (VALUES {values}) AS v (id, {columns}) ' \
+              'WHERE t.id = v.id'.format(
+                table=meta.db_table,
+                sets=', '.join('{0} = v.{0}'.format(column) for column in columns),
+                update_time=meta.get_field('update_time').column,
+                values=', '.join([placeholder] * len(rows)),
+                columns=', '.join(columns),
+              )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def delete(self, ids):
+        """
+        批次刪除資料，人工新增或修改(not_updated < 0)的資料不會被刪除
+
+        :param ids: Iterable[int]，DailyTran id
+        :return: 刪除的筆數
+        """
+
+        ids = [int(i) for i in ids if i]
+
+        if not ids:
+            return 0
+
+        start = time.monotonic()
+
+        qs = DailyTran.objects.filter(id__in=ids, not_updated__gte=0)
+        deleted_ids = list(qs.values_list('id', flat=True))
+
+        if deleted_ids:
+            # DailyTranQuerySet.delete 會重新計算對應的 DailyTranAggregate
+            qs.filter(id__in=deleted_ids).delete()
+            self.LOGGER.warning('DailyTran items has been deleted: %s' % deleted_ids, extra=self.LOGGER_EXTRA)
+
+        if self.metrics:
+            self.metrics.record_upsert(UpsertResult(deleted=len(deleted_ids)), time.monotonic() - start)
+
+        return len(deleted_ids)
@@ -5,6 +5,7 @@ from functools import wraps
 from collections import namedtuple
 from django.utils import timezone
 from apps.dailytrans.models import DailyTran
+from .metrics import builder_run
 db_logger = logging.getLogger('aprp')
 
 
@@ -104,6 +105,25 @@ def date_generator(start_date, end_date, date_range=None):
         delta_start_date = delta_start_date + datetime.timedelta(date_range)
 
 
+def date_windows(start_date, end_date, days):
+    """
+    將日期區間切成數個不重疊且最多 `days` 天的區間，與 `date_generator` 不同的是前後區間的日期不會重複
+
+    :return: List[Tuple[datetime.date, datetime.date]]
+    """
+
+    if start_date > end_date:
+        raise NotImplementedError
+
+    windows = []
+    while start_date <= end_date:
+        window_end = min(start_date + datetime.timedelta(days=days - 1), end_date)
+        windows.append((start_date, window_end))
+        start_date = window_end + datetime.timedelta(days=1)
+
+    return windows
+
+
 def product_generator(model, type=None, code=None, name=None, **kwargs):
     qs = model.objects.all()
     if type:
@@ -125,13 +145,44 @@ DirectResult.__new__.__defaults__ = (None, False, '',)
 
 DirectData = namedtuple('DirectData', ('config_code', 'type_id', 'logger_type_code'))
 
+# 組合型 direct(例如 apps.crops.builder.direct)拆分成 Celery 子任務的單位
+# func: 以 `director` 包裝的 direct function，upstream: 資料來源(用於限速)，chunk_days: 每個子任務涵蓋的天數，None 代表不切分
+DirectJob = namedtuple('DirectJob', ('func', 'upstream', 'chunk_days'))
+DirectJob.__new__.__defaults__ = (None,)
+
+
+def aggregate_direct_results(results):
+    """
+    將多個子任務的 DirectResult 合併為一個，子任務為平行執行，因此 duration 取最長者
+
+    :param results: Iterable[DirectResult]
+    :return: DirectResult
+    """
+
+    results = [result for result in results if result is not None]
+
+    if not results:
+        return DirectResult(None, None, success=False, msg='No result')
+
+    start_dates = [result.start_date for result in results if result.start_date]
+    end_dates = [result.end_date for result in results if result.end_date]
+    durations = [result.duration for result in results if result.duration is not None]
+
+    return DirectResult(
+        start_date=min(start_dates) if start_dates else None,
+        end_date=max(end_dates) if end_dates else None,
+        duration=max(durations) if durations else None,
+        success=all(result.success for result in results),
+        msg='; '.join(str(result.msg) for result in results if result.msg),
+    )
+
 
 def director(func):
     """
     任何以 `direct` 開頭的 function 都會使用此 decorator 來包裝
     目的在於統一處理參數的檢查與錯誤處理以及在 func 執行前後做一些操作:
     func 執行前 -> 檢查日期格式是否正確、計算日期區間、轉換日期格式
-    func 執行後 -> 更新 DailyTran 的 not_updated 欄位
+    func 執行後 -> 更新 DailyTran 的 not_updated 欄位、寫入此次執行的統計數據(BuilderRun)
 
     :param func: 用來執行抓資料的 function
     """
@@ -234,4 +285,31 @@ def director(func):
             db_logger.exception(e)
             return DirectResult(start_date, end_date, success=False, msg=e)
 
-    return interface
+    @wraps(func)
+    def measured(*args, **kwargs):
+        """
+        以 `builder_run` 包裝 `interface`，執行期間建立的 AbstractApi 都會將統計數據寫入同一個 BuilderMetrics
+        在其他 director 中執行時數據併入外層，不另外寫入 BuilderRun，避免同一份工作被重複計算
+        """
+
+        start_time = timezone.now()
+        job = '%s.%s' % (func.__module__, func.__name__)
+
+        with builder_run(job=job) as metrics:
+            result = interface(*args, **kwargs)
+
+            if metrics.nested:
+                return result
+
+            metrics.save(
+                job,
+                start_date=result.start_date,
+                end_date=result.end_date,
+                success=result.success,
+                duration=timezone.now() - start_time,
+                msg=result.msg,
+            )
+
+        return result
+
+    return measured
@@ -0,0 +1,200 @@
+import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.cattles import builder as cattles
+from apps.chickens import builder as chickens
+from apps.crops import builder as crops
+from apps.dailytrans.builders.metrics import builder_run
+from apps.dailytrans.builders.utils import DirectJob, date_windows
+from apps.dailytrans.models import BackfillCheckpoint, DailyTran
+from apps.ducks import builder as ducks
+from apps.feed import builder as feed
+from apps.flowers import builder as flowers
+from apps.fruits import builder as fruits
+from apps.gooses import builder as gooses
+from apps.hogs import builder as hogs
+from apps.naifchickens import builder as naifchickens
+from apps.rams import builder as rams
+from apps.rices import builder as rices
+from apps.seafoods import builder as seafoods
+
+
+# 品項分類 -> 需執行的 direct function 及其資料來源(用於限速)
+JOBS = {
+    'COG01': [DirectJob(rices.direct, 'rice_avg')],
+    'COG02': [DirectJob(crops.direct_wholesale_02, 'amis')],
+    'COG03': [DirectJob(fruits.direct_wholesale_03, 'amis')],
+    'COG04': [DirectJob(flowers.direct_wholesale_04, 'amis')],
+    'COG05': [
+        DirectJob(crops.direct_wholesale_05, 'eir030'),
+        DirectJob(crops.direct_origin, 'apis'),
+    ],
+    'COG06': [
+        DirectJob(fruits.direct_wholesale_06, 'eir030'),
+        DirectJob(fruits.direct_origin, 'apis'),
+    ],
+    'COG07': [DirectJob(flowers.direct_wholesale_07, 'amis')],
+    'COG08': [DirectJob(hogs.direct, 'eir019')],
+    'COG09': [DirectJob(rams.direct, 'eir107')],
+    'COG10': [DirectJob(chickens.direct, 'eir49')],
+    'COG11': [DirectJob(ducks.direct, 'eir51')],
+    'COG12': [DirectJob(gooses.direct, 'eir50')],
+    'COG13': [
+        DirectJob(seafoods.direct_wholesale, 'eir032'),
+        DirectJob(seafoods.direct_origin, 'efish'),
+    ],
+    'COG14': [DirectJob(cattles.direct, 'cattle')],
+    'COG15': [DirectJob(feed.direct, 'feed')],
+    'COG16': [DirectJob(naifchickens.direct, 'naifchickens')],
+}
+
+
+def job_name(func):
+    return '%s.%s' % (func.__module__, func.__name__)
+
+
+def run_chunk(func, upstream, config_code, start_date, end_date):
+    """
+    於子 process 中執行單一 direct function 的一個日期區間，並寫入 BackfillCheckpoint
+
+    :param func: str，direct function 的路徑
+    :return: Tuple[str, datetime.date, datetime.date, bool, int, float, str]
+    """
+
+    # 避免短時間內對同一資料來源送出過多請求，與排程共用限速設定
+    from apps.dailytrans.tasks import throttle_upstream
+
+    countdown = throttle_upstream(upstream)
+    while countdown:
+        time.sleep(countdown)
+        countdown = throttle_upstream(upstream)
+
+    start_time = timezone.now()
+
+    # direct function 的統計數據會併入外層的 BuilderMetrics，只計算本次執行新增或更新的筆數，
+    # 不會計入同一個品項分類其他 job(同時執行)寫入的資料
+    with builder_run() as metrics:
+        result = import_string(func)(start_date=start_date, end_date=end_date)
+
+    duration = (timezone.now() - start_time).total_seconds()
+    rows = metrics.counters['inserted'] + metrics.counters['updated']
+
+    BackfillCheckpoint.objects.update_or_create(
+        job=func, start_date=start_date, end_date=end_date,
+        defaults={
+            'success': result.success,
+            'rows': rows,
+            'duration': duration,
+            'msg': str(result.msg or ''),
+        },
+    )
+
+    return func, start_date, end_date, result.success, rows, duration, str(result.msg or '')
+
+
+class Command(BaseCommand):
+    help = 'Backfill DailyTran history by config codes, resumable from BackfillCheckpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_codes', nargs='+', type=str, help='Config codes, e.g. COG05 COG13')
+        parser.add_argument('--start-date', required=True, type=str, help='Start date, %%Y-%%m-%%d')
+        parser.add_argument('--end-date', required=True, type=str, help='End date, %%Y-%%m-%%d')
+        parser.add_argument('--chunk-days', default=30, type=int, help='Days per chunk')
+        parser.add_argument('--workers', default=4, type=int, help='Number of worker processes')
+        parser.add_argument('--restart', action='store_true', help='Ignore checkpoints and rebuild all chunks')
+
+    def handle(self, config_codes, **kwargs):
+        try:
+            start_date = datetime.datetime.strptime(kwargs['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.datetime.strptime(kwargs['end_date'], '%Y-%m-%d').date()
+        except ValueError as e:
+            raise CommandError(e)
+
+        if start_date > end_date:
+            raise CommandError(f'--start-date {start_date} is later than --end-date {end_date}')
+
+        if kwargs['chunk_days'] < 1 or kwargs['workers'] < 1:
+            raise CommandError('--chunk-days and --workers must be positive')
+
+        for code in config_codes:
+            if code not in JOBS:
+                raise CommandError(f'Unknown config code {code}, choices: {", ".join(sorted(JOBS))}')
+
+        # 回補的年度可能早於既有的分區
+        DailyTran.objects.create_partitions(start_date.year, end_date.year)
+
+        chunks = self.get_chunks(config_codes, start_date, end_date, kwargs['chunk_days'], kwargs['restart'])
+        total = len(chunks)
+
+        if not total:
+            self.stdout.write('All chunks have been completed.')
+            return
+
+        self.stdout.write(f'Backfill {total} chunks with {kwargs["workers"]} workers')
+
+        # 子 process 需自行建立資料庫連線
+        connections.close_all()
+
+        started = time.time()
+        total_rows = 0
+        failed = 0
+
+        with ProcessPoolExecutor(max_workers=kwargs['workers']) as executor:
+            futures = [executor.submit(run_chunk, *chunk) for chunk in chunks]
+
+            for i, future in enumerate(as_completed(futures), start=1):
+                try:
+                    func, chunk_start, chunk_end, success, rows, duration, msg = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'[{i}/{total}] {e}')
+                    continue
+
+                total_rows += rows
+                failed += not success
+                elapsed = time.time() - started
+                status = 'ok' if success else f'failed: {msg}'
+
+                self.stdout.write(
+                    f'[{i}/{total}] {func} {chunk_start} - {chunk_end}: {rows} rows in {duration:.1f}s, {status} '
+                    f'(total {total_rows} rows, {total_rows / elapsed:.1f} rows/s)'
+                )
+
+        elapsed = time.time() - started
+        self.stdout.write(
+            f'Done: {total - failed}/{total} chunks, {total_rows} rows in {elapsed:.1f}s '
+            f'({total_rows / elapsed:.1f} rows/s)'
+        )
+
+    @staticmethod
+    def get_chunks(config_codes, start_date, end_date, chunk_days, restart=False):
+        """
+        切分日期區間，略過 BackfillCheckpoint 中已成功的區間
+        使用 `date_windows` 而非 `date_generator`，避免前後區間重疊的日期被執行兩次
+
+        :return: List[Tuple[func, upstream, config_code, start_date, end_date]]
+        """
+
+        chunks = [
+            (job_name(job.func), job.upstream, code, start, end)
+            for code in config_codes
+            for job in JOBS[code]
+            for start, end in date_windows(start_date, end_date, chunk_days)
+        ]
+
+        if restart:
+            return chunks
+
+        completed = set(
+            BackfillCheckpoint.objects
+            .filter(job__in={chunk[0] for chunk in chunks}, success=True)
+            .values_list('job', 'start_date', 'end_date')
+        )
+
+        return [chunk for chunk in chunks if (chunk[0], chunk[3], chunk[4]) not in completed]
@@ -0,0 +1,45 @@
+import datetime
+import timeit
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dailytrans.utils import to_unix, to_unix_array
+
+
+class Command(BaseCommand):
+    help = 'Compare to_unix and to_unix_array on daily points.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', default=10, type=int, help='Years of daily points')
+        parser.add_argument('--repeat', default=5, type=int, help='Best of N runs')
+
+    def handle(self, **kwargs):
+        end_date = datetime.date.today()
+        dates = pd.date_range(end_date - datetime.timedelta(days=365 * kwargs['years']), end_date, freq='D')
+        date_list = [date.date() for date in dates]
+
+        # 兩種實作結果需一致，比較速度才有意義(不使用 assert，python -O 時仍會檢查)
+        expected = [to_unix(date) for date in date_list]
+        actual = to_unix_array(date_list).tolist()
+        mismatches = [(date, e, a) for date, e, a in zip(date_list, expected, actual) if e != a]
+
+        if len(expected) != len(actual) or mismatches:
+            raise CommandError(
+                f'to_unix_array differs from to_unix: {len(actual)} / {len(expected)} points, '
+                f'mismatches (date, to_unix, to_unix_array): {mismatches[:10]}'
+            )
+
+        runs = {
+            'to_unix': lambda: [to_unix(date) for date in date_list],
+            'to_unix_array': lambda: to_unix_array(date_list).tolist(),
+        }
+
+        self.stdout.write(f'{len(date_list)} points, best of {kwargs["repeat"]}')
+
+        results = {}
+        for name, func in runs.items():
+            results[name] = min(timeit.repeat(func, number=1, repeat=kwargs['repeat']))
+            self.stdout.write(f'{name:>14}: {results[name] * 1000:.2f} ms')
+
+        self.stdout.write(f'Speedup: {results["to_unix"] / results["to_unix_array"]:.1f}x')
@@ -0,0 +1,51 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dailytrans.builders.staging import DailyTranCopyImporter
+
+
+class Command(BaseCommand):
+    help = 'Import DailyTran rows from a CSV or JSON dump through a COPY staging table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path of the .csv or .json dump')
+        parser.add_argument('--fields', nargs='+', type=str, default=None,
+                            help='Fields to update on existing rows, default to all price/volume/weight fields')
+        parser.add_argument('--batch-size', default=DailyTranCopyImporter.COPY_BATCH_SIZE, type=int,
+                            help='Rows per COPY batch')
+
+    def handle(self, path, **kwargs):
+        if not os.path.isfile(path):
+            raise CommandError(f'File not found: {path}')
+
+        fields = kwargs['fields']
+        if fields:
+            invalid = set(fields) - set(DailyTranCopyImporter.FIELDS)
+            if invalid:
+                raise CommandError(f'Unknown fields {", ".join(sorted(invalid))}, '
+                                   f'choices: {", ".join(DailyTranCopyImporter.FIELDS)}')
+
+        importer = DailyTranCopyImporter(fields=fields)
+        importer.COPY_BATCH_SIZE = kwargs['batch_size']
+
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext == '.csv':
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                result = importer.import_rows(csv.DictReader(f))
+        elif ext == '.json':
+            with open(path, encoding='utf-8') as f:
+                rows = json.load(f)
+            if not isinstance(rows, list):
+                raise CommandError('JSON dump should be a list of objects')
+            result = importer.import_rows(rows)
+        else:
+            raise CommandError(f'Unsupported file type {ext}, expected .csv or .json')
+
+        self.stdout.write(
+            f'inserted: {result.inserted}, updated: {result.updated}, '
+            f'unchanged: {result.unchanged}, skipped: {result.skipped}'
+        )
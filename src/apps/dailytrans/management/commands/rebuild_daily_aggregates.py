@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dailytrans.models import DailyTranAggregate
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyTranAggregate from DailyTran, e.g. after loaddata or manual SQL changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', default=None, type=str, help='Start date, %%Y-%%m-%%d')
+        parser.add_argument('--end-date', default=None, type=str, help='End date, %%Y-%%m-%%d')
+
+    def handle(self, **kwargs):
+        if bool(kwargs['start_date']) != bool(kwargs['end_date']):
+            raise CommandError('--start-date and --end-date must be given together')
+
+        try:
+            start_date = end_date = None
+            if kwargs['start_date']:
+                start_date = datetime.datetime.strptime(kwargs['start_date'], '%Y-%m-%d').date()
+                end_date = datetime.datetime.strptime(kwargs['end_date'], '%Y-%m-%d').date()
+        except ValueError as e:
+            raise CommandError(e)
+
+        rows = DailyTranAggregate.objects.rebuild(start_date, end_date)
+
+        self.stdout.write(f'Rebuilt {rows} aggregate rows')
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dailytrans', '0009_festivalreport_file_volume_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=120, verbose_name='Job')),
+                ('start_date', models.DateField(verbose_name='Start Date')),
+                ('end_date', models.DateField(verbose_name='End Date')),
+                ('success', models.BooleanField(default=False, verbose_name='Success')),
+                ('rows', models.IntegerField(default=0, verbose_name='Rows')),
+                ('duration', models.FloatField(default=0, verbose_name='Duration')),
+                ('msg', models.TextField(blank=True, default='', verbose_name='Message')),
+                ('update_time', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('create_time', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created')),
+            ],
+            options={
+                'verbose_name': 'Backfill Checkpoint',
+                'verbose_name_plural': 'Backfill Checkpoints',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='backfillcheckpoint',
+            unique_together=set([('job', 'start_date', 'end_date')]),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dailytrans', '0010_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuilderRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=120, verbose_name='Job')),
+                ('type_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Type Code')),
+                ('start_date', models.DateField(blank=True, null=True, verbose_name='Start Date')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='End Date')),
+                ('success', models.BooleanField(default=False, verbose_name='Success')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='Duration')),
+                ('fetched', models.PositiveIntegerField(default=0, verbose_name='Fetched')),
+                ('matched', models.PositiveIntegerField(default=0, verbose_name='Matched')),
+                ('unmatched', models.PositiveIntegerField(default=0, verbose_name='Unmatched')),
+                ('inserted', models.PositiveIntegerField(default=0, verbose_name='Inserted')),
+                ('updated', models.PositiveIntegerField(default=0, verbose_name='Updated Rows')),
+                ('deleted', models.PositiveIntegerField(default=0, verbose_name='Deleted')),
+                ('unchanged', models.PositiveIntegerField(default=0, verbose_name='Unchanged')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Skipped')),
+                ('requests', models.PositiveIntegerField(default=0, verbose_name='Requests')),
+                ('bytes_downloaded', models.BigIntegerField(default=0, verbose_name='Bytes Downloaded')),
+                ('latency_p50', models.FloatField(blank=True, null=True, verbose_name='Latency P50')),
+                ('latency_p95', models.FloatField(blank=True, null=True, verbose_name='Latency P95')),
+                ('latency_max', models.FloatField(blank=True, null=True, verbose_name='Latency Max')),
+                ('stages', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='Stages')),
+                ('unmatched_codes', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='Unmatched Codes')),
+                ('msg', models.TextField(blank=True, default='', verbose_name='Message')),
+                ('create_time', models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Created')),
+            ],
+            options={
+                'verbose_name': 'Builder Run',
+                'verbose_name_plural': 'Builder Runs',
+            },
+        ),
+    ]
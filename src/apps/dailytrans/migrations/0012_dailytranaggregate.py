@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# 以既有的 DailyTran 初始化彙總資料，之後由寫入端維護
+POPULATE_SQL = '''
+    INSERT INTO dailytrans_dailytranaggregate (
+        product_id, source_id, type_id, date, count, volume_count, weight_count,
+        price_vol_wt, vol_wt, vol, volume,
+        positive_count, positive_price_vol_wt, positive_vol_wt, positive_volume
+    )
+    SELECT
+        t.product_id, t.source_id, p.type_id, t.date, COUNT(*), COUNT(t.volume), COUNT(t.avg_weight),
+        SUM(t.avg_price * COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+        SUM(COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+        SUM(COALESCE(t.volume, 1)),
+        COALESCE(SUM(t.volume), 0),
+        COUNT(*) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0),
+        COALESCE(SUM(t.avg_price * t.avg_weight * t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0),
+        COALESCE(SUM(t.avg_weight * t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0),
+        COALESCE(SUM(t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0)
+    FROM dailytrans_dailytran t
+    JOIN configs_abstractproduct p ON p.id = t.product_id
+    GROUP BY t.product_id, t.source_id, p.type_id, t.date
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configs', '0001_initial'),
+        ('dailytrans', '0011_builderrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTranAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+                ('volume_count', models.IntegerField(default=0, verbose_name='Volume Count')),
+                ('weight_count', models.IntegerField(default=0, verbose_name='Weight Count')),
+                ('price_vol_wt', models.FloatField(default=0, verbose_name='Price Volume Weight')),
+                ('vol_wt', models.FloatField(default=0, verbose_name='Volume Weight')),
+                ('vol', models.FloatField(default=0, verbose_name='Volume For Calculation')),
+                ('volume', models.FloatField(default=0, verbose_name='Volume')),
+                ('positive_count', models.IntegerField(default=0, verbose_name='Positive Count')),
+                ('positive_price_vol_wt', models.FloatField(default=0, verbose_name='Positive Price Volume Weight')),
+                ('positive_vol_wt', models.FloatField(default=0, verbose_name='Positive Volume Weight')),
+                ('positive_volume', models.FloatField(default=0, verbose_name='Positive Volume')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='configs.AbstractProduct', verbose_name='Product')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='configs.Source', verbose_name='Source')),
+                ('type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='configs.Type', verbose_name='Type')),
+            ],
+            options={
+                'verbose_name': 'Daily Transition Aggregate',
+                'verbose_name_plural': 'Daily Transition Aggregates',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailytranaggregate',
+            unique_together=set([('product', 'source', 'date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='dailytranaggregate',
+            index_together=set([('type', 'product', 'date')]),
+        ),
+        migrations.RunSQL([POPULATE_SQL], reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+PRICE_FIELDS = ('up_price', 'mid_price', 'low_price', 'avg_price', 'avg_weight', 'volume')
+
+# 合併 product/source/date 重複的資料:
+# 保留人工新增或修改(not_updated < 0)的資料，其次為最後更新的資料，空值以其他重複資料中最新的值補上，
+# 刪除其餘資料後重新計算對應的 DailyTranAggregate
+MERGE_DUPLICATES_SQL = '''
+    CREATE TEMP TABLE dailytran_duplicates ON COMMIT DROP AS
+    SELECT
+        product_id, source_id, date,
+        (array_agg(id ORDER BY (not_updated < 0) DESC, update_time DESC, id DESC))[1] AS keep_id,
+        {latest_values}
+    FROM dailytrans_dailytran
+    GROUP BY product_id, source_id, date
+    HAVING COUNT(*) > 1;
+
+    UPDATE dailytrans_dailytran t SET {fill_values}
+    FROM dailytran_duplicates d
+    WHERE t.id = d.keep_id;
+
+    DELETE FROM dailytrans_dailytran t
+    USING dailytran_duplicates d
+    WHERE t.product_id = d.product_id AND t.date = d.date AND t.source_id IS NOT DISTINCT FROM d.source_id
+        AND t.id <> d.keep_id;
+
+    DELETE FROM dailytrans_dailytranaggregate x
+    USING dailytran_duplicates d
+    WHERE x.product_id = d.product_id AND x.date = d.date AND x.source_id IS NOT DISTINCT FROM d.source_id;
+
+    INSERT INTO dailytrans_dailytranaggregate (
+        product_id, source_id, type_id, date, count, volume_count, weight_count,
+        price_vol_wt, vol_wt, vol, volume,
+        positive_count, positive_price_vol_wt, positive_vol_wt, positive_volume
+    )
+    SELECT
+        t.product_id, t.source_id, p.type_id, t.date, COUNT(*), COUNT(t.volume), COUNT(t.avg_weight),
+        SUM(t.avg_price * COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+        SUM(COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+        SUM(COALESCE(t.volume, 1)),
+        COALESCE(SUM(t.volume), 0),
+        COUNT(*) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0),
+        COALESCE(SUM(t.avg_price * t.avg_weight * t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0),
+        COALESCE(SUM(t.avg_weight * t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0),
+        COALESCE(SUM(t.volume) FILTER (WHERE t.volume > 0 AND t.avg_weight > 0), 0)
+    FROM dailytrans_dailytran t
+    JOIN configs_abstractproduct p ON p.id = t.product_id
+    JOIN dailytran_duplicates d
+        ON t.product_id = d.product_id AND t.date = d.date AND t.source_id IS NOT DISTINCT FROM d.source_id
+    GROUP BY t.product_id, t.source_id, p.type_id, t.date;
+
+    -- 先觸發延遲檢查的外鍵，之後才能在同一個交易中修改資料表結構
+    SET CONSTRAINTS ALL IMMEDIATE;
+    SET CONSTRAINTS ALL DEFERRED;
+'''.format(
+    latest_values=',\n        '.join(
+        '(array_agg({0} ORDER BY update_time DESC, id DESC) FILTER (WHERE {0} IS NOT NULL))[1] AS {0}'.format(field)
+        for field in PRICE_FIELDS
+    ),
+    fill_values=', '.join('{0} = COALESCE(t.{0}, d.{0})'.format(field) for field in PRICE_FIELDS),
+)
+
+# unique_together 無法限制 source 為空的資料(NULL 不相等)，另建 partial unique index
+NULL_SOURCE_UNIQUE_SQL = '''
+    CREATE UNIQUE INDEX dailytrans_dailytran_product_date_null_source_uniq
+    ON dailytrans_dailytran (product_id, date) WHERE source_id IS NULL
+'''
+
+DROP_NULL_SOURCE_UNIQUE_SQL = 'DROP INDEX dailytrans_dailytran_product_date_null_source_uniq'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configs', '0001_initial'),
+        ('dailytrans', '0012_dailytranaggregate'),
+    ]
+
+    operations = [
+        # 未安裝 sqlparse 時 RunSQL 無法拆分多個語句，需逐句傳入
+        migrations.RunSQL([sql for sql in MERGE_DUPLICATES_SQL.split(';') if sql.strip()], migrations.RunSQL.noop),
+        migrations.AlterUniqueTogether(
+            name='dailytran',
+            unique_together=set([('product', 'source', 'date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='dailytran',
+            index_together=set([('product', 'date')]),
+        ),
+        migrations.RunSQL([NULL_SOURCE_UNIQUE_SQL], [DROP_NULL_SOURCE_UNIQUE_SQL]),
+    ]
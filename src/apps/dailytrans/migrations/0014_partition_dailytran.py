@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# 依年度建立分區，已存在時略過
+CREATE_PARTITION_FUNCTION_SQL = '''
+    CREATE OR REPLACE FUNCTION dailytrans_dailytran_create_partition(year integer) RETURNS void AS $$
+    BEGIN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF dailytrans_dailytran FOR VALUES FROM (%L) TO (%L)',
+            'dailytrans_dailytran_y' || year, make_date(year, 1, 1), make_date(year + 1, 1, 1)
+        );
+    END
+    $$ LANGUAGE plpgsql
+'''
+
+DROP_PARTITION_FUNCTION_SQL = 'DROP FUNCTION IF EXISTS dailytrans_dailytran_create_partition(integer)'
+
+# 建立 2011 年(或既有資料最早的年度)至明年(或既有資料最晚的年度)的分區
+CREATE_PARTITIONS_SQL = '''
+    DO $$
+    DECLARE
+        y integer;
+    BEGIN
+        FOR y IN
+            SELECT generate_series(
+                LEAST(COALESCE(EXTRACT(YEAR FROM MIN(date))::integer, 2011), 2011),
+                GREATEST(COALESCE(EXTRACT(YEAR FROM MAX(date))::integer, 0), EXTRACT(YEAR FROM now())::integer + 1)
+            )
+            FROM {table}
+        LOOP
+            PERFORM dailytrans_dailytran_create_partition(y);
+        END LOOP;
+    END
+    $$
+'''
+
+# 主鍵、唯一值及索引皆需包含分區鍵 date，於搬移資料後再建立
+CONSTRAINTS_SQL = [
+    'ALTER TABLE dailytrans_dailytran ADD CONSTRAINT dailytrans_dailytran_pkey PRIMARY KEY (id, date)',
+    'ALTER TABLE dailytrans_dailytran ADD CONSTRAINT dailytrans_dailytran_product_id_source_id_date_uniq '
+    'UNIQUE (product_id, source_id, date)',
+    'CREATE UNIQUE INDEX dailytrans_dailytran_product_date_null_source_uniq '
+    'ON dailytrans_dailytran (product_id, date) WHERE source_id IS NULL',
+    'CREATE INDEX dailytrans_dailytran_product_id_date_idx ON dailytrans_dailytran (product_id, date)',
+    'CREATE INDEX dailytrans_dailytran_source_id_idx ON dailytrans_dailytran (source_id)',
+    'ALTER TABLE dailytrans_dailytran ADD CONSTRAINT dailytrans_dailytran_product_id_fk '
+    'FOREIGN KEY (product_id) REFERENCES configs_abstractproduct (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE dailytrans_dailytran ADD CONSTRAINT dailytrans_dailytran_source_id_fk '
+    'FOREIGN KEY (source_id) REFERENCES configs_source (id) DEFERRABLE INITIALLY DEFERRED',
+]
+
+# 分區表的主鍵、唯一值及索引需 PostgreSQL 11 以上
+CHECK_SERVER_VERSION_SQL = '''
+    DO $$
+    BEGIN
+        IF current_setting('server_version_num')::integer < 110000 THEN
+            RAISE EXCEPTION 'dailytrans_dailytran partitioning requires PostgreSQL 11 or later (server is %)',
+                current_setting('server_version');
+        END IF;
+    END
+    $$
+'''
+
+PARTITION_SQL = [
+    CHECK_SERVER_VERSION_SQL,
+    'ALTER TABLE dailytrans_dailytran RENAME TO dailytrans_dailytran_unpartitioned',
+    'CREATE TABLE dailytrans_dailytran (LIKE dailytrans_dailytran_unpartitioned INCLUDING DEFAULTS) '
+    'PARTITION BY RANGE (date)',
+    'ALTER SEQUENCE dailytrans_dailytran_id_seq OWNED BY dailytrans_dailytran.id',
+    CREATE_PARTITION_FUNCTION_SQL,
+    CREATE_PARTITIONS_SQL.format(table='dailytrans_dailytran_unpartitioned'),
+    'INSERT INTO dailytrans_dailytran SELECT * FROM dailytrans_dailytran_unpartitioned',
+    'DROP TABLE dailytrans_dailytran_unpartitioned',
+] + CONSTRAINTS_SQL
+
+UNPARTITION_SQL = [
+    'ALTER TABLE dailytrans_dailytran RENAME TO dailytrans_dailytran_partitioned',
+    'CREATE TABLE dailytrans_dailytran (LIKE dailytrans_dailytran_partitioned INCLUDING DEFAULTS)',
+    'ALTER SEQUENCE dailytrans_dailytran_id_seq OWNED BY dailytrans_dailytran.id',
+    'INSERT INTO dailytrans_dailytran SELECT * FROM dailytrans_dailytran_partitioned',
+    'DROP TABLE dailytrans_dailytran_partitioned',
+    DROP_PARTITION_FUNCTION_SQL,
+    'ALTER TABLE dailytrans_dailytran ADD CONSTRAINT dailytrans_dailytran_pkey PRIMARY KEY (id)',
+] + CONSTRAINTS_SQL[1:]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configs', '0001_initial'),
+        ('dailytrans', '0013_dailytran_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dailytrans', '0014_partition_dailytran'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportArtifact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('daily', 'Daily Report')], max_length=20, verbose_name='Kind')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('version', models.CharField(max_length=40, verbose_name='Version')),
+                ('file_name', models.CharField(max_length=120, verbose_name='File Name')),
+                ('content', models.BinaryField(verbose_name='Content')),
+                ('file_id', models.CharField(blank=True, max_length=120, null=True, verbose_name='File ID')),
+                ('update_time', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('create_time', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created')),
+            ],
+            options={
+                'verbose_name': 'Report Artifact',
+                'verbose_name_plural': 'Report Artifacts',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='reportartifact',
+            unique_together=set([('kind', 'date', 'version')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# 同時重新計算時 source 為空的彙總資料可能重複新增，每一筆皆為完整的彙總結果，只保留 id 最小的一筆
+DELETE_DUPLICATES_SQL = '''
+    DELETE FROM dailytrans_dailytranaggregate x
+    USING dailytrans_dailytranaggregate y
+    WHERE x.source_id IS NULL AND y.source_id IS NULL
+        AND x.product_id = y.product_id AND x.date = y.date AND x.id > y.id
+'''
+
+# unique_together 無法限制 source 為空的資料(NULL 不相等)，另建 partial unique index
+NULL_SOURCE_UNIQUE_SQL = '''
+    CREATE UNIQUE INDEX dailytrans_dailytranaggregate_product_date_null_source_uniq
+    ON dailytrans_dailytranaggregate (product_id, date) WHERE source_id IS NULL
+'''
+
+DROP_NULL_SOURCE_UNIQUE_SQL = 'DROP INDEX dailytrans_dailytranaggregate_product_date_null_source_uniq'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dailytrans', '0015_reportartifact'),
+    ]
+
+    operations = [
+        migrations.RunSQL([DELETE_DUPLICATES_SQL], migrations.RunSQL.noop),
+        migrations.RunSQL([NULL_SOURCE_UNIQUE_SQL], [DROP_NULL_SOURCE_UNIQUE_SQL]),
+    ]
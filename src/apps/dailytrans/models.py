@@ -1,11 +1,18 @@
 import calendar
 import datetime
+import operator
+from functools import reduce
 
-from dateutil import rrule
 from typing import Optional, List
 from apps.configs.models import AbstractProduct, Source
+from django.contrib.postgres.fields import JSONField
+from django.db import connection, transaction
 from django.db.models import (
     CASCADE,
+    SET_NULL,
+    BigIntegerField,
+    BinaryField,
+    BooleanField,
     CharField,
     DateField,
     DateTimeField,
@@ -13,17 +20,46 @@ from django.db.models import (
     FloatField,
     IntegerField,
     Model,
-    QuerySet
+    PositiveIntegerField,
+    Q,
+    QuerySet,
+    TextField,
 )
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from dashboard.caches import chart_cache
+
 
 class DailyTranQuerySet(QuerySet):
     def update(self, *args, **kwargs):
         kwargs['update_time'] = timezone.now()
-        super(DailyTranQuerySet, self).update(**kwargs)
-        # 父類別的 update() 只會處理 **kwargs，並不會處理 *args
+
+        # 更新到彙總相關的欄位時，需重新計算更新前後對應的 DailyTranAggregate
+        if not AGGREGATE_SOURCE_FIELDS.intersection(kwargs):
+            super(DailyTranQuerySet, self).update(**kwargs)
+            # 父類別的 update() 只會處理 **kwargs，並不會處理 *args
+            return
+
+        with transaction.atomic():
+            rows = list(self.values_list('id', 'product_id', 'source_id', 'date'))
+            super(DailyTranQuerySet, self).update(**kwargs)
+
+            keys = {row[1:] for row in rows}
+            keys.update(DailyTran.objects.filter(
+                id__in=[row[0] for row in rows]
+            ).values_list('product_id', 'source_id', 'date'))
+            DailyTranAggregate.objects.refresh(keys)
+
+    def delete(self):
+        keys = set(self.values_list('product_id', 'source_id', 'date'))
+
+        with transaction.atomic():
+            result = super(DailyTranQuerySet, self).delete()
+            DailyTranAggregate.objects.refresh(keys)
+
+        return result
 
     def between_month_day_filter(
             self,
@@ -52,40 +88,130 @@ class DailyTranQuerySet(QuerySet):
         if not start_date or not end_date:
             return self
 
-        date_ranges = []
-        start_year = start_date.year
-        end_year = end_date.year
-
-        # 每跑一次 i 就是 start_year - i 年, end_year - i 年
-        # 如果 start_date 是2月29日 且當前年份 start_year - i 年是閏年，就調整為當年的3月1日
-        # 跳過閏年是為了每年都用同樣的天數來比較
-        for i in range(start_year - 2011 + 1):
-            start_date = (
-                datetime.date(start_year - i, start_date.month + 1, 1)
-                    if (is_leap(start_year - i) and start_date.month == 2 and start_date.day == 29)
-                    else datetime.date(start_year - i, start_date.month, start_date.day)
-            )
+        date_ranges = month_day_ranges(start_date, end_date)
 
-            end_date = (
-                datetime.date(end_year - i, end_date.month, end_date.day - 1)
-                    if (is_leap(end_year - i) and end_date.month == 2 and end_date.day == 29)
-                    else datetime.date(end_year - i, end_date.month, end_date.day)
-            )
-            # rrule() 會在每天各產生一個日期 ex. 2025-01-01
-            date_range = list(rrule.rrule(rrule.DAILY, dtstart=start_date, until=end_date))
-            date_ranges.extend(date_range)
-        # date__in 為 SQL 的 IN 條件，只選出 date 欄位的值
-        return self.filter(date__in=date_ranges)
+        if not date_ranges:
+            return self.none()
+
+        # 每年一個 BETWEEN 條件，可使用 date 的索引做範圍掃描，不需列出每一天
+        return self.filter(reduce(operator.or_, (Q(date__range=date_range) for date_range in date_ranges)))
 
     def filter_by_date_lte(self, days: List[datetime.datetime],
                         products: List[AbstractProduct],
                         sources: Optional[List[Source]] = None) -> List['DailyTran']:
+        """
+        取得每個指定日期(含)以前最近一筆的日交易，沒有資料的日期為 None
+
+        :return: List[Optional[DailyTran]]，順序與 days 相同
+        """
         qs = (
             self.filter(product__in=products, source__in=sources)
             if sources else self.filter(product__in=products)
         )
-        # date__lte 為 查詢 date 欄位 <= 指定日期
-        return [qs.filter(date__lte=d.date()).order_by('-date').first() for d in days]
+        trans = {tran.as_of_date: tran for tran in qs.latest_on_or_before(days)}
+
+        return [trans.get(as_date(d)) for d in days]
+
+    # 每個指定日期以 LATERAL 子查詢取得 date <= 指定日期的最近一筆，可使用 (product_id, date) 索引反向掃描，
+    # 不需逐日查詢；指定 group_by 時對每個組合(來自同一個 QuerySet)各取一筆
+    LATEST_ON_OR_BEFORE_SQL = '''
+        SELECT q.*, d.as_of_date
+        FROM unnest(%s::date[]) AS d (as_of_date)
+        {groups}
+        CROSS JOIN LATERAL (
+            SELECT * FROM ({query}) t
+            WHERE t.date <= d.as_of_date {match}
+            ORDER BY t.date DESC, t.id DESC
+            LIMIT 1
+        ) q
+        ORDER BY {order}d.as_of_date
+    '''
+
+    def latest_on_or_before(self, days, group_by=()):
+        """
+        一次查詢取得多個日期(及多個品項/來源組合)在該日期(含)以前最近一筆的日交易，用於報表中沿用最近價格的邏輯
+
+        e.g.
+        DailyTran.objects.filter(product__in=products).latest_on_or_before(days)
+        DailyTran.objects.filter(product__in=products).latest_on_or_before(days, group_by=('product_id', 'source_id'))
+
+        :param days: Iterable[datetime.date | datetime.datetime]
+        :param group_by: Iterable[str]，DailyTran 欄位的 attname，未指定時整個 QuerySet 視為同一組
+        :return: List[DailyTran]，每筆多一個 as_of_date 屬性(對應的指定日期)，沒有資料的日期/組合不會回傳
+        """
+
+        query = self.latest_on_or_before_sql(days, group_by)
+
+        if query is None:
+            return []
+
+        return list(self.model._default_manager.db_manager(self.db).raw(*query))
+
+    def latest_on_or_before_sql(self, days, group_by=()):
+        """
+        :return: (sql, params)，沒有指定日期或 QuerySet 不會有結果時為 None
+        """
+
+        days = sorted({as_date(d) for d in days})
+        meta = self.model._meta
+        group_by = [meta.get_field(name) for name in group_by]
+
+        if not days:
+            return None
+
+        try:
+            # 子查詢的欄位名稱為資料表欄位名稱，raw() 可直接對應回 model
+            sql, params = self.order_by().values_list(
+                *[field.attname for field in meta.concrete_fields]
+            ).query.sql_with_params()
+        except EmptyResultSet:
+            # filter(xxx__in=[]) 等不會有結果的條件
+            return None
+
+        groups, match, order = '', '', ''
+        group_params = ()
+
+        if group_by:
+            group_columns = ', '.join(field.column for field in group_by)
+            groups = 'CROSS JOIN (SELECT DISTINCT {} FROM ({}) g) g'.format(group_columns, sql)
+            # 可為空值的欄位(例如 source)需以 IS NOT DISTINCT FROM 比對
+            match = ''.join(
+                ' AND t.{0} {1} g.{0}'.format(field.column, 'IS NOT DISTINCT FROM' if field.null else '=')
+                for field in group_by
+            )
+            order = ''.join('g.{}, '.format(field.column) for field in group_by)
+            group_params = tuple(params)
+
+        return (
+            self.LATEST_ON_OR_BEFORE_SQL.format(query=sql, groups=groups, match=match, order=order),
+            (days,) + group_params + tuple(params),
+        )
+
+    def create_partitions(self, start_year, end_year):
+        """
+        dailytrans_dailytran 依 date 以年度分區(見 migrations/0014)，寫入沒有分區的年度會失敗，
+        需事先建立分區，已存在的分區會略過
+
+        :param start_year: int
+        :param end_year: int，包含此年度
+        """
+
+        with connection.cursor() as cursor:
+            for year in range(start_year, end_year + 1):
+                cursor.execute('SELECT dailytrans_dailytran_create_partition(%s)', [year])
+
+    def partitions(self):
+        """
+        :return: List[str]，依名稱排序的分區資料表
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+                [DailyTran._meta.db_table],
+            )
+            return [row[0] for row in cursor.fetchall()]
 
 
 class DailyTran(Model):
@@ -121,6 +247,9 @@ class DailyTran(Model):
     class Meta:
         verbose_name = _('Daily Transition')
         verbose_name_plural = _('Daily Transitions')
+        # source 為空的資料另以 partial unique index(product, date)限制，見 migrations/0013
+        unique_together = ('product', 'source', 'date')
+        index_together = (('product', 'date'),)
 
     def __str__(self):
         return (f'product: {self.product.name}, source: {self.source}, avg_price: {self.avg_price}'
@@ -131,6 +260,218 @@ class DailyTran(Model):
     def month_day(self):
         return int(self.date.strftime('%m%d'))
 
+    @property
+    def aggregate_key(self):
+        return self.product_id, self.source_id, self.date
+
+    def save(self, *args, **kwargs):
+        # 人工新增或修改(admin)的資料，需重新計算修改前後對應的 DailyTranAggregate
+        with transaction.atomic():
+            old_key = DailyTran.objects.filter(
+                id=self.id
+            ).values_list('product_id', 'source_id', 'date').first() if self.id else None
+
+            super(DailyTran, self).save(*args, **kwargs)
+            DailyTranAggregate.objects.refresh({key for key in (old_key, self.aggregate_key) if key})
+
+    def delete(self, *args, **kwargs):
+        key = self.aggregate_key
+
+        with transaction.atomic():
+            result = super(DailyTran, self).delete(*args, **kwargs)
+            DailyTranAggregate.objects.refresh([key])
+
+        return result
+
+
+# 影響 DailyTranAggregate 計算結果的 DailyTran 欄位
+AGGREGATE_SOURCE_FIELDS = {'product', 'product_id', 'source', 'source_id', 'date', 'avg_price', 'avg_weight', 'volume'}
+
+
+class DailyTranAggregateQuerySet(QuerySet):
+    """
+    DailyTranAggregate 由 DailyTran 的寫入端(DailyTranUpserter、DailyTranCopyImporter、DailyTran.save/delete、
+    DailyTranQuerySet.update/delete)以 key 為單位重新計算，不需由使用端維護
+    """
+
+    BATCH_SIZE = 1000
+
+    between_month_day_filter = DailyTranQuerySet.between_month_day_filter
+
+    # (product, source, date) 為 key 將 DailyTran 彙總，計算方式與 `get_group_by_date_query_set` 相同:
+    # 交易量、重量缺值時以 1 計算，positive_* 只計算交易量及重量皆大於 0 的資料
+    AGGREGATE_SQL = '''
+        INSERT INTO {aggregate} (
+            product_id, source_id, type_id, date, count, volume_count, weight_count,
+            price_vol_wt, vol_wt, vol, volume,
+            positive_count, positive_price_vol_wt, positive_vol_wt, positive_volume
+        )
+        SELECT
+            t.product_id, t.source_id, p.type_id, t.date, COUNT(*), COUNT(t.volume), COUNT(t.avg_weight),
+            SUM(t.avg_price * COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+            SUM(COALESCE(t.avg_weight, 1) * COALESCE(t.volume, 1)),
+            SUM(COALESCE(t.volume, 1)),
+            COALESCE(SUM(t.volume), 0),
+            COUNT(*) FILTER (WHERE {positive}),
+            COALESCE(SUM(t.avg_price * t.avg_weight * t.volume) FILTER (WHERE {positive}), 0),
+            COALESCE(SUM(t.avg_weight * t.volume) FILTER (WHERE {positive}), 0),
+            COALESCE(SUM(t.volume) FILTER (WHERE {positive}), 0)
+        FROM {dailytran} t
+        JOIN {product} p ON p.id = t.product_id
+        {join}
+        {where}
+        GROUP BY t.product_id, t.source_id, p.type_id, t.date
+    '''
+
+    @classmethod
+    def _aggregate_sql(cls, join='', where=''):
+        return cls.AGGREGATE_SQL.format(
+            aggregate=DailyTranAggregate._meta.db_table,
+            dailytran=DailyTran._meta.db_table,
+            product=AbstractProduct._meta.db_table,
+            positive='t.volume > 0 AND t.avg_weight > 0',
+            join=join,
+            where=where,
+        )
+
+    def _refresh(self, cursor, keys_sql, params=()):
+        """
+        :param keys_sql: str，回傳 (product_id, source_id, date) 的子查詢
+        """
+
+        match = 'x.product_id = k.product_id AND x.date = k.date AND x.source_id IS NOT DISTINCT FROM k.source_id'
+
+        # 同時重新計算相同 key 的交易會互相等待，避免重複新增(source 為空時)或違反唯一值；依固定順序取得 lock 避免 deadlock
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(h) FROM ('
+            "SELECT DISTINCT hashtext(format('{aggregate}:%%s:%%s:%%s', k.product_id, k.source_id, k.date)) AS h "
+            'FROM {keys} ORDER BY h) AS locks'.format(aggregate=DailyTranAggregate._meta.db_table, keys=keys_sql),
+            params,
+        )
+        cursor.execute(
+            'DELETE FROM {aggregate} x USING {keys} k WHERE {match}'.format(
+                aggregate=DailyTranAggregate._meta.db_table, keys=keys_sql, match=match
+            ),
+            params,
+        )
+        cursor.execute(
+            self._aggregate_sql(join='JOIN {keys} k ON {match}'.format(keys=keys_sql, match=match.replace('x.', 't.'))),
+            params,
+        )
+
+    def refresh(self, keys):
+        """
+        重新計算指定 key 的彙總資料，key 對應的 DailyTran 已不存在時會刪除彙總資料
+
+        :param keys: Iterable[Tuple[product_id, source_id, date]]
+        """
+
+        keys = list(set(keys))
+
+        if not keys:
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[i:i + self.BATCH_SIZE]
+                keys_sql = '(VALUES {}) AS k (product_id, source_id, date)'.format(
+                    ', '.join(['(%s, %s::integer, %s::date)'] * len(batch))
+                )
+                self._refresh(cursor, keys_sql, [value for key in batch for value in key])
+
+        dates = [key[2] for key in keys]
+        self._changed({key[0] for key in keys}, min(dates), max(dates))
+
+    def refresh_from_table(self, table):
+        """
+        以資料表(例如 DailyTranCopyImporter 的暫存表)中的 product_id, source_id, date 重新計算彙總資料
+        """
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._refresh(cursor, '(SELECT DISTINCT product_id, source_id, date FROM {}) AS k'.format(table))
+            cursor.execute('SELECT DISTINCT product_id FROM {}'.format(table))
+            product_ids = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT MIN(date), MAX(date) FROM {}'.format(table))
+            start_date, end_date = cursor.fetchone()
+
+        self._changed(product_ids, start_date, end_date)
+
+    def rebuild(self, start_date=None, end_date=None):
+        """
+        重新計算日期區間內(未指定時為全部)的彙總資料，用於初始化或修復
+
+        :return: int，彙總後的筆數
+        """
+
+        where, params = '', []
+        if start_date and end_date:
+            where, params = 'WHERE t.date BETWEEN %s AND %s', [start_date, end_date]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            qs = self.filter(date__range=(start_date, end_date)) if params else self.all()
+            qs.delete()
+            cursor.execute(self._aggregate_sql(where=where), params)
+            rowcount = cursor.rowcount
+
+        transaction.on_commit(chart_cache.invalidate_all)
+
+        if start_date and end_date:
+            transaction.on_commit(lambda: schedule_report_artifacts(start_date, end_date))
+
+        return rowcount
+
+    @staticmethod
+    def _changed(product_ids, start_date, end_date):
+        # 交易 commit 後才使圖表快取失效，避免其他 request 在 commit 前以舊資料重建快取
+        transaction.on_commit(lambda: chart_cache.invalidate(product_ids))
+
+        if start_date and end_date:
+            transaction.on_commit(lambda: schedule_report_artifacts(start_date, end_date))
+
+
+class DailyTranAggregate(Model):
+    """
+    以 (product, source, type, date) 預先彙總的 DailyTran，圖表及整合分析只需加總此表，不需讀取所有原始資料
+    欄位皆為加總值，取平均時需於查詢端相除:
+    - avg_price = price_vol_wt / vol_wt
+    - avg_weight = vol_wt / vol
+    交易量及重量皆完整時(has_volume and has_weight)改用 positive_* 欄位
+
+    product: 毛豬(75公斤以上)
+    source: 臺北市
+    type: 批發
+    date: 2024-01-01
+    count: 1, volume_count: 1, weight_count: 1
+    price_vol_wt: 6561000.0, vol_wt: 81000.0, vol: 1000.0, volume: 1000.0
+    """
+    product = ForeignKey('configs.AbstractProduct', on_delete=CASCADE, verbose_name=_('Product'))
+    source = ForeignKey('configs.Source', null=True, blank=True, on_delete=CASCADE, verbose_name=_('Source'))
+    type = ForeignKey('configs.Type', null=True, blank=True, on_delete=SET_NULL, verbose_name=_('Type'))
+    date = DateField(verbose_name=_('Date'))
+    count = IntegerField(default=0, verbose_name=_('Count'))
+    volume_count = IntegerField(default=0, verbose_name=_('Volume Count'))
+    weight_count = IntegerField(default=0, verbose_name=_('Weight Count'))
+    price_vol_wt = FloatField(default=0, verbose_name=_('Price Volume Weight'))
+    vol_wt = FloatField(default=0, verbose_name=_('Volume Weight'))
+    vol = FloatField(default=0, verbose_name=_('Volume For Calculation'))
+    volume = FloatField(default=0, verbose_name=_('Volume'))
+    positive_count = IntegerField(default=0, verbose_name=_('Positive Count'))
+    positive_price_vol_wt = FloatField(default=0, verbose_name=_('Positive Price Volume Weight'))
+    positive_vol_wt = FloatField(default=0, verbose_name=_('Positive Volume Weight'))
+    positive_volume = FloatField(default=0, verbose_name=_('Positive Volume'))
+
+    objects = DailyTranAggregateQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Daily Transition Aggregate')
+        verbose_name_plural = _('Daily Transition Aggregates')
+        # source 為空的資料另以 partial unique index(product, date)限制，見 migrations/0016
+        unique_together = ('product', 'source', 'date')
+        index_together = ('type', 'product', 'date')
+
+    def __str__(self):
+        return f'product: {self.product_id}, source: {self.source_id}, date: {self.date}, count: {self.count}'
+
 
 class DailyReport(Model):
     """
@@ -173,5 +514,161 @@ class FestivalReport(Model):
     def __str__(self):
         return f'{self.festival_id}, {self.file_id}, {self.file_volume_id}'
 
+
+class ReportArtifact(Model):
+    """
+    背景產生的報表檔案(apps/dailytrans/reports/artifacts.py)，以 (kind, date, version) 為索引，
+    version 為報表資料範圍內 DailyTran 的版本雜湊，資料未異動時不會重新產生
+
+    kind: daily
+    date: 2024-12-10
+    version: 3f786850e387550fdab836ed7e6dc881de23001b
+    file_name: 113.12.04-113.12.10價格三.xlsx
+    file_id: 1bH64LKtP6UTMwQY0aWAnXz9VZRdf0rnM
+    """
+    DAILY_REPORT = 'daily'
+    KIND_CHOICES = (
+        (DAILY_REPORT, _('Daily Report')),
+    )
+
+    kind = CharField(max_length=20, choices=KIND_CHOICES, verbose_name=_('Kind'))
+    date = DateField(verbose_name=_('Date'))
+    version = CharField(max_length=40, verbose_name=_('Version'))
+    file_name = CharField(max_length=120, verbose_name=_('File Name'))
+    content = BinaryField(verbose_name=_('Content'))
+    file_id = CharField(max_length=120, null=True, blank=True, verbose_name=_('File ID'))
+    update_time = DateTimeField(auto_now=True, null=True, blank=True, verbose_name=_('Updated'))
+    create_time = DateTimeField(auto_now_add=True, null=True, blank=True, verbose_name=_('Created'))
+
+    class Meta:
+        verbose_name = _('Report Artifact')
+        verbose_name_plural = _('Report Artifacts')
+        unique_together = ('kind', 'date', 'version')
+
+    def __str__(self):
+        return f'{self.kind}, {self.date}, {self.version}'
+
+
+class BackfillCheckpoint(Model):
+    """
+    歷史資料回補(manage.py backfill)每個日期區間的執行紀錄，中斷後重新執行時會略過已成功的區間
+
+    job: apps.crops.builder.direct_wholesale_05
+    start_date: 2020-01-01
+    end_date: 2020-01-30
+    success: True
+    rows: 3650
+    duration: 42.5
+    """
+    job = CharField(max_length=120, verbose_name=_('Job'))
+    start_date = DateField(verbose_name=_('Start Date'))
+    end_date = DateField(verbose_name=_('End Date'))
+    success = BooleanField(default=False, verbose_name=_('Success'))
+    rows = IntegerField(default=0, verbose_name=_('Rows'))
+    duration = FloatField(default=0, verbose_name=_('Duration'))
+    msg = TextField(blank=True, default='', verbose_name=_('Message'))
+    update_time = DateTimeField(auto_now=True, null=True, blank=True, verbose_name=_('Updated'))
+    create_time = DateTimeField(auto_now_add=True, null=True, blank=True, verbose_name=_('Created'))
+
+    class Meta:
+        verbose_name = _('Backfill Checkpoint')
+        verbose_name_plural = _('Backfill Checkpoints')
+        unique_together = ('job', 'start_date', 'end_date')
+
+    def __str__(self):
+        return f'{self.job}, {self.start_date} - {self.end_date}, success: {self.success}'
+
+
+class BuilderRun(Model):
+    """
+    每次 `director` 執行的統計數據(apps/dailytrans/builders/metrics.py)，用於觀察各 API 的資料量及效能趨勢
+    組合型 direct(例如 apps.crops.builder.direct)的紀錄包含其呼叫的子 direct 的數據
+
+    job: apps.crops.builder.direct_wholesale_05
+    type_code: LOT-crops
+    fetched: 5230, matched: 4870, unmatched: 360
+    inserted: 120, updated: 35, deleted: 0, unchanged: 4715, skipped: 0
+    requests: 2, bytes_downloaded: 1843200
+    latency_p50: 1.2, latency_p95: 3.4, latency_max: 3.4
+    stages: {"http": 2.4, "upsert": 0.8}
+    unmatched_codes: {"Product: LA1": 12, "Source: 台北二": 3}
+    """
+    job = CharField(max_length=120, verbose_name=_('Job'))
+    type_code = CharField(max_length=50, null=True, blank=True, verbose_name=_('Type Code'))
+    start_date = DateField(null=True, blank=True, verbose_name=_('Start Date'))
+    end_date = DateField(null=True, blank=True, verbose_name=_('End Date'))
+    success = BooleanField(default=False, verbose_name=_('Success'))
+    duration = FloatField(null=True, blank=True, verbose_name=_('Duration'))
+    fetched = PositiveIntegerField(default=0, verbose_name=_('Fetched'))
+    matched = PositiveIntegerField(default=0, verbose_name=_('Matched'))
+    unmatched = PositiveIntegerField(default=0, verbose_name=_('Unmatched'))
+    inserted = PositiveIntegerField(default=0, verbose_name=_('Inserted'))
+    updated = PositiveIntegerField(default=0, verbose_name=_('Updated Rows'))
+    deleted = PositiveIntegerField(default=0, verbose_name=_('Deleted'))
+    unchanged = PositiveIntegerField(default=0, verbose_name=_('Unchanged'))
+    skipped = PositiveIntegerField(default=0, verbose_name=_('Skipped'))
+    requests = PositiveIntegerField(default=0, verbose_name=_('Requests'))
+    bytes_downloaded = BigIntegerField(default=0, verbose_name=_('Bytes Downloaded'))
+    latency_p50 = FloatField(null=True, blank=True, verbose_name=_('Latency P50'))
+    latency_p95 = FloatField(null=True, blank=True, verbose_name=_('Latency P95'))
+    latency_max = FloatField(null=True, blank=True, verbose_name=_('Latency Max'))
+    stages = JSONField(default=dict, blank=True, verbose_name=_('Stages'))
+    unmatched_codes = JSONField(default=dict, blank=True, verbose_name=_('Unmatched Codes'))
+    msg = TextField(blank=True, default='', verbose_name=_('Message'))
+    create_time = DateTimeField(auto_now_add=True, null=True, blank=True, db_index=True, verbose_name=_('Created'))
+
+    class Meta:
+        verbose_name = _('Builder Run')
+        verbose_name_plural = _('Builder Runs')
+
+    def __str__(self):
+        return f'{self.job}, {self.start_date} - {self.end_date}, success: {self.success}'
+
+
+def schedule_report_artifacts(start_date, end_date):
+    """ 排程重新產生受影響的報表檔案，報表模組依賴本模組，需於此時才 import """
+
+    from apps.dailytrans.reports.artifacts import DailyReportStore
+
+    DailyReportStore().schedule(as_date(start_date), as_date(end_date))
+
+
+def as_date(value):
+    """ datetime 轉為 date，date 直接回傳 """
+
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
 def is_leap(year):
     return calendar.isleap(year)
+
+
+def month_day_ranges(start_date, end_date, first_year=2011):
+    """
+    將 start_date ~ end_date 的月日區間展開為 first_year 至 start_date 當年每一年的日期區間
+
+    :return: List[Tuple[datetime.date, datetime.date]]，由近至遠排列
+    """
+
+    date_ranges = []
+    start_year = start_date.year
+    end_year = end_date.year
+
+    # 每跑一次 i 就是 start_year - i 年, end_year - i 年
+    # 如果 start_date 是2月29日 且當前年份 start_year - i 年是閏年，就調整為當年的3月1日
+    # 跳過閏年是為了每年都用同樣的天數來比較
+    for i in range(start_year - first_year + 1):
+        start_date = (
+            datetime.date(start_year - i, start_date.month + 1, 1)
+                if (is_leap(start_year - i) and start_date.month == 2 and start_date.day == 29)
+                else datetime.date(start_year - i, start_date.month, start_date.day)
+        )
+
+        end_date = (
+            datetime.date(end_year - i, end_date.month, end_date.day - 1)
+                if (is_leap(end_year - i) and end_date.month == 2 and end_date.day == 29)
+                else datetime.date(end_year - i, end_date.month, end_date.day)
+        )
+        date_ranges.append((start_date, end_date))
+
+    return date_ranges
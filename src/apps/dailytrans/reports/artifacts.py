@@ -0,0 +1,330 @@
+import calendar
+import datetime
+import hashlib
+import json
+import logging
+import operator
+import os
+import tempfile
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache as base_cache
+from django.db.models import Count, Max, Q, Sum
+
+from apps.dailytrans.models import DailyTran, DailyTranAggregate, ReportArtifact
+from apps.dailytrans.reports.dailyreport import DailyReportFactory
+from apps.watchlists.models import MonitorProfile, Watchlist
+from google_api.backends import DefaultGoogleDriveClient
+
+db_logger = logging.getLogger('aprp')
+
+
+def default_report_date():
+    # 未指定日期時為前一天的報表
+    return datetime.date.today() - datetime.timedelta(days=1)
+
+
+class DailyReportStore(object):
+    """
+    日報表檔案(ReportArtifact)的產生與存放，request 只讀取已產生的檔案，不會在 request 中執行 `DailyReportFactory`
+
+    - 報表於背景(Celery)產生，以 (kind, date, version) 為索引存放於資料庫，並上傳至 Google Drive 供網頁預覽
+    - version 為報表讀取的 DailyTran、DailyTranAggregate 及監控清單的雜湊(`version`)，資料未異動時不會重新產生
+    - DailyTran 寫入並 commit 後(`DailyTranAggregateQuerySet.refresh`)，延遲 `delay` 秒排程重新產生受影響的報表，
+      同一批 builder 的多次寫入只會排程一次
+    - 同一天只保留最新版本的報表
+    """
+
+    KIND = ReportArtifact.DAILY_REPORT
+    # 報表格式或計算方式變更時加一，使既有的報表重新產生
+    FORMAT_VERSION = 1
+    LOCK_KEY = 'daily-report-lock:{}'
+    LOCK_TIMEOUT = 60 * 10
+    SCHEDULE_KEY = 'daily-report-scheduled:{}'
+    # 報表日期前 13 天(最近兩週)的資料都會出現在報表中
+    LOOKBACK_DAYS = 13
+    # 其他 worker 正在產生同一天的報表時，至少延遲此秒數再重新排程
+    RETRY_DELAY = 60
+
+    def __init__(self, folder_id=None, delay=None, cache=None):
+        """
+        :param folder_id: str，上傳的 Google Drive 資料夾，空字串為不上傳，預設為 settings.DAILY_REPORT_FOLDER_ID
+        :param delay: int，DailyTran 異動後延遲產生報表的秒數，預設為 settings.DAILY_REPORT_REFRESH_DELAY
+        :param cache: Django cache，用於排程去重及產生報表時的鎖
+        """
+
+        self.folder_id = settings.DAILY_REPORT_FOLDER_ID if folder_id is None else folder_id
+        self.delay = getattr(settings, 'DAILY_REPORT_REFRESH_DELAY', 120) if delay is None else delay
+        self.cache = cache or base_cache
+
+    @staticmethod
+    def factory(date) -> DailyReportFactory:
+        return DailyReportFactory(specify_day=datetime.datetime.combine(date, datetime.time()))
+
+    def latest(self, date, content=True):
+        """
+        :param content: bool，是否讀取檔案內容，只需要 Google Drive 檔案 id 時不讀取
+        :return: Optional[ReportArtifact]，該日期最新版本的報表，不檢查資料是否已異動
+        """
+
+        query_set = ReportArtifact.objects.filter(kind=self.KIND, date=date)
+
+        if not content:
+            query_set = query_set.defer('content')
+
+        return query_set.order_by('-create_time', '-id').first()
+
+    def version(self, date) -> str:
+        """
+        報表資料的版本雜湊，涵蓋 `DailyReportFactory` 實際讀取的資料:
+
+        - 報表日期區間內的 DailyTran，新增、修改(update_time)、刪除皆會改變筆數、id 總和或最後更新時間
+        - 報表品項所有日期的 DailyTranAggregate(交易量、重量完整性)
+        - 羊、牛每日價格沿用的日期區間以前最近一筆 DailyTran
+        - 監控清單及監控品項
+        """
+
+        factory = self.factory(date)
+        date_ranges = factory.date_ranges()
+        items = factory.get_report_items()
+        product_ids = set().union(*(item.product_ids for item in items))
+
+        trans = DailyTran.objects.filter(
+            reduce(operator.or_, (Q(date__range=date_range) for date_range in date_ranges))
+        ).aggregate(count=Count('id'), ids=Sum('id'), updated=Max('update_time'))
+        completeness = list(
+            DailyTranAggregate.objects.filter(product_id__in=product_ids)
+            .values('product_id', 'source_id')
+            .annotate(total=Sum('count'), volumes=Sum('volume_count'), weights=Sum('weight_count'))
+            .values_list('product_id', 'source_id', 'total', 'volumes', 'weights')
+            .order_by('product_id', 'source_id')
+        )
+        as_of = sorted(self._as_of_trans(items, min(start for start, _ in date_ranges)))
+        profiles = MonitorProfile.objects.aggregate(count=Count('id'), updated=Max('update_time'))
+        watchlists = Watchlist.objects.aggregate(count=Count('id'), updated=Max('update_time'))
+
+        payload = json.dumps([self.FORMAT_VERSION, trans, completeness, as_of, profiles, watchlists],
+                             sort_keys=True, default=str)
+
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _as_of_trans(items, start_date):
+        """
+        羊、牛品項在日期區間開始前最近一筆的日交易(依品項及來源分組，涵蓋不篩選來源的查詢)，
+        區間內的資料已包含在日期區間的雜湊
+
+        :return: Set[Tuple[int, str]]，(id, update_time)
+        """
+
+        product_ids = set().union(*(item.as_of_product_ids for item in items))
+
+        if not product_ids:
+            return set()
+
+        trans = DailyTran.objects.filter(product_id__in=product_ids).latest_on_or_before(
+            [start_date - datetime.timedelta(days=1)], group_by=('product_id', 'source_id')
+        )
+
+        return {(tran.id, str(tran.update_time)) for tran in trans}
+
+    def generate(self, date, force=False):
+        """
+        資料未異動時直接回傳已產生的報表，否則產生新版本並刪除舊版本
+
+        :param date: datetime.date
+        :param force: bool，資料未異動時仍重新產生
+        :return: Optional[ReportArtifact]，其他 worker 正在產生且尚無此版本時為 None
+        """
+
+        artifact, _ = self._generate(date, force)
+
+        return artifact
+
+    def _generate(self, date, force=False):
+        """
+        :return: Tuple[Optional[ReportArtifact], bool]，報表及是否因其他 worker 正在產生而未產生
+        """
+
+        version = self.version(date)
+        artifact = ReportArtifact.objects.filter(kind=self.KIND, date=date, version=version).first()
+
+        if artifact and not force:
+            # 先前上傳失敗時重新上傳
+            if self.folder_id and not artifact.file_id:
+                self.upload(artifact)
+            return artifact, False
+
+        lock_key = self.LOCK_KEY.format(date)
+
+        if not self.cache.add(lock_key, 1, self.LOCK_TIMEOUT):
+            return artifact, True
+
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                file_name, file_path = self.factory(date)(output_dir=output_dir)
+
+                with open(str(file_path), 'rb') as f:
+                    content = f.read()
+
+            if artifact is None:
+                artifact = ReportArtifact.objects.create(
+                    kind=self.KIND, date=date, version=version, file_name=file_name, content=content
+                )
+            else:
+                artifact.file_name = file_name
+                artifact.content = content
+                artifact.save()
+
+            if self.folder_id:
+                self.upload(artifact)
+
+            self.prune(artifact)
+        finally:
+            self.cache.delete(lock_key)
+
+        return artifact, False
+
+    def generate_scheduled(self, date):
+        """
+        執行排程(`enqueue`)的報表，開始執行後的異動可再次排程
+
+        - 其他 worker 正在產生同一天的報表時延遲重新排程，避免該 worker 讀取資料後 commit 的異動未反映在報表
+        - 產生後資料版本已改變(產生期間有異動)時再次排程
+        """
+
+        self.cache.delete(self.SCHEDULE_KEY.format(date))
+
+        artifact, locked = self._generate(date)
+
+        if locked or (artifact is not None and artifact.version != self.version(date)):
+            self.enqueue(date, countdown=max(self.delay, self.RETRY_DELAY))
+
+        return artifact
+
+    def upload(self, artifact: ReportArtifact):
+        """
+        上傳至 Google Drive 並設為公開，取代先前上傳的檔案，失敗時只寫入 log，仍可直接下載
+        """
+
+        try:
+            google_drive_client = DefaultGoogleDriveClient()
+
+            with tempfile.TemporaryDirectory() as output_dir:
+                file_path = os.path.join(output_dir, artifact.file_name)
+
+                with open(file_path, 'wb') as f:
+                    f.write(bytes(artifact.content))
+
+                response = google_drive_client.media_upload(
+                    name=artifact.file_name,
+                    file_path=file_path,
+                    from_mimetype=google_drive_client.XLSX_MIME_TYPE,
+                    parents=[self.folder_id],
+                )
+
+            file_id = response.get('id')
+            google_drive_client.set_public_permission(file_id)
+        except Exception as e:
+            db_logger.exception(e, extra={'type_code': 'LOT-dailytrans'})
+            return
+
+        old_file_id = artifact.file_id
+        artifact.file_id = file_id
+        artifact.save(update_fields=['file_id', 'update_time'])
+
+        if old_file_id:
+            self.delete_file(old_file_id)
+
+    def prune(self, artifact: ReportArtifact):
+        """
+        刪除同一天的其他版本及其 Google Drive 檔案
+        """
+
+        others = ReportArtifact.objects.filter(kind=self.KIND, date=artifact.date).exclude(id=artifact.id)
+
+        for file_id in others.exclude(file_id__isnull=True).values_list('file_id', flat=True):
+            self.delete_file(file_id)
+
+        others.delete()
+
+    @staticmethod
+    def delete_file(file_id):
+        try:
+            response = DefaultGoogleDriveClient().delete_file(file_id=file_id)
+            # google drive 刪除成功返回空值
+            if response:
+                db_logger.warning(f'delete google file error:{response}', extra={'type_code': 'LOT-dailytrans'})
+        except Exception as e:
+            db_logger.exception(e, extra={'type_code': 'LOT-dailytrans'})
+
+    def affected_dates(self, start_date, end_date, today=None):
+        """
+        日期區間內的 DailyTran 會出現在哪些日期的報表: 之後 13 天內(最近兩週)及隔年同月份(前一年同月份)，不含未來日期
+
+        :return: Set[datetime.date]
+        """
+
+        today = today or datetime.date.today()
+        dates = set()
+
+        def add_range(start, end):
+            end = min(end, today)
+            while start <= end:
+                dates.add(start)
+                start += datetime.timedelta(days=1)
+
+        add_range(start_date, end_date + datetime.timedelta(days=self.LOOKBACK_DAYS))
+
+        year, month = start_date.year, start_date.month
+
+        while (year, month) <= (end_date.year, end_date.month):
+            first = datetime.date(year + 1, month, 1)
+            add_range(first, first.replace(day=calendar.monthrange(year + 1, month)[1]))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        return dates
+
+    def schedule(self, start_date, end_date):
+        """
+        DailyTran 異動後排程重新產生受影響的報表，只處理已產生過報表的日期及預設日期(前一天)，
+        其他日期於第一次被請求時才產生
+
+        :param start_date: datetime.date，異動資料的最小日期
+        :param end_date: datetime.date，異動資料的最大日期
+        """
+
+        try:
+            dates = self.affected_dates(start_date, end_date)
+
+            if not dates:
+                return
+
+            existing = set(ReportArtifact.objects.filter(
+                kind=self.KIND, date__range=(min(dates), max(dates))
+            ).values_list('date', flat=True).distinct())
+            existing.add(default_report_date())
+
+            for date in sorted(dates & existing):
+                self.enqueue(date, countdown=self.delay)
+        except Exception as e:
+            # 於交易 commit 後執行，不可影響寫入資料的流程
+            db_logger.exception(e, extra={'type_code': 'LOT-dailytrans'})
+
+    def enqueue(self, date, countdown=0):
+        """
+        排程產生報表，已排程且尚未執行時不會重複排程
+        """
+
+        from apps.dailytrans.tasks import generate_daily_report
+
+        key = self.SCHEDULE_KEY.format(date)
+
+        try:
+            if self.cache.add(key, 1, countdown + 60):
+                generate_daily_report.apply_async(args=(date.strftime('%Y-%m-%d'),), countdown=countdown)
+        except Exception as e:
+            # 排程失敗時不保留去重的 key，下次異動或請求時重新排程
+            self.cache.delete(key)
+            db_logger.exception(e, extra={'type_code': 'LOT-dailytrans'})
@@ -1,24 +1,24 @@
 import calendar
 import datetime
-from collections import OrderedDict
+import operator
+from collections import OrderedDict, namedtuple
+from functools import reduce
 from pathlib import Path
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Tuple, Union
 
 import numpy as np
 import openpyxl
 import pandas as pd
 from django.conf import settings
-from django.db.models import QuerySet
+from django.db.models import Q, Sum
 from openpyxl.styles import PatternFill, Font
 from openpyxl.worksheet.worksheet import Worksheet
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
 
 from apps.configs.models import Source, AbstractProduct
-from apps.dailytrans.models import DailyTran, DailyTranQuerySet
-from apps.dailytrans.utils import get_group_by_date_query_set
-from apps.flowers.models import Flower
-from apps.fruits.models import Fruit
+from apps.dailytrans.models import DailyTran, DailyTranAggregate, DailyTranQuerySet
+from apps.dailytrans.utils import group_by_date
 from apps.watchlists.models import Watchlist, WatchlistItem, MonitorProfile
 
 TEMPLATE = str(settings.BASE_DIR('apps/dailytrans/reports/template.xlsx'))
@@ -110,6 +110,27 @@ def get_avg_volume(df: pd.DataFrame):
     return 0 if pd.isna(df['sum_volume'].mean()) else df['sum_volume'].mean()
 
 
+class ReportItem(namedtuple('ReportItem', ('name', 'row', 'product_ids', 'source_ids', 'price', 'profile',
+                                           'as_of_product_ids', 'as_of_source_ids'))):
+    """
+    日報表的一列
+
+    name: 品項名稱(self.result 的 key)
+    row: Excel row number
+    product_ids: 查詢的品項 id
+    source_ids: 查詢的來源 id，None 為不篩選來源
+    price: 監控價格
+    profile: MonitorProfile，額外品項為 None
+    as_of_product_ids, as_of_source_ids: 羊、牛每日價格(指定日期以前最近一筆)查詢的品項及來源
+    """
+
+    @classmethod
+    def extra(cls, product: AbstractProduct, row: int, source_ids):
+        return cls(name=f'{product.name}{product.type}', row=row, product_ids=frozenset([product.id]),
+                   source_ids=source_ids or None, price=None, profile=None,
+                   as_of_product_ids=frozenset(), as_of_source_ids=None)
+
+
 class DailyReportFactory(object):
     def __init__(self, specify_day: datetime.datetime):
         self.specify_day = specify_day
@@ -130,6 +151,8 @@ class DailyReportFactory(object):
         self.col_dict = {}
         self.generate_list_dict()
         self.item_desc = []
+        self.trans: Optional[pd.DataFrame] = None
+        self.completeness: Optional[pd.DataFrame] = None
 
     def generate_list_dict(self):
         """
@@ -162,13 +185,15 @@ class DailyReportFactory(object):
         """
         若品項的監控月份為日報表的月份區間，則將此品項的 row number 加入顯示列表內(row_visible)
 
-        :param profile
+        :param profile: MonitorProfile，months 需已 prefetch_related
         """
 
         # 不在監控品項月份變更底色改為在顯示月份內的品項顯示
         # if item.months.filter(name__icontains=self.specify_day.month) or item.always_display:
         # 原判斷條件導致 10, 11, 12 月份的品項在 1, 2 月分也會出現
-        if profile.months.filter(name=f'{self.specify_day.month}月') or profile.always_display:
+        month_name = f'{self.specify_day.month}月'
+
+        if any(month.name == month_name for month in profile.months.all()) or profile.always_display:
             self.row_visible.append(profile.row)
 
             if profile.product.name == '梨':
@@ -190,7 +215,9 @@ class DailyReportFactory(object):
 
     def get_data(
             self,
-            query_set: QuerySet,
+            df: pd.DataFrame,
+            has_volume: bool,
+            has_weight: bool,
             product_name: str,
             row: int,
             monitor_price: Optional[float] = None
@@ -198,15 +225,13 @@ class DailyReportFactory(object):
         """
         將最近一週當日價格與計算最近一週平均價、與前一週比較、交易量、與前一週比較等資訊，寫入 self.result dict
 
-        :param query_set: 日交易 QuerySet，尚未選擇日期區間
+        :param df: 最近兩週依日期分組後的資料(`group_by_date`)
+        :param has_volume: bool
+        :param has_weight: bool
         :param product_name: 品項名稱
         :param row: int: Excel row number
         :param monitor_price: Optional[float]: 監控價格
         """
-        result_tuple = get_group_by_date_query_set(query_set, self.last_week_start, self.this_week_end)
-        df: pd.DataFrame = result_tuple[0]
-        has_volume: bool = result_tuple[1]
-        has_weight: bool = result_tuple[2]
         self.result[product_name] = {}
 
         for _, q in df.iterrows():
@@ -276,175 +301,258 @@ class DailyReportFactory(object):
             {f'H{row}': this_week_avg_price, f'W{row}': last_week_avg_price}
         )
 
-    def update_data(self, query_set: QuerySet, product_name: str, row: int):
+    def update_data(self, df: pd.DataFrame, has_volume: bool, has_weight: bool, product_name: str, row: int):
         """
         計算 'M-1 年 N 月平均價格' 欄位(G)
 
-        :param query_set: QuerySet
+        :param df: 前一年同月份依日期分組後的資料(`group_by_date`)
+        :param has_volume: bool
+        :param has_weight: bool
         :param product_name: str
         :param row: int
         """
 
-        qs, has_volume, has_weight = get_group_by_date_query_set(query_set)
-        last_year_avg_price = get_avg_price(qs, has_volume, has_weight)
+        last_year_avg_price = get_avg_price(df, has_volume, has_weight)
 
         if last_year_avg_price > 0:
             self.result[product_name].update({f'G{row}': last_year_avg_price})
 
-    def update_rams(self, item, row):
-        query_set = DailyTran.objects.filter(product__in=item.product_list(), source__in=item.sources())
-        for i in range(7):
-            week_day = self.this_week_start + datetime.timedelta(i)
-            qs = query_set.filter(date__lte=week_day.date()).order_by('-date')
-            if qs:
-                qs = qs.first()
-            else:
+    def update_rams(self, item: ReportItem):
+        days = [(self.this_week_start + datetime.timedelta(i)).date() for i in range(7)]
+        trans = self._latest_on_or_before(days, item.product_ids, item.source_ids)
+        for i, day in enumerate(days):
+            qs = trans.get(day)
+            if qs is None:
                 continue
-            if i == 0 or qs.date == week_day.date():
-                self.result[item.product.name].update(
-                    {f"{self.col_dict[f'{week_day.date()}']}{row}": qs.avg_price}
+            if i == 0 or qs.date == day:
+                self.result[item.name].update(
+                    {f"{self.col_dict[f'{day}']}{item.row}": qs.avg_price}
                 )
             else:
-                self.result[item.product.name].update(
+                self.result[item.name].update(
                     {
-                        f"{self.col_dict[f'{week_day.date()}']}{row}": qs.date.strftime(
+                        f"{self.col_dict[f'{day}']}{item.row}": qs.date.strftime(
                             '(%m/%d)'
                         )
                     }
                 )
 
-    def update_cattles(self, item, row):
-        query_set = DailyTran.objects.filter(product__in=item.product_list())
+    def update_cattles(self, item: ReportItem):
+        this_week_days = [(self.this_week_start + datetime.timedelta(i)).date() for i in range(7)]
+        last_week_days = [(self.this_week_start - datetime.timedelta(i)).date() for i in range(1, 8)]
+        trans = self._latest_on_or_before(this_week_days + last_week_days, item.product_ids)
         last_week_price = []
         this_week_price = []
-        for i in range(7):
-            week_day = self.this_week_start + datetime.timedelta(i)
-            qs = query_set.filter(date__lte=week_day.date()).order_by('-date')
-            if not qs:
+        for day in this_week_days:
+            qs = trans.get(day)
+            if qs is None:
                 continue
-            qs = qs.first()
             this_week_price.append(qs.avg_price)
-            self.result[item.product.name].update(
-                {f"{self.col_dict[f'{week_day.date()}']}{row}": qs.avg_price}
+            self.result[item.name].update(
+                {f"{self.col_dict[f'{day}']}{item.row}": qs.avg_price}
             )
-        for i in range(1, 8):
-            week_day = self.this_week_start - datetime.timedelta(i)
-            qs = query_set.filter(date__lte=week_day.date()).order_by('-date')
-            if qs:
-                qs = qs.first()
+        for day in last_week_days:
+            qs = trans.get(day)
+            if qs is not None:
                 last_week_price.append(qs.avg_price)
         if len(last_week_price):
             last_week_avg_price = sum(last_week_price) / len(last_week_price)
-            self.result[item.product.name].update({f'W{row}': last_week_avg_price})
+            self.result[item.name].update({f'W{item.row}': last_week_avg_price})
         if len(this_week_price):
             this_week_avg_price = sum(this_week_price) / len(this_week_price)
-            self.result[item.product.name].update({f'H{row}': this_week_avg_price})
+            self.result[item.name].update({f'H{item.row}': this_week_avg_price})
         if len(last_week_price) and len(this_week_price):
-            self.result[item.product.name].update(
+            self.result[item.name].update(
                 {
-                    f'L{row}': (this_week_avg_price - last_week_avg_price)
+                    f'L{item.row}': (this_week_avg_price - last_week_avg_price)
                                / last_week_avg_price
                                * 100
                 }
             )
 
     def report(self):
+        """
+        先整理所有監控品項及額外品項的(品項, 來源)，再以單一查詢取回最近兩週及前一年同月份的日交易資料，
+        各品項的數值皆由該資料分組計算，不需逐一查詢資料庫
+        """
+
+        items = self.get_report_items()
+        self.fetch_trans(items)
+
+        for item in items:
+            # 最近兩週
+            df = self._partition(self.trans, item.product_ids, item.source_ids)
+            df = df[df['date'] >= self.last_week_start.date()]
+            has_volume, has_weight = self._completeness(item)
+            self.get_data(*group_by_date(df, has_volume, has_weight), item.name, item.row, item.price)
+
+            # 得到前一年同月份資料，交易量、重量完整性以該月份資料判斷
+            df = self._partition(self.trans, item.product_ids, item.source_ids)
+            df = df[(df['date'] >= self.last_year_month_start.date()) & (df['date'] <= self.last_year_month_end.date())]
+            self.update_data(
+                *group_by_date(df, self._has_enough(df['volume'].notna()), self._has_enough(df['avg_weight'].notna())),
+                item.name, item.row
+            )
+
+            if item.profile is None:
+                self.row_visible.append(item.row)
+                continue
+
+            if '羊' in item.name:
+                self.update_rams(item._replace(product_ids=item.as_of_product_ids, source_ids=item.as_of_source_ids))
+            if '牛' in item.name:
+                self.update_cattles(item._replace(product_ids=item.as_of_product_ids))
+            self.check_months(item.profile)
+
+        # TODO: 新增 '寶島梨' 至 row 56
+
+    def get_report_items(self) -> List[ReportItem]:
+        """
+        整理日報表所有列的品項及來源，監控品項的 `MonitorProfile.product_list()`、`sources()` 改以一次取回的
+        監控品項(WatchlistItem)及品項階層計算
+        """
+
         watchlist = Watchlist.objects.filter(
             start_date__year=self.specify_day.year,
             start_date__month__lte=self.specify_day.month,
             end_date__month__gte=self.specify_day.month
         ).first()
-        monitor = MonitorProfile.objects.filter(watchlist=watchlist, row__isnull=False)
+        monitor = (MonitorProfile.objects.filter(watchlist=watchlist, row__isnull=False)
+                   .select_related('product').prefetch_related('months'))
+        watchlist_items = list(WatchlistItem.objects.filter(parent=watchlist).prefetch_related('sources'))
+        parents = dict(AbstractProduct.objects.values_list('id', 'parent_id'))
+
+        def is_descendant(product_id, ancestor_id):
+            while product_id is not None:
+                if product_id == ancestor_id:
+                    return True
+                product_id = parents.get(product_id)
+            return False
+
+        items = []
 
-        for item in monitor:
-            query_set = DailyTran.objects.filter(product__in=item.product_list())
+        for profile in monitor:
+            related = [i for i in watchlist_items if is_descendant(i.product_id, profile.product_id)]
+            product_ids = frozenset(i.product_id for i in related) or frozenset([profile.product_id])
+            source_ids = frozenset(s.id for i in related for s in i.sources.all())
 
             # 因應措施是梨
-            if self.specify_day.month in [5, 6]:
-                if item.product.id == 50182:
+            query_product_ids = product_ids
+            if profile.product_id == 50182:
+                if self.specify_day.month in [5, 6]:
                     # 5, 6 月只抓豐水梨 50186
-                    query_set = query_set.filter(product=50186)
-            elif self.specify_day.month in [7, 8]:
-                if item.product.id == 50182:
+                    query_product_ids = product_ids & {50186}
+                elif self.specify_day.month in [7, 8]:
                     # 7, 8 月只抓新興梨 50185
-                    query_set = query_set.filter(product=50185)
-
-            if item.sources():
-                query_set = query_set.filter(source__in=item.sources())
-
-            self.get_data(query_set, item.product.name, item.row, item.price)
-
-            # 得到前一年同月份資料
-            query_set = DailyTran.objects.filter(product__in=item.product_list(),
-                                                 date__year=self.specify_day.year - 1,
-                                                 date__month=self.specify_day.month)
+                    query_product_ids = product_ids & {50185}
+
+            items.append(ReportItem(
+                name=profile.product.name,
+                row=profile.row,
+                product_ids=query_product_ids,
+                source_ids=source_ids or None,
+                price=profile.price,
+                profile=profile,
+                as_of_product_ids=product_ids,
+                # 羊的價格不論是否有來源皆依來源篩選
+                as_of_source_ids=source_ids,
+            ))
 
-            # 因應措施是梨
-            if self.specify_day.month in [5, 6]:
-                if item.product.id == 50182:
-                    # 56只抓豐水梨 50186
-                    query_set = query_set.filter(product=50186)
-            elif self.specify_day.month in [7, 8]:
-                if item.product.id == 50182:
-                    # 78只抓新興梨 50185
-                    query_set = query_set.filter(product=50185)
+        # 長糯, 稻穀, 全部花卉 L, 火鶴花 FB, 文心蘭 FO3
+        # AbstractProduct id: 3001 -> 15, 3002 -> 19, 3508 -> 30002, 3509 -> 60051, 3510 -> 60066
+        extra_watchlist_items = OrderedDict([(3001, 10), (3002, 9), (3508, 99), (3509, 100), (3510, 103)])
+        # 香蕉台北一二批發、青香蕉下品()內銷)
+        # 2020/4/16 主管會報陳副主委要求花卉品項,農糧署建議新增香水百合 FS
+        extra_products = [
+            (73, 50063, [20001, 20002]),
+            (72, 59019, range(10030, 20001)),
+            (107, 60068, [30001, 30002, 30003, 30004, 30005]),
+        ]
+
+        for watchlist_item in (WatchlistItem.objects.filter(id__in=extra_watchlist_items)
+                               .select_related('product__type').prefetch_related('sources')):
+            product = watchlist_item.product
+            source_ids = frozenset(s.id for s in watchlist_item.sources.all())
+            items.append(ReportItem.extra(product, extra_watchlist_items[watchlist_item.id], source_ids))
 
-            if item.sources():
-                query_set = query_set.filter(source__in=item.sources())
+        products = AbstractProduct.objects.select_related('type').in_bulk([p[1] for p in extra_products])
+        existing_sources = set(Source.objects.filter(
+            id__in=[source_id for p in extra_products for source_id in p[2]]
+        ).values_list('id', flat=True))
 
-            self.update_data(query_set, item.product.name, item.row)
+        for row, product_id, source_ids in extra_products:
+            if product_id not in products:
+                continue
 
-            if '羊' in item.product.name:
-                self.update_rams(item, item.row)
-            if '牛' in item.product.name:
-                self.update_cattles(item, item.row)
-            self.check_months(item)
+            source_ids = frozenset(existing_sources.intersection(source_ids))
+            items.append(ReportItem.extra(products[product_id], row, source_ids))
 
-        # 長糯, 稻穀, 全部花卉 L, 火鶴花 FB, 文心蘭 FO3
-        # AbstractProduct id: 3001 -> 15, 3002 -> 19, 3508 -> 30002, 3509 -> 60051, 3510 -> 60066
-        extra_product = [(3001, 10), (3002, 9), (3508, 99), (3509, 100), (3510, 103)]
+        return items
 
-        for item in extra_product:
-            self._extract_data(item[1], WatchlistItem, item[0], None, self.specify_day)
+    def date_ranges(self) -> List[Tuple[datetime.date, datetime.date]]:
+        """
+        報表使用的日交易日期區間: 最近兩週及前一年同月份
+        """
 
-        # 香蕉台北一二批發
-        self._extract_data(73, Fruit, 50063, Source.objects.filter(id__in=[20001, 20002]), self.specify_day)
+        return [
+            (self.last_week_start.date(), self.this_week_end.date()),
+            (self.last_year_month_start.date(), self.last_year_month_end.date()),
+        ]
 
-        # 青香蕉下品()內銷)
-        self._extract_data(72, Fruit, 59019, Source.objects.filter(id__in=range(10030, 20001)), self.specify_day)
+    def fetch_trans(self, items: List[ReportItem]):
+        """
+        以單一查詢取回所有品項最近兩週及前一年同月份的日交易資料(self.trans)，
+        並以 DailyTranAggregate 取得各(品項, 來源)的交易量、重量筆數(self.completeness)
+        """
 
-        # 2020/4/16 主管會報陳副主委要求花卉品項,農糧署建議新增香水百合 FS
-        self._extract_data(107, Flower, 60068, Source.objects.filter(id__in=[30001, 30002, 30003, 30004, 30005]),
-                           self.specify_day)
+        product_ids = set().union(*(item.product_ids for item in items))
+        fields = ['product_id', 'source_id', 'date', 'avg_price', 'avg_weight', 'volume']
+
+        rows = DailyTran.objects.filter(product_id__in=product_ids).filter(
+            reduce(operator.or_, (Q(date__range=date_range) for date_range in self.date_ranges()))
+        ).values_list(*fields)
+        self.trans = pd.DataFrame(list(rows), columns=fields)
+
+        # 交易量、重量完整性以品項及來源的所有資料判斷(同 `get_group_by_date_query_set`)
+        rows = (DailyTranAggregate.objects.filter(product_id__in=product_ids)
+                .values('product_id', 'source_id')
+                .annotate(total=Sum('count'), volumes=Sum('volume_count'), weights=Sum('weight_count'))
+                .values_list('product_id', 'source_id', 'total', 'volumes', 'weights'))
+        self.completeness = pd.DataFrame(
+            list(rows), columns=['product_id', 'source_id', 'count', 'volume_count', 'weight_count']
+        )
 
-        # TODO: 新增 '寶島梨' 至 row 56
+    @staticmethod
+    def _partition(df: pd.DataFrame, product_ids, source_ids=None) -> pd.DataFrame:
+        mask = df['product_id'].isin(product_ids)
 
-    def _extract_data(self, row, model, product_id, sources=None, date=None):
-        self.row_visible.append(row)
+        if source_ids is not None:
+            mask &= df['source_id'].isin(source_ids)
 
-        if model == WatchlistItem:
-            watchlist_item = model.objects.filter(id=product_id).first()
-            product = watchlist_item.product
+        return df[mask]
 
-            if watchlist_item.sources.all():
-                sources = watchlist_item.sources.all()
-        else:
-            product = model.objects.get(id=product_id)
+    @staticmethod
+    def _has_enough(notna: pd.Series) -> bool:
+        return bool(notna.sum() > 0.8 * len(notna))
 
-        query_set = DailyTran.objects.filter(product=product)
+    def _completeness(self, item: ReportItem):
+        df = self._partition(self.completeness, item.product_ids, item.source_ids)
+        count = df['count'].sum()
 
-        if sources:
-            query_set = query_set.filter(source__in=sources)
+        return bool(df['volume_count'].sum() > 0.8 * count), bool(df['weight_count'].sum() > 0.8 * count)
 
-        self.get_data(query_set, f'{product.name}{product.type}', row, None)
+    @staticmethod
+    def _latest_on_or_before(days: List[datetime.date], product_ids, source_ids=None) -> Dict[datetime.date, DailyTran]:
+        """
+        每個指定日期(含)以前最近一筆的日交易，以單一查詢取得(`DailyTranQuerySet.latest_on_or_before`)
+        """
 
-        if date:
-            query_set = DailyTran.objects.filter(product=product, date__year=date.year - 1, date__month=date.month)
+        query_set = DailyTran.objects.filter(product_id__in=product_ids)
 
-            if sources:
-                query_set = query_set.filter(source__in=sources)
+        if source_ids is not None:
+            query_set = query_set.filter(source_id__in=source_ids)
 
-            self.update_data(query_set, f'{product.name}{product.type}', row)
+        return {tran.as_of_date: tran for tran in query_set.latest_on_or_before(days)}
 
     @staticmethod
     def get_sheet_format(key):
@@ -0,0 +1,149 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from django.db import connection
+
+from apps.dailytrans.models import DailyTran
+
+# label 可為任意 hashable(例如 ('112', '節前一週'))，start_date/end_date 皆包含
+Window = namedtuple('Window', ['label', 'start_date', 'end_date'])
+
+# 所有日期區間以 unnest 組成區間表後與日交易 join，一次取回，區間重疊時資料會分別出現在各區間
+WINDOW_TRANS_SQL = '''
+    SELECT w.window_id, t.product_id, t.source_id, t.avg_price, t.avg_weight, t.volume, t.date
+    FROM unnest(%s::integer[], %s::date[], %s::date[]) AS w (window_id, start_date, end_date)
+    JOIN {table} t ON t.date BETWEEN w.start_date AND w.end_date
+    WHERE t.product_id = ANY(%s)
+'''
+
+WINDOW_TRANS_COLUMNS = ['window', 'product_id', 'source_id', 'avg_price', 'avg_weight', 'volume', 'date']
+
+
+def window_trans_sql(product_ids, windows):
+    """
+    :return: (sql, params)
+    """
+
+    return WINDOW_TRANS_SQL.format(table=DailyTran._meta.db_table), [
+        list(range(len(windows))),
+        [window.start_date for window in windows],
+        [window.end_date for window in windows],
+        list(product_ids),
+    ]
+
+
+def fetch_window_trans(product_ids, windows) -> pd.DataFrame:
+    """
+    取得多個品項在多個日期區間的日交易
+
+    :param product_ids: Iterable[int]
+    :param windows: List[Window]
+    :return: pd.DataFrame，window 欄位為 windows 的索引
+    """
+
+    product_ids = list(product_ids)
+
+    if not product_ids or not windows:
+        return pd.DataFrame(columns=WINDOW_TRANS_COLUMNS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(*window_trans_sql(product_ids, windows))
+        rows = cursor.fetchall()
+
+    df = pd.DataFrame(rows, columns=WINDOW_TRANS_COLUMNS)
+
+    for column in ['source_id', 'avg_price', 'avg_weight', 'volume']:
+        df[column] = df[column].astype(float)
+
+    return df
+
+
+def window_averages(trans: pd.DataFrame, groups, windows, count_groups=()):
+    """
+    計算每個 group 在每個日期區間的平均價格及交易量，計算方式同原節日報表:
+    - 交易量、重量皆有 8 成以上資料: 價格以交易量x重量加權平均，交易量欄位為平均重量(count_groups 為交易量加總)
+    - 只有交易量: 價格以交易量加權平均，交易量欄位為交易量加總
+    - 其他: 價格為簡單平均，沒有交易量
+
+    :param trans: `fetch_window_trans` 的結果
+    :param groups: OrderedDict[key, (product_ids, source_ids)]，source_ids 為空時不篩選來源
+    :param windows: List[Window]
+    :param count_groups: Iterable[key]，交易量為頭數的 group(羊、毛豬)
+    :return: (price, volume)，皆為 index 為 group key、columns 為 window label 的 pd.DataFrame，沒有資料時為 NaN
+    """
+
+    keys = list(groups)
+    columns = range(len(windows))
+    df = group_trans(trans, groups) if keys and not trans.empty else trans
+
+    if df.empty:
+        price = pd.DataFrame(np.nan, index=keys, columns=columns)
+        volume = price.copy()
+    else:
+        df = df.assign(
+            pwv=df['avg_price'] * df['avg_weight'] * df['volume'],
+            wv=df['avg_weight'] * df['volume'],
+            pv=df['avg_price'] * df['volume'],
+        )
+        grouped = df.groupby(['group', 'window'])
+        stats = pd.DataFrame({
+            'rows': grouped.size(),
+            'volumes': grouped['volume'].count(),
+            'weights': grouped['avg_weight'].count(),
+            'mean_price': grouped['avg_price'].mean(),
+            'pwv': grouped['pwv'].sum(),
+            'wv': grouped['wv'].sum(),
+            'pv': grouped['pv'].sum(),
+            'v': grouped['volume'].sum(),
+        })
+
+        has_volume = stats['volumes'] / stats['rows'] > 0.8
+        has_weight = stats['weights'] / stats['rows'] > 0.8
+        both = has_volume & has_weight
+        counted = stats.index.get_level_values('group').isin(list(count_groups))
+
+        price = pd.Series(
+            np.where(both, stats['pwv'] / stats['wv'], np.where(has_volume, stats['pv'] / stats['v'],
+                                                               stats['mean_price'])),
+            index=stats.index,
+        ).unstack('window').reindex(index=keys, columns=columns)
+        volume = pd.Series(
+            np.where(both & ~counted, stats['wv'] / stats['v'], np.where(has_volume, stats['v'], np.nan)),
+            index=stats.index,
+        ).unstack('window').reindex(index=keys, columns=columns)
+
+    price.columns = volume.columns = [window.label for window in windows]
+
+    return price, volume
+
+
+def group_trans(trans: pd.DataFrame, groups) -> pd.DataFrame:
+    """
+    依 groups 的品項及來源篩選日交易並加上 group 欄位，同一個品項可屬於多個 group
+    """
+
+    members = pd.DataFrame(
+        [(key, product_id) for key, (product_ids, _) in groups.items() for product_id in product_ids],
+        columns=['group', 'product_id'],
+    ).drop_duplicates()
+    sources = pd.DataFrame(
+        [(key, float(source_id)) for key, (_, source_ids) in groups.items() for source_id in (source_ids or ())],
+        columns=['group', 'source_id'],
+    ).drop_duplicates()
+
+    df = trans.merge(members, on='product_id')
+
+    if not sources.empty:
+        df = df.merge(sources.assign(matched=True), on=['group', 'source_id'], how='left')
+        df = df[~df['group'].isin(sources['group']) | df['matched'].notnull()]
+
+    return df
+
+
+def trimmed_mean(frame: pd.DataFrame) -> pd.Series:
+    """
+    逐列去掉最大值及最小值後的平均，分母為欄位數減 2(缺值仍計入欄位數，同原節日報表的算法)
+    """
+
+    return (frame.sum(axis=1) - frame.max(axis=1) - frame.min(axis=1)) / (frame.shape[1] - 2)
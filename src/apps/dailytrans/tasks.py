@@ -1,11 +1,22 @@
 import os
 import logging
+import random
+import time
 from datetime import datetime, timedelta
+from celery import chord
 from celery.task import task
 from django.conf import settings
+from django.utils.module_loading import import_string
 
-from apps.dailytrans.models import DailyTran, DailyReport
-from apps.dailytrans.reports.dailyreport import DailyReportFactory
+from apps.dailytrans.builders.utils import (
+    DirectResult,
+    aggregate_direct_results,
+    date_delta,
+    date_windows,
+)
+from apps.dailytrans.models import DailyTran
+from apps.dailytrans.reports.artifacts import DailyReportStore
+from dashboard.caches import redis_instance
 from google_api.backends import DefaultGoogleDriveClient
 
 
@@ -32,6 +43,149 @@ def delete_not_updated_trans(not_updated_times=15):
 def update_daily_report(delta_days=-1):
     date = datetime.now() + timedelta(days=delta_days)
 
-    # generate file
-    factory = DailyReportFactory(specify_day=date)
-    file_name, file_path = factory()
+    # 資料未異動時不會重新產生
+    DailyReportStore().generate(date.date())
+
+
+@task(name='GenerateDailyReport')
+def generate_daily_report(date):
+    """
+    產生單日的日報表(DailyReportStore.enqueue 排程)
+
+    :param date: str，'%Y-%m-%d'
+    """
+
+    DailyReportStore().generate_scheduled(datetime.strptime(date, '%Y-%m-%d').date())
+
+
+@task(name='CreateDailyTranPartitions')
+def create_daily_tran_partitions(years_ahead=1):
+    """
+    預先建立今年至 years_ahead 年後的 DailyTran 分區，避免跨年後排程寫入失敗
+    """
+
+    this_year = datetime.now().year
+    DailyTran.objects.create_partitions(this_year, this_year + years_ahead)
+
+
+def serialize_direct_result(result):
+    """
+    DirectResult 轉為可 JSON 序列化的 dict，用於 Celery 子任務之間傳遞
+    """
+
+    return {
+        'start_date': result.start_date.strftime('%Y-%m-%d') if result.start_date else None,
+        'end_date': result.end_date.strftime('%Y-%m-%d') if result.end_date else None,
+        'duration': result.duration.total_seconds() if result.duration is not None else None,
+        'success': result.success,
+        'msg': str(result.msg) if result.msg else '',
+    }
+
+
+def deserialize_direct_result(data):
+    return DirectResult(
+        start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None,
+        end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None,
+        duration=timedelta(seconds=data['duration']) if data.get('duration') is not None else None,
+        success=data.get('success', False),
+        msg=data.get('msg', ''),
+    )
+
+
+def throttle_upstream(upstream):
+    """
+    以 Redis 計數實作各資料來源每分鐘可啟動的子任務數(settings.DAILYTRAN_BUILDER_RATE_LIMITS)
+
+    :return: 需等待的秒數，0 代表可立即執行
+    """
+
+    limit = getattr(settings, 'DAILYTRAN_BUILDER_RATE_LIMITS', {}).get(upstream)
+
+    if not limit:
+        return 0
+
+    now = time.time()
+    key = 'builder-rate-limit:%s:%d' % (upstream, now // 60)
+    count = redis_instance.redis.incr(key)
+
+    if count == 1:
+        redis_instance.redis.expire(key, 120)
+
+    if count <= limit:
+        return 0
+
+    # 等到下一分鐘，並加上隨機秒數避免同時重試
+    return 60 - now % 60 + random.uniform(0, 5)
+
+
+@task(name='DirectBuilderChunk', bind=True, max_retries=None)
+def direct_chunk(self, func, upstream, start_date, end_date, kwargs=None):
+    """
+    執行單一 direct function 的一個日期區間
+
+    :param func: str，direct function 的路徑，例如 'apps.crops.builder.direct_origin'
+    :param upstream: str，資料來源，用於限速
+    :param start_date: str，'%Y-%m-%d'
+    :param end_date: str，'%Y-%m-%d'
+    :param kwargs: dict，其他傳給 direct function 的參數
+    :return: dict，序列化後的 DirectResult
+    """
+
+    countdown = throttle_upstream(upstream)
+
+    if countdown:
+        raise self.retry(countdown=countdown)
+
+    direct = import_string(func)
+    result = direct(start_date=start_date, end_date=end_date, format='%Y-%m-%d', **(kwargs or {}))
+
+    return serialize_direct_result(result)
+
+
+@task(name='AggregateDirectResults')
+def aggregate_direct(results, type_code):
+    """
+    chord callback，合併所有子任務的 DirectResult 並寫入 log
+    """
+
+    db_logger = logging.getLogger('aprp')
+    logger_extra = {
+        'type_code': type_code,
+    }
+    result = aggregate_direct_results(deserialize_direct_result(data) for data in results)
+
+    if result.success:
+        logger_extra['duration'] = result.duration
+        db_logger.info('Successfully process trans: %s - %s' % (result.start_date, result.end_date), extra=logger_extra)
+    else:
+        db_logger.error('Failed to process trans: %s - %s, %s' % (result.start_date, result.end_date, result.msg),
+                        extra=logger_extra)
+
+    return serialize_direct_result(result)
+
+
+def fan_out_direct(jobs, delta, type_code, **kwargs):
+    """
+    將組合型 direct 拆成 (direct function x 日期區間) 的子任務平行執行，全部完成後以 `aggregate_direct` 合併結果
+    不同資料來源的子任務互不等待
+
+    :param jobs: Iterable[DirectJob]
+    :param delta: int，日期區間，計算起始點為當日，往前 delta 天
+    :param type_code: str，log 類型
+    :param kwargs: 其他傳給 direct function 的參數
+    :return: celery.result.AsyncResult
+    """
+
+    start_date, end_date = date_delta(delta)
+    header = [
+        direct_chunk.s(
+            '%s.%s' % (job.func.__module__, job.func.__name__), job.upstream,
+            chunk_start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'), kwargs,
+        )
+        for job in jobs
+        for chunk_start, chunk_end in date_windows(
+            start_date, end_date, job.chunk_days or (end_date - start_date).days + 1
+        )
+    ]
+
+    return chord(header)(aggregate_direct.s(type_code))
@@ -4,10 +4,12 @@ register = template.Library()
 
 
 @register.filter
-def spark_points_flat(lst, key):
+def spark_points_flat(points, key):
     """
-    :param lst: list of dictionary
+    :param points: dictionary of lists (columnar points) or list of dictionary
     :param key: key value want to flat
     :return: string flat with ','
     """
-    return ','.join(str(dic[key]) for dic in lst)
+    if isinstance(points, dict):
+        return ','.join(str(value) for value in points[key])
+    return ','.join(str(dic[key]) for dic in points)
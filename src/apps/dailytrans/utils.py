@@ -3,15 +3,19 @@ import datetime
 
 from django.db.models.expressions import RawSQL
 
+import numpy as np
 import pandas as pd
 
 from django.utils.translation import ugettext as _
-from django.db.models import Func, IntegerField, Q
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Func, IntegerField, Sum
 
-from apps.dailytrans.models import DailyTran, is_leap
+from apps.dailytrans.models import DailyTran, DailyTranAggregate, is_leap, month_day_ranges
 from apps.configs.api.serializers import TypeSerializer
 from apps.watchlists.models import WatchlistItem
 from apps.configs.models import AbstractProduct
+from dashboard.caches import chart_cache
 
 
 def get_query_set(_type, items, sources=None):
@@ -70,6 +74,45 @@ def get_query_set(_type, items, sources=None):
     if not items:
         return DailyTran.objects.none()
 
+    product_ids, sources = get_product_ids_and_sources(items, sources)
+
+    # 根據type和農產品 ID 建立基本查詢
+    query = DailyTran.objects.filter(product__type=_type, product_id__in=product_ids)
+
+    if sources:
+        query = query.filter(source__in=sources)
+
+    return query
+
+
+def get_aggregate_query_set(_type, items, sources=None):
+    """
+    與 `get_query_set` 相同的篩選條件，改為查詢以 (product, source, type, date) 預先彙總的 DailyTranAggregate
+    傳入 `get_group_by_date_query_set` 時只需加總彙總資料，不需讀取所有原始資料
+
+    Returns:
+        QuerySet[DailyTranAggregate]
+    """
+    if not items:
+        return DailyTranAggregate.objects.none()
+
+    product_ids, sources = get_product_ids_and_sources(items, sources)
+
+    query = DailyTranAggregate.objects.filter(type=_type, product_id__in=product_ids)
+
+    if sources:
+        query = query.filter(source__in=sources)
+
+    return query
+
+
+def get_product_ids_and_sources(items, sources=None):
+    """
+    取得 items(WatchlistItem 或 AbstractProduct)對應的農產品 ID，未指定 sources 時一併從 items 中收集來源
+
+    Returns:
+        tuple: (Set[int], Iterable[Source])
+    """
     # 驗證項目類型
     if not (isinstance(items.first(), (WatchlistItem, AbstractProduct))):
         raise AttributeError(f"Found not support type {items.first()}")
@@ -78,9 +121,6 @@ def get_query_set(_type, items, sources=None):
     product_ids = {item.product_id for item in items if isinstance(item, WatchlistItem)}
     product_ids.update({item.id for item in items if isinstance(item, AbstractProduct)})
 
-    # 根據type和農產品 ID 建立基本查詢
-    query = DailyTran.objects.filter(product__type=_type, product_id__in=product_ids)
-
     # 處理來源過濾
     if not sources:
         # 從 WatchlistItem 收集來源
@@ -90,10 +130,7 @@ def get_query_set(_type, items, sources=None):
         sources.update({source for item in items if isinstance(item, AbstractProduct)
                         for source in item.sources()})
 
-    if sources:
-        query = query.filter(source__in=sources)
-
-    return query
+    return product_ids, sources
 
 
 def get_group_by_date_query_set(query_set, start_date=None, end_date=None, specific_year=True):
@@ -107,6 +144,8 @@ def get_group_by_date_query_set(query_set, start_date=None, end_date=None, speci
 
     Args:
         query_set (QuerySet): 原始查詢集
+            - QuerySet[DailyTran]: 於資料庫中計算(`get_group_by_date_sql`)
+            - QuerySet[DailyTranAggregate]: 加總預先彙總的資料(`get_aggregate_query_set`)，結果相同
         start_date (datetime.date, optional): 開始日期
         end_date (datetime.date, optional): 結束日期
         specific_year (bool): 是否按特定年份過濾
@@ -126,6 +165,16 @@ def get_group_by_date_query_set(query_set, start_date=None, end_date=None, speci
     3. 計算加權平均價格和其他統計值
     4. 對缺失值進行處理
     """
+    if query_set.model is DailyTranAggregate:
+        return get_group_by_date_aggregate(query_set, start_date, end_date, specific_year)
+
+    return get_group_by_date_sql(query_set, start_date, end_date, specific_year)
+
+
+def get_group_by_date_data_frame(query_set, start_date=None, end_date=None, specific_year=True):
+    """
+    `get_group_by_date_query_set` 以 pandas 計算的版本，會讀取所有原始資料，只作為驗證 `get_group_by_date_sql` 的參考實作
+    """
     # 檢查交易量和重量數據的完整性
     has_volume = query_set.filter(volume__isnull=False).count() > (0.8 * query_set.count())
     has_weight = query_set.filter(avg_weight__isnull=False).count() > (0.8 * query_set.count())
@@ -142,12 +191,34 @@ def get_group_by_date_query_set(query_set, start_date=None, end_date=None, speci
         return pd.DataFrame(
             columns=['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']), False, False
 
+    # 將查詢結果轉換為 DataFrame
+    df = pd.DataFrame(list(query_set.values('date', 'source_id', 'avg_price', 'avg_weight', 'volume')))
+
+    return group_by_date(df, has_volume, has_weight)
+
+
+def group_by_date(df, has_volume, has_weight):
+    """
+    以已取回的原始日交易資料計算每日加權平均，計算方式與 `get_group_by_date_sql` 相同，
+    用於一次取回多個品項資料後再分組計算的呼叫端(例如日報表)，不需每個品項各自查詢資料庫
+
+    :param df: DataFrame，columns 需包含 date, source_id, avg_price, avg_weight, volume，且已完成日期過濾
+    :param has_volume: bool，交易量是否完整，需由呼叫端以未過濾日期的資料判斷
+    :param has_weight: bool，重量是否完整，需由呼叫端以未過濾日期的資料判斷
+    :return: tuple: (DataFrame, bool, bool)，同 `get_group_by_date_query_set`
+    """
+    columns = ['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']
+
+    df = df[['date', 'source_id', 'avg_price', 'avg_weight', 'volume']]
+    # 欄位全為 None 時為 object dtype，groupby sum 會略過該欄位
+    df = df.assign(**{column: df[column].astype(float) for column in ('avg_price', 'avg_weight', 'volume')})
+
     if has_volume and has_weight:
-        query_set = query_set.filter(Q(volume__gt=0) & Q(avg_weight__gt=0))
+        df = df[(df['volume'] > 0) & (df['avg_weight'] > 0)].copy()
 
-    # 將查詢結果轉換為 DataFrame
-    df = pd.DataFrame(list(query_set.values()))
-    df = df[['product_id', 'date', 'avg_price', 'avg_weight', 'volume', 'source_id']]
+    # 空數據處理
+    if df.empty:
+        return pd.DataFrame(columns=columns), False, False
 
     # 數據處理和計算
     # 將缺失值填充為 1，不用因為缺失值設定判斷式再進行計算
@@ -159,7 +230,7 @@ def get_group_by_date_query_set(query_set, start_date=None, end_date=None, speci
 
     # 根據來源市場 ID 分組計算
     if all(pd.isna(df['source_id'])):
-        df['source_id'].fillna(1, inplace=True)
+        df['source_id'] = df['source_id'].fillna(1)
 
     # 按日期和來源市場 ID 分組
     group = df.groupby(['date', 'source_id'])
@@ -185,9 +256,154 @@ def get_group_by_date_query_set(query_set, start_date=None, end_date=None, speci
     if not has_weight:
         df_fin['avg_avg_weight'] = 1
 
-    return df_fin[['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']], has_volume, has_weight
+    return df_fin[columns], has_volume, has_weight
+
+
+GROUP_BY_DATE_SQL = '''
+    WITH base AS ({base}),
+    filtered AS ({filtered}),
+    flags AS (
+        SELECT COUNT(volume) > 0.8 * COUNT(*) AS has_volume, COUNT(avg_weight) > 0.8 * COUNT(*) AS has_weight
+        FROM base
+    ),
+    selected AS (
+        SELECT f.* FROM filtered f CROSS JOIN flags
+        WHERE NOT (flags.has_volume AND flags.has_weight) OR (f.volume > 0 AND f.avg_weight > 0)
+    ),
+    no_source AS (
+        SELECT bool_and(source_id IS NULL) AS value FROM selected
+    ),
+    grouped AS (
+        SELECT
+            s.date,
+            SUM(s.avg_price * COALESCE(s.avg_weight, 1) * COALESCE(s.volume, 1)) AS price_vol_wt,
+            SUM(COALESCE(s.avg_weight, 1) * COALESCE(s.volume, 1)) AS vol_wt,
+            SUM(COALESCE(s.volume, 1)) AS vol,
+            COALESCE(SUM(s.volume), 0) AS volume,
+            CASE WHEN no_source.value THEN 1 ELSE COUNT(DISTINCT s.source_id) END AS num_of_source
+        FROM selected s CROSS JOIN no_source
+        WHERE no_source.value OR s.source_id IS NOT NULL
+        GROUP BY s.date, no_source.value
+    )
+    SELECT
+        g.date,
+        g.price_vol_wt / NULLIF(g.vol_wt, 0),
+        g.num_of_source,
+        CASE WHEN flags.has_volume THEN g.volume ELSE g.num_of_source END,
+        CASE WHEN flags.has_weight THEN g.vol_wt / NULLIF(g.vol, 0) ELSE 1 END,
+        flags.has_volume,
+        flags.has_weight
+    FROM grouped g CROSS JOIN flags
+    ORDER BY g.date
+'''
+
+
+def get_group_by_date_sql(query_set, start_date=None, end_date=None, specific_year=True):
+    """
+    `get_group_by_date_query_set` 於資料庫中計算的版本，交易量、重量完整性與每日加權平均在同一個查詢中完成，
+    只取回每日一筆結果
 
+    計算方式與 `get_group_by_date_data_frame` 相同:
+    - 交易量、重量缺失時以 1 計算(fillna(1))
+    - 交易量及重量皆完整時只計算兩者皆大於 0 的資料
+    - 來源皆為空時視為同一個來源，否則排除來源為空的資料
+    """
+    columns = ['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']
 
+    filtered = query_set
+    # 日期範圍過濾
+    if isinstance(start_date, datetime.date) and isinstance(end_date, datetime.date):
+        if specific_year:
+            filtered = query_set.filter(date__range=[start_date, end_date])
+        else:
+            filtered = query_set.between_month_day_filter(start_date, end_date)
+
+    fields = ('date', 'source', 'avg_price', 'avg_weight', 'volume')
+    base_sql, base_params = query_set.order_by().values_list(*fields).query.sql_with_params()
+    filtered_sql, filtered_params = filtered.order_by().values_list(*fields).query.sql_with_params()
+
+    with connections[query_set.db].cursor() as cursor:
+        cursor.execute(GROUP_BY_DATE_SQL.format(base=base_sql, filtered=filtered_sql),
+                       tuple(base_params) + tuple(filtered_params))
+        rows = cursor.fetchall()
+
+    # 空數據處理
+    if not rows:
+        return pd.DataFrame(columns=columns), False, False
+
+    df_fin = pd.DataFrame([row[:5] for row in rows], columns=columns)
+    for column in columns[1:]:
+        df_fin[column] = pd.to_numeric(df_fin[column])
+
+    return df_fin, rows[0][5], rows[0][6]
+
+
+def get_group_by_date_aggregate(query_set, start_date=None, end_date=None, specific_year=True):
+    """
+    `get_group_by_date_query_set` 以 DailyTranAggregate 計算的版本，於資料庫中按日期加總後只取回每日一筆結果
+
+    對應原始資料的計算方式:
+    - 交易量、重量完整性以 volume_count、weight_count 與 count 比較
+    - 交易量及重量皆完整時只計算兩者皆大於 0 的資料(positive_* 欄位)
+    - 來源皆為空時視為同一個來源，否則排除來源為空的資料(同 pandas groupby 忽略空值)
+    """
+    columns = ['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']
+
+    # 檢查交易量和重量數據的完整性
+    totals = query_set.aggregate(count=Sum('count'), volume_count=Sum('volume_count'),
+                                 weight_count=Sum('weight_count'))
+    has_volume = (totals['volume_count'] or 0) > (0.8 * (totals['count'] or 0))
+    has_weight = (totals['weight_count'] or 0) > (0.8 * (totals['count'] or 0))
+
+    # 日期範圍過濾
+    if isinstance(start_date, datetime.date) and isinstance(end_date, datetime.date):
+        if specific_year:
+            query_set = query_set.filter(date__range=[start_date, end_date])
+        else:
+            query_set = query_set.between_month_day_filter(start_date, end_date)
+
+    # 空數據處理
+    if not query_set.exists():
+        return pd.DataFrame(columns=columns), False, False
+
+    prefix = ''
+    if has_volume and has_weight:
+        prefix = 'positive_'
+        query_set = query_set.filter(positive_count__gt=0)
+
+    no_source = not query_set.filter(source__isnull=False).exists()
+    if not no_source:
+        query_set = query_set.filter(source__isnull=False)
+
+    rows = query_set.values('date').annotate(
+        price_vol_wt=Sum(prefix + 'price_vol_wt'),
+        vol_wt=Sum(prefix + 'vol_wt'),
+        vol=Sum('positive_volume' if prefix else 'vol'),
+        sum_volume=Sum(prefix + 'volume'),
+        num_of_source=Count('source', distinct=True),
+    ).order_by('date')
+
+    df_fin = pd.DataFrame(list(rows), columns=['date', 'price_vol_wt', 'vol_wt', 'vol', 'sum_volume', 'num_of_source'])
+
+    if df_fin.empty:
+        return pd.DataFrame(columns=columns), has_volume, has_weight
+
+    if no_source:
+        df_fin['num_of_source'] = 1
+
+    df_fin['avg_price'] = df_fin['price_vol_wt'] / df_fin['vol_wt']
+    df_fin['avg_avg_weight'] = df_fin['vol_wt'] / df_fin['vol']
+
+    # 處理缺失的量和重量數據
+    if not has_volume:
+        df_fin['sum_volume'] = df_fin['num_of_source']
+    if not has_weight:
+        df_fin['avg_avg_weight'] = 1
+
+    return df_fin[columns], has_volume, has_weight
+
+
+@chart_cache.cached
 def get_daily_price_volume(_type, items, sources=None, start_date=None, end_date=None):
     """
     獲取每日價格和交易量數據，並生成適合前端展示的格式
@@ -226,13 +442,13 @@ def get_daily_price_volume(_type, items, sources=None, start_date=None, end_date
             - 'no_data': 是否有數據的標記 (boolean)
 
     實作細節:
-    1. 使用 get_query_set 獲取基礎查詢集
+    1. 使用 get_aggregate_query_set 獲取預先彙總的查詢集
     2. 通過 get_group_by_date_query_set 進行數據聚合
     3. 生成時間序列並處理缺失值
     4. 轉換數據格式以符合前端需求
     """
-    # 獲取並處理查詢數據
-    query_set = get_query_set(_type, items, sources)
+    # 獲取並處理查詢數據(加總預先彙總的資料)
+    query_set = get_aggregate_query_set(_type, items, sources)
     q, has_volume, has_weight = get_group_by_date_query_set(query_set, start_date, end_date)
 
     # 檢查是否有數據
@@ -264,23 +480,22 @@ def get_daily_price_volume(_type, items, sources=None, start_date=None, end_date
     missing_point_data = q.set_index('date').reindex(date_list, fill_value=None)
 
     # 準備 Highcharts 數據格式
+    unix = to_unix_array(date_list).tolist()
     highchart_data = {
-        'avg_price': [[to_unix(date), price] for date, price in missing_point_data['avg_price'].items()]
+        'avg_price': [list(point) for point in zip(unix, missing_point_data['avg_price'].tolist())]
     }
 
     # 根據數據可用性添加交易量和重量數據
     if has_volume:
         raw_data['rows'] = [[dic['date'], dic['avg_price'], dic['sum_volume']] for _, dic in q.iterrows()]
-        highchart_data['sum_volume'] = [
-            [to_unix(date), sum_volume] for date, sum_volume in missing_point_data['sum_volume'].items()
-        ]
+        highchart_data['sum_volume'] = [list(point) for point in zip(unix, missing_point_data['sum_volume'].tolist())]
     if has_weight:
         raw_data['rows'] = [
             [dic['date'], dic['avg_price'], dic['sum_volume'], dic['avg_avg_weight']]
             for _, dic in q.iterrows()
         ]
         highchart_data['avg_weight'] = [
-            [to_unix(date), weight] for date, weight in missing_point_data['avg_avg_weight'].items()
+            list(point) for point in zip(unix, missing_point_data['avg_avg_weight'].tolist())
         ]
 
     # 準備回傳數據
@@ -292,6 +507,7 @@ def get_daily_price_volume(_type, items, sources=None, start_date=None, end_date
     }
 
 
+@chart_cache.cached
 def get_daily_price_by_year(_type, items, sources=None):
     """
     獲取按年份分組的每日價格數據，用於年度比較分析
@@ -331,7 +547,7 @@ def get_daily_price_by_year(_type, items, sources=None):
     1. 內部輔助函數:
         - get_result(key): 處理單個數據類型(價格/交易量/重量)的結果生成
             - 生成 highchart 和原始數據兩種格式
-            - 處理閏年特殊情況
+            - 以 (年份, 2016 年中的第幾天) 轉置，一次處理所有年份及閏年的 2 月 29 日
 
     工作流程:
     1. 獲取基本查詢集
@@ -362,32 +578,30 @@ def get_daily_price_by_year(_type, items, sources=None):
                 'raw': None
             }
 
-        # 生成標準年份的日期範圍 (使用2016作為基準年)
-        date_list = pd.date_range(datetime.date(2016, 1, 1), datetime.date(2016, 12, 31), freq='D')
-
-        # 處理每一個數據點
-        for i, dic in q.iterrows():
-            # 將數據點的日期調整到2016年
-            date = datetime.date(year=2016, month=dic['date'].month, day=dic['date'].day)
-            result[str(dic['date'].year)].append(
-                (to_unix(date), None if pd.isna(dic[key]) else dic[key]) if dic[key] else None
-            )
-
-            # 處理閏年特殊情況
-            if not ((dic['date'].year % 4 == 0 and dic['date'].year % 100 != 0) or dic['date'].year % 400 == 0) and \
-                    dic['date'].month == 2 and dic['date'].day == 28:
-                result[str(dic['date'].year)].append((to_unix(datetime.date(2016, 2, 29)), None))
-
-        # 創建和處理原始數據表格
-        df = pd.DataFrame.from_dict(result, orient='columns')
-        df = df.applymap(lambda x: x[1] if isinstance(x, tuple) else x)
+        # 以 (年份, 2016 年中的第幾天) 轉置為每年一欄，非閏年 3 月以後往後一天，2 月 29 日保留為空值
+        table = pd.DataFrame({
+            'year': dates.dt.year.astype(str),
+            'day': day_of_2016,
+            'value': q[key].values,
+        }).pivot(index='day', columns='year', values='value').reindex(index=range(1, 367), columns=list(result))
+
+        # 0 或空值的點為 None，缺少資料(含非閏年的 2 月 29 日)的點為 (時間, None)
+        for year in table.columns:
+            values = table[year].values.astype(float)
+            points = values.astype(object)
+            points[np.isnan(values)] = None
+            points = list(zip(timestamps, points))
+            for i in np.flatnonzero(values == 0):
+                points[i] = None
+            result[year] = points
+
+        # 創建和處理原始數據表格，0 與空值相同
+        df = table.where(table != 0).reset_index(drop=True)
         df.insert(0, 'date', date_list)
 
         # 移除全部為空的行
         row_empty = df.iloc[:, 1:].isna().all(axis=1)
-        raw_data_rows_remove_empty = df[~row_empty]
-        raw_data_rows_remove_empty.fillna('', inplace=True)
-        raw_data_rows_remove_empty = raw_data_rows_remove_empty.values.tolist()
+        raw_data_rows_remove_empty = df[~row_empty].fillna('').values.tolist()
 
         # 準備表格列定義
         raw_data_columns = [{'value': _('Date'), 'format': 'date'}]
@@ -401,8 +615,8 @@ def get_daily_price_by_year(_type, items, sources=None):
             }
         }
 
-    # 主函數邏輯開始
-    query_set = get_query_set(_type, items, sources)
+    # 主函數邏輯開始(加總預先彙總的資料)
+    query_set = get_aggregate_query_set(_type, items, sources)
     q, has_volume, has_weight = get_group_by_date_query_set(query_set)
 
     # 處理空數據情況
@@ -425,6 +639,12 @@ def get_daily_price_by_year(_type, items, sources=None):
     )
     q = q.reset_index().rename(columns={'index': 'date'})
 
+    # 各數據類型共用: 每個日期在 2016 年中的位置，及 2016 年每一天的時間戳
+    dates = pd.to_datetime(q['date'])
+    day_of_2016 = dates.dt.dayofyear + ((~dates.dt.is_leap_year) & (dates.dt.month > 2)).astype(int)
+    date_list = pd.date_range(datetime.date(2016, 1, 1), datetime.date(2016, 12, 31), freq='D')
+    timestamps = to_unix_array(date_list).tolist()
+
     # 準備回傳數據
     response_data = {
         'years': [(year, selected_year(year)) for year in years],
@@ -526,6 +746,7 @@ def annotate_avg_weight(df, key):
     return df.groupby(key)['avg_weight'].first()
 
 
+@chart_cache.cached
 def get_monthly_price_distribution(_type, items, sources=None, selected_years=None):
     """
     計算並返回月度價格分布統計資料
@@ -682,6 +903,7 @@ def get_monthly_price_distribution(_type, items, sources=None, selected_years=No
     return response_data
 
 
+@chart_cache.cached
 def get_integration(_type, items, start_date, end_date, sources=None, to_init=True):
     """
     整合分析特定時期的價格、交易量和重量數據
@@ -710,7 +932,7 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
                     'avg_price': 平均價格,
                     'sum_volume': 總交易量,
                     'avg_avg_weight': 平均重量,
-                    'points': [...] 數據點列表,
+                    'points': {'unix': [...], 'avg_price': [...], ...} 以欄位儲存的數據點,
                     'base': 是否為基準期間,
                     'order': 排序順序
                 },
@@ -730,19 +952,19 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
 
     def spark_point_maker(qs, add_unix=True):
         """
-        生成資料點序列
+        生成資料點序列，以欄位儲存(每個欄位一個 list)，不需逐筆建立 dict
 
         Args:
             qs (pd.DataFrame): 包含日期和值的 DataFrame
-            add_unix (bool): 是否添加 unix 時間戳
+            add_unix (bool): 是否添加 unix 時間戳(已有 unix 欄位時沿用)
 
         Returns:
-            list: 數據點字典列表
+            dict: {欄位: 數據點 list}
         """
-        points = qs.copy()
-        if add_unix:
-            points['unix'] = points['date'].apply(to_unix)
-        return points.to_dict('record')
+        points = {column: qs[column].tolist() for column in qs.columns}
+        if add_unix and 'unix' not in points:
+            points['unix'] = to_unix_array(points['date']).tolist()
+        return points
 
     def pandas_annotate_init(df):
         """
@@ -766,45 +988,55 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
 
         return result
 
-    def pandas_annotate_year(qs, start_date=None, end_date=None):
+    def pandas_annotate_year(qs, windows, keep_empty=False):
         """
         計算年度比較的統計值
 
-        處理跨年度數據的比較，支持多年度數據的整合分析
+        以累加和一次計算所有年度區間(含跨年度區間)的平均值，不需逐年切割 DataFrame
 
         Args:
-            qs (pd.DataFrame): 原始數據框架
-            start_date (datetime): 開始日期
-            end_date (datetime): 結束日期
+            qs (pd.DataFrame): 依日期排序的原始數據框架
+            windows (List[Tuple[date, date]]): 各年度的日期區間
+            keep_empty (bool): 是否保留沒有數據的區間
 
         Returns:
-            list: 各年度統計結果列表
+            tuple: (各年度統計結果列表, 各年度區間在 qs 中的位置 [(起, 迄), ...])
         """
-        df = qs.copy()
-        df['avg_price'] = df['avg_price'] * df['sum_volume'] * df['avg_avg_weight']
-        df['sum_volume_weight'] = df['sum_volume'] * df['avg_avg_weight']
-
-        # 處理跨年度的情況
-        if start_date and end_date and start_date.year != end_date.year:
-            df_list = []
-            for i in range(1, start_date.year - df['date'].iloc[0].year + 1):
-                # 計算每個年度區間的統計值
-                split_df = df[
-                    (df['date'] >= datetime.date(start_date.year - i, start_date.month, start_date.day)) \
-                    & (df['date'] <= datetime.date(end_date.year - i, end_date.month, end_date.day)) \
-                    ].mean()
-                split_df['year'] = start_date.year - i
-                split_df['end_year'] = end_date.year - i
-                df_list.append(split_df)
-            df = pd.concat(df_list, axis=1).T
-        else:
-            # 單年度的處理
-            df['year'] = pd.to_datetime(df['date']).dt.year
-            df = df.groupby(['year'], as_index=False).mean()
+        columns = ['avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight', 'sum_volume_weight']
+        values = np.column_stack([
+            (qs['avg_price'] * qs['sum_volume'] * qs['avg_avg_weight']).values,
+            qs['num_of_source'].values,
+            qs['sum_volume'].values,
+            qs['avg_avg_weight'].values,
+            (qs['sum_volume'] * qs['avg_avg_weight']).values,
+        ]).astype(float)
+
+        # 各欄位的累加和及非空值數量，區間平均值 = 區間總和 / 區間數量(同 DataFrame.mean 忽略空值)
+        valid = ~np.isnan(values)
+        sums = np.vstack([np.zeros(len(columns)), np.cumsum(np.where(valid, values, 0), axis=0)])
+        counts = np.vstack([np.zeros(len(columns)), np.cumsum(valid, axis=0)])
+
+        dates = pd.to_datetime(qs['date']).values
+        lo = np.searchsorted(dates, pd.to_datetime([window[0] for window in windows]).values, side='left')
+        hi = np.searchsorted(dates, pd.to_datetime([window[1] for window in windows]).values, side='right')
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
+
+        df = pd.DataFrame(means, columns=columns)
+        df['year'] = [window[0].year for window in windows]
+        df['end_year'] = [window[1].year for window in windows]
+        df['lo'] = lo
+        df['hi'] = hi
+
+        if not keep_empty:
+            df = df[df['hi'] > df['lo']].reset_index(drop=True)
+
+        bounds = list(zip(df.pop('lo'), df.pop('hi')))
 
         # 計算最終的加權平均價格
         df['avg_price'] = df['avg_price'] / df['sum_volume_weight']
-        result = df.T.to_dict().values()
+        result = list(df.T.to_dict().values())
 
         # 更新每年的加權平均價格
         price = annotate_avg_price(df, 'year')
@@ -813,7 +1045,7 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
             if year in price:
                 dic['avg_price'] = price[year]
 
-        return result
+        return result, bounds
 
     def generate_integration(query, start, end, specific_year, name, base, order):
         """
@@ -838,7 +1070,7 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
                                                                   start_date=start,
                                                                   end_date=end,
                                                                   specific_year=specific_year)
-        years = pd.to_datetime(q['date']).dt.year.unique()
+        years = {date.year for date in q['date']}
         if q.empty or ('5' in name and len(years) < 5):
             return
         data = pandas_annotate_init(q)
@@ -848,8 +1080,8 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
         data['order'] = order
         integration.append(data)
 
-    # 主函數邏輯開始
-    query_set = get_query_set(_type, items, sources)
+    # 主函數邏輯開始(加總預先彙總的資料)
+    query_set = get_aggregate_query_set(_type, items, sources)
     diff = end_date - start_date + datetime.timedelta(1)
     last_start_date = start_date - diff
     last_end_date = end_date - diff
@@ -879,30 +1111,34 @@ def get_integration(_type, items, start_date, end_date, sources=None, to_init=Tr
                                                                 end_date=end_date,
                                                                 specific_year=False)
         if q.size > 0:
-            data_all = pandas_annotate_year(q, start_date, end_date)
+            q = q.sort_values('date').reset_index(drop=True)
+            q['unix'] = to_unix_array(q['date'])
+
+            # 與 between_month_day_filter 相同的各年度區間(由近至遠)，今年已排除
+            first_year = q['date'].iloc[0].year
+            windows = [window for window in month_day_ranges(start_date, end_date, first_year)
+                       if window[0].year < start_date.year]
+
             if start_date.year == end_date.year:
-                # 處理單年度數據
-                for dic in data_all:
+                # 處理單年度數據，只保留有數據的年度，由遠至近
+                data_all, bounds = pandas_annotate_year(q, windows[::-1])
+                for dic, (lo, hi) in zip(data_all, bounds):
                     year = dic['year']
-                    q_filter_by_year = q[pd.to_datetime(q['date']).dt.year == year].sort_values('date')
+                    dic.pop('end_year')
                     dic['name'] = '%0.0f' % year
-                    dic['points'] = spark_point_maker(q_filter_by_year)
+                    dic['points'] = spark_point_maker(q.iloc[lo:hi])
                     dic['base'] = False
                     dic['order'] = 4 + this_year - year
             else:
                 # 處理跨年度數據
-                for dic in data_all:
+                data_all, bounds = pandas_annotate_year(q, windows, keep_empty=True)
+                for dic, (lo, hi) in zip(data_all, bounds):
                     start_year = int(dic['year'])
                     end_year = int(dic['end_year'])
-                    q_filter_by_year = q[(
-                            (q['date'] >= datetime.date(start_year, start_date.month, start_date.day)) &
-                            (q['date'] <= datetime.date(end_year, end_date.month, end_date.day))
-                    )]
                     dic['name'] = '{}~{}'.format(start_year, end_year)
-                    dic['points'] = spark_point_maker(q_filter_by_year)
+                    dic['points'] = spark_point_maker(q.iloc[lo:hi])
                     dic['base'] = False
                     dic['order'] = 4 + this_year - start_year
-
             integration = list(data_all)
             integration.reverse()
 
@@ -955,5 +1191,24 @@ def to_unix(date):
     return int(time.mktime(date.timetuple()) * 1000)
 
 
+def to_unix_array(dates):
+    """
+    `to_unix` 的向量化版本，一次轉換整個日期欄位
+
+    `time.mktime` 以 process 的時區(Django 依 TIME_ZONE 設定 TZ)解讀日期，此處以相同時區 localize 後
+    以 datetime64 運算取得毫秒，結果與逐筆呼叫 `to_unix` 相同
+
+    :param dates: Iterable[datetime.date | datetime.datetime]、DatetimeIndex 或 Series
+    :return: numpy.ndarray[int64]
+    """
+    index = pd.to_datetime(pd.Index(dates))
+
+    if index.tz is None:
+        index = index.tz_localize(settings.TIME_ZONE)
+
+    # 與 time.mktime 相同，捨去秒以下的部分
+    return index.asi8 // 10 ** 9 * 1000
+
+
 def to_date(number):
     return datetime.datetime.fromtimestamp(float(number) / 1000.0)
@@ -10,7 +10,7 @@ from django.conf import settings
 from dashboard.views import login_required
 from google_api.backends import DefaultGoogleDriveClient
 from apps.dailytrans.models import DailyReport, FestivalReport
-from apps.dailytrans.reports.dailyreport import DailyReportFactory
+from apps.dailytrans.reports.artifacts import DailyReportStore, default_report_date
 from apps.dailytrans.reports.festivalreport import FestivalReportFactory
 from apps.dailytrans.reports.last5yearsreport import Last5YearsReportFactory
 from distutils.util import strtobool
@@ -39,83 +39,51 @@ def upload_file2google_client(file_name, file_path, folder_id, from_mimetype='XL
     return file_id
 
 
-@login_required
-def download_daily_report(request):
-    data = request.GET or request.POST
-
+def get_report_date(data):
     day = data.get('day')
     month = data.get('month')
     year = data.get('year')
 
     if not all([day, month, year]):
-        yesterday = datetime.now() - timedelta(days=-1)
-        day, month, year = yesterday.day, yesterday.month, yesterday.year
-
-    date = datetime(int(year), int(month), int(day))
-    date_str = f'{int(year) - 1911}.{str(month).zfill(2)}.{str(day).zfill(2)}'
-    file_path = ''
-    file_name = ''
-
-    for file in os.listdir(settings.BASE_DIR('apps/dailytrans/reports')):
-        if file.find(date_str) > -1:
-            file_path = settings.BASE_DIR(f'apps/dailytrans/reports/{file}')
-            file_name = file
-            break
+        return default_report_date()
 
-    if not file_path:
-        factory = DailyReportFactory(specify_day=date)
-        file_name, file_path = factory()
+    return datetime(int(year), int(month), int(day)).date()
 
-    with open(file_path, 'rb') as f:
 
-        response = HttpResponse(
-            f.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            status=200
-        )
-        response['Content-Disposition'] = f'attachment; filename={escape_uri_path(file_name)}'
-        response['Content-Length'] = os.path.getsize(file_path)
-
-        return response
+@login_required
+def download_daily_report(request):
+    date = get_report_date(request.GET or request.POST)
+    store = DailyReportStore()
+    artifact = store.latest(date)
+
+    if artifact is None:
+        # 報表於背景產生，不在 request 中執行 DailyReportFactory
+        store.enqueue(date)
+        return HttpResponse('報表產生中，請稍後再試', status=202)
+
+    content = bytes(artifact.content)
+    response = HttpResponse(
+        content,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        status=200
+    )
+    response['Content-Disposition'] = f'attachment; filename={escape_uri_path(artifact.file_name)}'
+    response['Content-Length'] = len(content)
 
+    return response
 
 
 def render_daily_report(request):
-    folder_id = settings.DAILY_REPORT_FOLDER_ID
-    google_drive_client = DefaultGoogleDriveClient()
-
-    data = request.GET or request.POST
-
-    day = data.get('day')
-    month = data.get('month')
-    year = data.get('year')
-
-    if not all([day, month, year]):
-        yesterday = datetime.today() - timedelta(days=-1)
-        day, month, year = yesterday.day, yesterday.month, yesterday.year
-
-    daily_report = DailyReport.objects.filter(date__year=year, date__month=month, date__day=day).first()
-    if daily_report:
-        file_id = daily_report.file_id
-    else:
-        date = datetime(int(year), int(month), int(day))
-        # generate file
-        factory = DailyReportFactory(specify_day=date)
-        file_name, file_path = factory()
-        # upload file
-        response = google_drive_client.media_upload(
-            name=file_name,
-            file_path=file_path,
-            from_mimetype=google_drive_client.XLSX_MIME_TYPE,
-            parents=[folder_id],
-        )
-        file_id = response.get('id')
-        # make public
-        google_drive_client.set_public_permission(file_id)
-        # write result to database
-        DailyReport.objects.create(date=date, file_id=file_id)
-        # remove local file
-        os.remove(file_path)
+    date = get_report_date(request.GET or request.POST)
+    store = DailyReportStore()
+    artifact = store.latest(date, content=False)
+    file_id = artifact.file_id if artifact else None
+
+    if not file_id:
+        # 尚未產生或尚未上傳時於背景產生，先使用先前產生的報表
+        store.enqueue(date)
+        daily_report = DailyReport.objects.filter(date=date).first()
+        file_id = daily_report.file_id if daily_report else None
 
     context = {
         'file_id': file_id
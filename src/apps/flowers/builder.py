@@ -29,8 +29,8 @@ def direct_wholesale_07(start_date=None, end_date=None, *args, **kwargs):
         wholesale_api = WholeSaleApi(model=model, market_type='L', **data._asdict())
 
         # This api only provide one day filter
-        for delta_start_date, delta_end_date in date_generator(start_date, end_date, WHOLESALE_DELTA_DAYS):
-            response = wholesale_api.request(date=delta_start_date)
+        params_list = [{'date': date} for date, _ in date_generator(start_date, end_date, WHOLESALE_DELTA_DAYS)]
+        for params, response in wholesale_api.request_many(params_list):
             wholesale_api.load(response)
 
     return data
@@ -46,8 +46,8 @@ def direct_wholesale_04(start_date=None, end_date=None, *args, **kwargs):
         wholesale_api = WholeSaleApi(model=model, market_type='L', sum_to_product='L', **data._asdict())
 
         # This api only provide one day filter
-        for delta_start_date, delta_end_date in date_generator(start_date, end_date, WHOLESALE_DELTA_DAYS):
-            response = wholesale_api.request(date=delta_start_date)
+        params_list = [{'date': date} for date, _ in date_generator(start_date, end_date, WHOLESALE_DELTA_DAYS)]
+        for params, response in wholesale_api.request_many(params_list):
             wholesale_api.load(response)
 
     return data
@@ -23,7 +23,6 @@ from django.db.models.signals import post_save
 from django.utils.translation import ugettext_lazy as _
 
 from apps.configs.models import AbstractProduct
-from dashboard.caches import redis_instance as cache
 
 
 class Flower(AbstractProduct):
@@ -35,9 +34,6 @@ class Flower(AbstractProduct):
 def instance_post_save(sender, instance, created, **kwargs):
     if kwargs.get('raw'):
         instance.save()
-        return
-    else:
-        cache.delete_keys_by_model_instance(instance, AbstractProduct)
 
 
 post_save.connect(instance_post_save, sender=Flower)
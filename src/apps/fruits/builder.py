@@ -1,5 +1,3 @@
-import datetime
-
 from apps.dailytrans.builders.eir030 import Api as WholeSaleApi06
 from apps.dailytrans.builders.apis import Api as OriginApi
 from apps.dailytrans.builders.amis import Api as WholeSaleApi03
@@ -8,6 +6,7 @@ from apps.dailytrans.builders.utils import (
     director,
     date_generator,
     DirectData,
+    DirectJob,
 )
 from .models import Fruit
 
@@ -33,13 +32,9 @@ def direct_wholesale_06(start_date=None, end_date=None, *args, **kwargs):
 
     for model in MODELS:
         wholesale_api = WholeSaleApi06(model=model, **data._asdict())
-        date_diff = end_date - start_date
 
-        for delta in range(date_diff.days + 1):
-            response = wholesale_api.request(
-                start_date=start_date + datetime.timedelta(days=delta),
-                end_date=start_date + datetime.timedelta(days=delta), tc_type='N05'
-            )
+        # tc_type=N05 -> 水果，以多天為一個區間請求，依完成順序寫入
+        for response in wholesale_api.request_range(start_date, end_date, tc_type='N05'):
             wholesale_api.load(response)
 
     return data
@@ -51,15 +46,8 @@ def direct_origin(start_date=None, end_date=None, *args, **kwargs):
 
     for model in MODELS:
         origin_api = OriginApi(model=model, **data._asdict())
-        date_diff = end_date - start_date
-        for delta in range(date_diff.days + 1):
-            response = origin_api.request(start_date=start_date + datetime.timedelta(days=delta),
-                                          end_date=start_date + datetime.timedelta(days=delta), *args, **kwargs)
-            origin_api.load(response)
-            # response_banana_low = origin_api.request(start_date=start_date + datetime.timedelta(days=delta),
-            #                                          end_date=start_date + datetime.timedelta(days=delta),
-            #                                          name='青香蕉下品(內銷)')
-            # origin_api.load(response_banana_low)
+        for responses in origin_api.request_range(start_date, end_date, **kwargs):
+            origin_api.load(responses)
     return data
 
 
@@ -72,8 +60,17 @@ def direct_wholesale_03(start_date=None, end_date=None, *args, **kwargs):
         wholesale_api = WholeSaleApi03(model=model, market_type='F', **data._asdict())
 
         # this api only provide one day filter
-        for delta_start_date, delta_end_date in date_generator(start_date, end_date, 1):
-            response = wholesale_api.request(date=delta_start_date)
+        params_list = [{'date': date} for date, _ in date_generator(start_date, end_date, 1)]
+        for params, response in wholesale_api.request_many(params_list):
             wholesale_api.load(response)
 
     return data
+
+
+# 排程時 `direct` 拆分成以下子任務平行執行(apps.dailytrans.tasks.fan_out_direct)
+# amis 只能逐日請求，以 7 天為一個子任務
+DIRECT_JOBS = [
+    DirectJob(direct_wholesale_06, 'eir030'),
+    DirectJob(direct_origin, 'apis'),
+    DirectJob(direct_wholesale_03, 'amis', 7),
+]
@@ -1,31 +1,234 @@
+import atexit
 import logging
+import os
+import queue
+import sys
+import threading
+import time
 import traceback
+import weakref
+
+_handlers = weakref.WeakSet()
 
 
 class DatabaseLogHandler(logging.Handler):
-    def emit(self, record):
-        from .models import Log, LogType
+    """
+    將 log 寫入資料庫(apps.logs.models.Log)
 
-        trace = None
+    asynchronous=True 時 `emit` 只將 record 放入 queue，由背景 thread 依 batch_size/flush_interval 以 bulk_create 批次寫入，
+    寫 log 的程式(web request、builder)不需要等待資料庫；LogType 依 code 快取，不會每筆 log 都查詢一次
+    (查無的 code 只暫存 MISSING_TYPE_TTL 秒)
+    queue 已滿時會捨棄新的 record，避免資料庫異常時佔用過多記憶體；寫入失敗的 batch 會放回 queue，
+    重試 max_retries 次仍失敗時捨棄，捨棄的筆數記錄於 dropped
 
-        if record.exc_info:
-            trace = traceback.format_exc()
+    asynchronous=False 時於呼叫端 thread 直接寫入(測試環境使用，確保與測試共用同一個交易)
+    """
+
+    # 查無 LogType 時暫時記住的秒數
+    MISSING_TYPE_TTL = 60
+
+    def __init__(self, level=logging.NOTSET, asynchronous=True, batch_size=100, flush_interval=2.0,
+                 max_queue_size=10000, max_retries=3):
+        """
+        :param asynchronous: bool，是否以背景 thread 批次寫入
+        :param batch_size: int，queue 中累積的筆數達到此值時立即寫入，也是單次 bulk_create 的筆數上限
+        :param flush_interval: float，背景 thread 最久每隔幾秒寫入一次
+        :param max_queue_size: int，queue 的筆數上限
+        :param max_retries: int，寫入失敗的 record 最多重試幾次
+        """
+
+        super(DatabaseLogHandler, self).__init__(level)
+
+        self.asynchronous = asynchronous
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.dropped = 0
+
+        self._types = {}
+        # 查無 LogType 的 code 於 MISSING_TYPE_TTL 秒後重新查詢，之後新增的 LogType 不需重啟 process
+        self._missing_types = {}
+        self._flush_lock = threading.Lock()
+        self._reset()
+
+        _handlers.add(self)
+
+    def _reset(self):
+        # fork 後(例如 Celery prefork)子 process 沒有背景 thread，且 queue 內部的 lock 狀態不可靠，需重新建立
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _start(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='DatabaseLogHandler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from django.db import connection
 
-        type_code = record.__dict__.get('type_code')
-        request_url = record.__dict__.get('request_url')
-        duration = record.__dict__.get('duration')
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # 背景 thread 沒有 request 的 signal，需自行關閉失效(資料庫重啟、failover)或過期的連線，下次查詢時重新連線
+            connection.close_if_unusable_or_obsolete()
+            self.flush()
 
-        msg = record.getMessage()
-        logger_type = LogType.objects.filter(code=type_code).first()
+        connection.close()
 
-        kwargs = {
+    def format_record(self, record):
+        """
+        將 record 轉換為 Log 的欄位，需在呼叫端 thread 執行，traceback 才會是正確的
+        """
+
+        trace = None
+
+        if record.exc_info:
+            trace = ''.join(traceback.format_exception(*record.exc_info))
+
+        return {
             'logger_name': record.name,
             'level': record.levelno,
-            'msg': msg,
+            'msg': record.getMessage(),
             'trace': trace,
-            'type': logger_type,
-            'url': request_url,
-            'duration': duration,
+            'type_code': record.__dict__.get('type_code'),
+            'url': record.__dict__.get('request_url'),
+            'duration': record.__dict__.get('duration'),
         }
-        logging.debug(msg)
-        Log.objects.create(**kwargs)
+
+    def emit(self, record):
+        try:
+            row = self.format_record(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        logging.debug(row['msg'])
+
+        if not self.asynchronous:
+            if not self.write([row]):
+                self.dropped += 1
+            return
+
+        self._start()
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def get_log_type(self, code):
+        from .models import LogType
+
+        if code is None:
+            return None
+
+        if code in self._types:
+            return self._types[code]
+
+        if self._missing_types.get(code, 0) > time.monotonic():
+            return None
+
+        log_type = LogType.objects.filter(code=code).first()
+
+        if log_type is None:
+            self._missing_types[code] = time.monotonic() + self.MISSING_TYPE_TTL
+        else:
+            self._types[code] = log_type
+            self._missing_types.pop(code, None)
+
+        return log_type
+
+    def write(self, rows):
+        """
+        :return: bool，是否寫入成功
+        """
+
+        from .models import Log
+
+        try:
+            Log.objects.bulk_create([
+                Log(
+                    type=self.get_log_type(row['type_code']),
+                    **{key: value for key, value in row.items() if key not in ('type_code', 'attempts')}
+                )
+                for row in rows
+            ])
+        except Exception:
+            # 寫入失敗時不能再透過 logging 記錄，避免遞迴
+            traceback.print_exc(file=sys.stderr)
+            return False
+
+        return True
+
+    def requeue(self, rows):
+        """
+        將寫入失敗的 record 放回 queue，超過重試次數或 queue 已滿時捨棄
+        """
+
+        for row in rows:
+            row['attempts'] = row.get('attempts', 0) + 1
+
+            if row['attempts'] > self.max_retries:
+                self.dropped += 1
+                continue
+
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+
+    def flush(self):
+        """
+        將 queue 中所有 record 寫入資料庫，可由任何 thread 呼叫
+        """
+
+        with self._flush_lock:
+            while True:
+                rows = []
+
+                while len(rows) < self.batch_size:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if not rows:
+                    break
+
+                if not self.write(rows):
+                    # 資料庫異常時不繼續寫入，放回 queue 待下次 flush
+                    self.requeue(rows)
+                    break
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(self.flush_interval)
+
+        self.flush()
+        super(DatabaseLogHandler, self).close()
+
+
+def flush_handlers(**kwargs):
+    """
+    將所有 DatabaseLogHandler 尚未寫入的 record 寫入資料庫，於 process 結束前呼叫(atexit、Celery worker shutdown)
+    """
+
+    for handler in list(_handlers):
+        handler.flush()
+
+
+atexit.register(flush_handlers)
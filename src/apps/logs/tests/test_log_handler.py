@@ -1,7 +1,11 @@
+from unittest.mock import patch
+
 from django.core.management import call_command
+from django.db import DatabaseError
 from django.test import TestCase
 import logging
 
+from apps.logs.db_log_handler import DatabaseLogHandler
 from apps.logs.models import LogType, Log
 
 
@@ -27,5 +31,76 @@ class HandlerTestCase(TestCase):
             }
             self.logger.error(e, extra=extra)
 
+        for handler in self.logger.handlers:
+            handler.flush()
+
         logs = Log.objects.filter(type__code='LOT-crops')
         self.assertEqual(logs.count(), 1)
+
+    def test_asynchronous_handler(self):
+        # 背景 thread 不會在測試期間寫入(flush_interval、batch_size 夠大)，由測試 thread 呼叫 flush 寫入
+        handler = DatabaseLogHandler(asynchronous=True, batch_size=1000, flush_interval=60)
+        logger = logging.getLogger('aprp.test_asynchronous_handler')
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        try:
+            for i in range(3):
+                logger.warning('message %s', i, extra={'type_code': 'LOT-crops'})
+
+            self.assertEqual(Log.objects.filter(logger_name=logger.name).count(), 0)
+
+            handler.flush()
+
+            logs = Log.objects.filter(logger_name=logger.name, type__code='LOT-crops')
+            self.assertEqual(logs.count(), 3)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def test_asynchronous_handler_retries_failed_batch(self):
+        # 寫入失敗的 batch 放回 queue，下次 flush 重新寫入，超過重試次數時捨棄
+        handler = DatabaseLogHandler(asynchronous=True, batch_size=1000, flush_interval=60, max_retries=1)
+        logger = logging.getLogger('aprp.test_asynchronous_handler_retries_failed_batch')
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        try:
+            logger.warning('retried', extra={'type_code': 'LOT-crops'})
+
+            with patch.object(Log.objects, 'bulk_create', side_effect=DatabaseError), \
+                    patch('apps.logs.db_log_handler.traceback.print_exc'):
+                handler.flush()
+
+            self.assertEqual(handler.dropped, 0)
+
+            handler.flush()
+            self.assertEqual(Log.objects.filter(logger_name=logger.name, type__code='LOT-crops').count(), 1)
+
+            logger.warning('dropped')
+
+            with patch.object(Log.objects, 'bulk_create', side_effect=DatabaseError), \
+                    patch('apps.logs.db_log_handler.traceback.print_exc'):
+                handler.flush()
+                handler.flush()
+
+            self.assertEqual(handler.dropped, 1)
+            self.assertEqual(Log.objects.filter(logger_name=logger.name).count(), 1)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def test_get_log_type_does_not_keep_missing_type(self):
+        handler = DatabaseLogHandler(asynchronous=False)
+
+        # 查無 LogType 時在 MISSING_TYPE_TTL 內不重新查詢
+        self.assertIsNone(handler.get_log_type('LOT-new'))
+        log_type = LogType.objects.create(code='LOT-new', name='new')
+        self.assertIsNone(handler.get_log_type('LOT-new'))
+
+        # 超過 MISSING_TYPE_TTL 後重新查詢，查到的 LogType 會保留
+        with patch('apps.logs.db_log_handler.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(handler.get_log_type('LOT-new'), log_type)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(handler.get_log_type('LOT-new'), log_type)
@@ -10,6 +10,7 @@ from apps.dailytrans.builders.utils import (
     director,
     date_generator,
     DirectData,
+    DirectJob,
 )
 from .models import Seafood
 
@@ -70,11 +71,7 @@ def direct_wholesale(start_date=None, end_date=None, *args, **kwargs):
 
     for model in MODELS:
         wholesale_api = WholeSaleApi(model=model, **data._asdict())
-        date_diff = end_date - start_date
-
-        for delta in range(date_diff.days + 1):
-            response = wholesale_api.request(start_date=start_date + datetime.timedelta(days=delta),
-                                             end_date=start_date + datetime.timedelta(days=delta))
+        for response in wholesale_api.request_range(start_date, end_date):
             wholesale_api.load(response)
 
     return data
@@ -117,3 +114,10 @@ def direct_origin(start_date=None, end_date=None, *args, **kwargs):
                 time.sleep(10)
 
     return data
+
+
+# 排程時批發價格拆分成以下子任務平行執行(apps.dailytrans.tasks.fan_out_direct)
+# 爬蟲逐日請求且需避免被封鎖，以 7 天為一個子任務並限制 efish 的速率
+WHOLESALE_DIRECT_JOBS = [
+    DirectJob(direct_generic_wholesale, 'efish', 7),
+]
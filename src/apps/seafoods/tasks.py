@@ -1,9 +1,10 @@
 from __future__ import absolute_import, unicode_literals
 import logging
 from celery.task import task
+from apps.dailytrans.tasks import fan_out_direct
 from .builder import (
     direct_origin,
-    direct_generic_wholesale,
+    WHOLESALE_DIRECT_JOBS,
 )
 
 
@@ -14,10 +15,8 @@ def build_seafood_wholesale(delta):
         'type_code': 'LOT-seafoods',
     }
     try:
-        result = direct_generic_wholesale(delta=delta)
-        if result.success:
-            logger_extra['duration'] = result.duration
-            db_logger.info('Successfully process wholesale trans: %s - %s' % (result.start_date, result.end_date), extra=logger_extra)
+        # 以日期區間拆分平行執行，結果由 AggregateDirectResults 寫入 log
+        fan_out_direct(WHOLESALE_DIRECT_JOBS, delta, logger_extra['type_code'])
     except Exception as e:
         db_logger.exception(e, extra=logger_extra)
 
@@ -1,8 +1,6 @@
-import pickle
-
 from typing import List, Optional
-from apps.configs.models import Config, AbstractProduct
-from dashboard.caches import redis_instance as cache
+from apps.configs.models import Config, AbstractProduct, WATCHLIST_CACHE_NAMESPACE, watchlist_cache_namespaces
+from dashboard.caches import chart_cache, redis_instance as cache
 from django.conf import settings
 from django.db.models import (
     Model,
@@ -18,8 +16,9 @@ from django.db.models import (
     TextField,
     DateField,
     PositiveIntegerField,
-    Q,
 )
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -112,49 +111,33 @@ class Watchlist(Model):
         取出並快取 WatchList 底下所有對應的 WatchlistItem，並在快取有東西時直接從快取讀取
         """
 
-        cache_key = f"watchlist{self.id}_children"
-        items = cache.get(cache_key)
-
-        # 如果快取沒有東西，會拿所有 parent FK 指向 Watchlist 的 WatchlistItem
-        # 把查詢後的 QuerySet (或轉成list) 存進快取，並用相同的 cache key，並開始 dump = True (會 pickle 後存入)
-        # dump = True 會告訴快取後端用 pickle 把 items 轉成 bytes，再存進記憶體
-        if items is None:
-            items = WatchlistItem.objects.filter(parent=self)
-            cache.set(cache_key, items, dump=True)
-
-        # 下次呼叫 cache.get() 拿到的就是那串 serialized bytes
-        # pickle.loads() 能還原原本的 QuerySet / list，不用再跑一次資料庫查詢
-        else:
-            items = pickle.loads(items)
+        # 如果快取沒有東西，會拿所有 parent FK 指向 Watchlist 的 WatchlistItem，只把 id list 存進快取
+        # 監控品項新增、修改或刪除時 watchlist{self.id} namespace 會失效
+        item_ids = cache.get_or_set(
+            CHILDREN_CACHE_KEY.format(watchlist_id=self.id),
+            lambda: list(WatchlistItem.objects.filter(parent=self).order_by('id').values_list('id', flat=True)),
+            namespaces=(WATCHLIST_CACHE_NAMESPACE.format(watchlist_id=self.id),),
+        )
 
-        return items
+        return WatchlistItem.objects.filter(id__in=item_ids)
 
     def related_configs(self):
         """ 得到特定監控清單的所有品項分類 (Config) """
 
-        configs = cache.get(f'watchlist{self.id}_related_configs')
-
-        # 假如 configs 為 None
         # self.children() 會回傳一個 QuerySet，裡面包含所有 WatchlistItem，parent FK 指向這個 Watchlist
         # value_list() 為 Django ORM 的方法，用來取出指定欄位的值，不會回傳整個物件
         # product__config__id 為跨表關聯，WatchlistItem 的 product 欄位(一個 Product 實例)
         # -> config 欄位 (Product 關聯的 Config 實例) -> id 欄位 ( Config 的 id )
-        # distinct() 去除重複值，確保 id 只出現一次
-        if configs is None:
-            ids = self.children().values_list('product__config__id', flat=True).distinct()
-
-            # 用 id 去查詢對應的 Config 並進行 id 排序
-            configs = Config.objects.filter(id__in=ids).order_by('id')
-
-            # dump = True 會告訴快取後端用 pickle 把 items 轉成 bytes，再存進記憶體
-            cache.set(f"watchlist{self.id}_related_configs", configs, dump=True)
-
-
-        # pickle.loads() 能還原原本的 QuerySet / list，不用再跑一次資料庫查詢
-        else:
-            configs = pickle.loads(configs)
+        # 品項的 config 異動時(products namespace)也需失效
+        config_ids = cache.get_or_set(
+            RELATED_CONFIGS_CACHE_KEY.format(watchlist_id=self.id),
+            lambda: sorted(set(self.children().exclude(product__config=None)
+                               .values_list('product__config__id', flat=True))),
+            namespaces=watchlist_cache_namespaces(self),
+        )
 
-        return configs
+        # 用 id 去查詢對應的 Config 並進行 id 排序
+        return Config.objects.filter(id__in=config_ids).order_by('id')
 
     @property
     def related_product_ids(self):
@@ -181,24 +164,9 @@ class WatchlistItemQuerySet(QuerySet):
         )
 
         if product:
-            cache_key = f'product{product.id}_filter_by_product'
-            items = cache.get(cache_key)
-
-            if items is None:
-                # 簡而言之，過濾出 X 品項，或是向上找出 parent 為 X 品項的子品項
-                items = self.filter(
-                    Q(product=product)
-                    | Q(product__parent=product)
-                    | Q(product__parent__parent=product)
-                    | Q(product__parent__parent__parent=product)
-                    | Q(product__parent__parent__parent__parent=product)
-                )
-
-                cache.set(cache_key, items, dump=True)
-            else:
-                items = pickle.loads(items)
-
-            return items
+            # 簡而言之，過濾出 X 品項，或是 X 品項底下所有層別的子品項
+            # 子品項 id 由 AbstractProduct.children_all_ids 快取，這裡不快取 self 的查詢結果(self 可能已依監控清單篩選)
+            return self.filter(product__id__in=[product.id] + list(product.children_all_ids()))
 
         return self.none()
 
@@ -376,3 +344,47 @@ class MonitorProfile(Model):
     @property
     def up_price(self):
         return self.price_range[1]
+
+
+def watchlist_changed(sender, instance, **kwargs):
+    # 監控清單(watch_all)或監控品項異動時，該清單相關的快取失效
+    watchlist_id = instance.id if isinstance(instance, Watchlist) else instance.parent_id
+
+    if watchlist_id and not kwargs.get('raw'):
+        # 交易 commit 後才失效，避免其他 request 在 commit 前以舊資料重建快取
+        namespace = WATCHLIST_CACHE_NAMESPACE.format(watchlist_id=watchlist_id)
+        transaction.on_commit(lambda: cache.invalidate(namespace))
+
+
+post_save.connect(watchlist_changed, sender=Watchlist)
+post_delete.connect(watchlist_changed, sender=Watchlist)
+post_save.connect(watchlist_changed, sender=WatchlistItem)
+post_delete.connect(watchlist_changed, sender=WatchlistItem)
+
+
+def watchlist_item_chart_changed(sender, instance, **kwargs):
+    # 未指定來源的圖表以監控品項的來源計算，監控品項異動時該品項的圖表快取失效
+    if not kwargs.get('raw'):
+        product_ids = [instance.product_id]
+        transaction.on_commit(lambda: chart_cache.invalidate(product_ids))
+
+
+def watchlist_item_sources_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    # 由 Source 端修改(source.watchlistitem_set.add)時 pk_set 為 WatchlistItem id，clear 時 pk_set 為 None
+    if not reverse:
+        product_ids = [instance.product_id]
+    elif pk_set is not None:
+        product_ids = list(WatchlistItem.objects.filter(id__in=pk_set).values_list('product_id', flat=True))
+    else:
+        transaction.on_commit(chart_cache.invalidate_all)
+        return
+
+    transaction.on_commit(lambda: chart_cache.invalidate(product_ids))
+
+
+post_save.connect(watchlist_item_chart_changed, sender=WatchlistItem)
+post_delete.connect(watchlist_item_chart_changed, sender=WatchlistItem)
+m2m_changed.connect(watchlist_item_sources_changed, sender=WatchlistItem.sources.through)
@@ -1,5 +1,7 @@
+from .chart_cache import ChartCache
 from .redis_cache import RedisCache
 
 redis_instance = RedisCache()
+chart_cache = ChartCache()
 
-__all__ = ['redis_instance']
+__all__ = ['ChartCache', 'RedisCache', 'redis_instance', 'chart_cache']
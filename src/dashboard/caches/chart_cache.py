@@ -0,0 +1,143 @@
+import datetime
+import functools
+import hashlib
+import inspect
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache as base_cache
+from django.db.models import Model, QuerySet
+from django.utils import translation
+
+db_logger = logging.getLogger('aprp')
+
+
+class ChartCache:
+    """
+    圖表計算結果(get_daily_price_volume 等回傳的 option dict)的快取
+
+    key 由函數名稱、參數(type、品項、來源、日期區間、年份...)及語系組成，並加上各品項的版本號:
+    builder 寫入 DailyTran 後只需將寫入品項的版本號加一(`invalidate`)，包含這些品項的快取便不會再被讀取，
+    其餘圖表仍由快取回傳，舊的快取由 timeout 自然淘汰
+    """
+
+    KEY_PREFIX = 'chart'
+    GENERATION_KEY = 'chart_generation:{}'
+    GLOBAL_GENERATION = 'all'
+
+    def __init__(self, cache=None):
+        self.cache = cache or base_cache
+
+    @property
+    def timeout(self):
+        # 0 為不使用快取
+        return getattr(settings, 'CHART_CACHE_TIMEOUT', 60 * 60 * 24)
+
+    def generations(self, product_ids):
+        keys = [self.GENERATION_KEY.format(self.GLOBAL_GENERATION)]
+        keys.extend(self.GENERATION_KEY.format(product_id) for product_id in sorted(product_ids))
+
+        values = self.cache.get_many(keys)
+
+        return [values.get(key, 0) for key in keys]
+
+    def invalidate(self, product_ids):
+        """
+        使包含這些品項的圖表快取失效
+
+        :param product_ids: Iterable[int]
+        """
+
+        if not self.timeout:
+            return
+
+        for product_id in set(product_ids):
+            self._incr(self.GENERATION_KEY.format(product_id))
+
+    def invalidate_all(self):
+        if self.timeout:
+            self._incr(self.GENERATION_KEY.format(self.GLOBAL_GENERATION))
+
+    def _incr(self, key):
+        try:
+            # 版本號不能過期，否則可能回到舊的版本號而讀到舊的快取
+            self.cache.add(key, 0, None)
+            self.cache.incr(key)
+        except Exception as e:
+            db_logger.exception(e)
+
+    def make_key(self, name, arguments, product_ids):
+        payload = json.dumps(
+            [name, arguments, translation.get_language(), self.generations(product_ids)],
+            sort_keys=True, default=str,
+        )
+
+        return '{}:{}:{}'.format(self.KEY_PREFIX, name, hashlib.sha1(payload.encode()).hexdigest())
+
+    def cached(self, func):
+        """
+        快取函數的回傳值，函數參數需包含 items(WatchlistItem 或 AbstractProduct)
+        """
+
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.timeout:
+                return func(*args, **kwargs)
+
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            arguments = arguments.arguments
+
+            try:
+                key = self.make_key(
+                    func.__name__,
+                    {name: normalize(value) for name, value in arguments.items()},
+                    product_ids_of(arguments.get('items')),
+                )
+                result = self.cache.get(key)
+            except Exception as e:
+                db_logger.exception(e)
+                return func(*args, **kwargs)
+
+            if result is None:
+                result = func(*args, **kwargs)
+
+                try:
+                    self.cache.set(key, result, self.timeout)
+                except Exception as e:
+                    db_logger.exception(e)
+
+            return result
+
+        return wrapper
+
+
+def normalize(value):
+    """
+    將參數轉為可 JSON 序列化且順序固定的值
+    """
+
+    if isinstance(value, Model):
+        return '{}:{}'.format(value._meta.label_lower, value.pk)
+    if isinstance(value, QuerySet):
+        return ['{}:{}'.format(value.model._meta.label_lower, pk) for pk in sorted(value.values_list('pk', flat=True))]
+    if isinstance(value, (list, tuple, set)):
+        return sorted((normalize(v) for v in value), key=str)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def product_ids_of(items):
+    """
+    :param items: Iterable[WatchlistItem | AbstractProduct]
+    :return: Set[int]
+    """
+
+    if items is None:
+        return set()
+
+    return {getattr(item, 'product_id', None) or item.pk for item in items}
@@ -1,69 +1,219 @@
-import pickle
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.core.cache import cache as base_cache
 from django_redis import get_redis_connection
 
+db_logger = logging.getLogger('aprp')
+
 
 class RedisCache:
     """
-    Redis cache class to handle cache operations using Django cache and Redis
+    選單、圖表頁籤等物件查詢的快取，以 Django cache(Redis)為 L2，前面加上每個 process 的 in-memory L1
+
+    - 只存放 id list、dict 等基本型別，不存放 QuerySet 或 model instance(pickle 後的 QuerySet 反序列化時仍會查詢資料庫，
+      且會連同 model 定義一起序列化)，呼叫端以 id 重新組成 QuerySet
+    - 失效採用 namespace 版本號(generation counter): 每個 key 可屬於多個 namespace，實際的 key 會加上各 namespace 的版本號，
+      `invalidate` 只需將版本號加一，不需 SCAN 所有 key，舊的 key 由 timeout 自然淘汰
+    - L1 的資料與版本號皆只保留 `local_timeout` 秒，其他 process 寫入後最多延遲 `local_timeout` 秒生效
+    - `stats` 記錄 L1 命中、L2 命中及未命中的次數
     """
-    def __init__(self):
-        self.use_cache = False
-        self.cache = base_cache
 
+    GENERATION_KEY = 'cache_generation:{}'
+
+    def __init__(self, cache=None, enabled=None, timeout=None, local_timeout=None, local_max_entries=None):
+        """
+        :param cache: Django cache，預設為 settings.CACHES['default']
+        :param enabled: bool，預設為 settings.OBJECT_CACHE_ENABLED
+        :param timeout: int，L2 的快取秒數，預設為 settings.OBJECT_CACHE_TIMEOUT
+        :param local_timeout: float，L1 的快取秒數，0 為不使用 L1，預設為 settings.OBJECT_CACHE_LOCAL_TIMEOUT
+        :param local_max_entries: int，L1 的筆數上限，預設為 settings.OBJECT_CACHE_LOCAL_MAX_ENTRIES
+        """
+
+        self.cache = cache or base_cache
+        self._enabled = enabled
+        self._timeout = timeout
+        self._local_timeout = local_timeout
+        self._local_max_entries = local_max_entries
+
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'hits': 0, 'misses': 0}
+
+    @property
+    def redis(self):
         # get redis connection
-        self.redis = get_redis_connection("default")
+        return get_redis_connection("default")
+
+    @property
+    def use_cache(self):
+        return self._setting('_enabled', 'OBJECT_CACHE_ENABLED', True)
+
+    @property
+    def timeout(self):
+        return self._setting('_timeout', 'OBJECT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+    @property
+    def local_timeout(self):
+        return self._setting('_local_timeout', 'OBJECT_CACHE_LOCAL_TIMEOUT', 5)
+
+    @property
+    def local_max_entries(self):
+        return self._setting('_local_max_entries', 'OBJECT_CACHE_LOCAL_MAX_ENTRIES', 1000)
+
+    def _setting(self, attr, name, default):
+        value = getattr(self, attr)
+        return getattr(settings, name, default) if value is None else value
 
-    def get(self, key:str):
-        return self.cache.get(key) if self.use_cache else None
+    def get(self, key: str, namespaces=()):
+        """
+        :param namespaces: Iterable[str]，key 所屬的 namespace，需與 `set` 時相同
+        :return: 快取的值，未命中時為 None
+        """
 
-    def set(self, key:str, value, timeout=None, dump=False):
         if not self.use_cache:
-            return
+            return None
 
-        self.cache.set(key, pickle.dumps(value), timeout) if dump else self.cache.set(key, value, timeout)
+        try:
+            key = self.make_key(key, namespaces)
+            value = self._local_get(key)
 
-    def delete(self, key:str):
-        self.cache.delete(key)
+            if value is not None:
+                self.stats['local_hits'] += 1
+                return value
 
-    def delete_keys(self, keys:list):
-        # delete multiple keys
-        self.cache.delete_many(keys)
+            value = self.cache.get(key)
+        except Exception as e:
+            db_logger.exception(e)
+            return None
+
+        if value is None:
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+            self._local_set(key, value)
 
-    def delete_keys_with_pattern(self, pattern:str):
+        return value
+
+    def set(self, key: str, value, timeout=None, namespaces=()):
         """
-        Delete keys with specific pattern
+        :param value: list、dict 等基本型別，不可為 QuerySet 或 model instance，取出後請勿修改
         """
-        cursor = '0'
 
-        while cursor != 0:
-            # scan keys with pattern
-            cursor, keys = self.redis.scan(cursor=cursor, match=pattern)
+        if not self.use_cache or value is None:
+            return
 
-            if keys:
-                # remove prefix from keys because cache keys do not need to prefix to delete
-                cleaned_keys = [key.decode().lstrip(':1:') for key in keys]
-                self.delete_keys(cleaned_keys)
+        try:
+            key = self.make_key(key, namespaces)
+            self.cache.set(key, value, timeout or self.timeout)
+            self._local_set(key, value)
+        except Exception as e:
+            db_logger.exception(e)
 
-    def delete_keys_by_model_instance(self, instance, model, key=None):
+    def get_or_set(self, key: str, default, timeout=None, namespaces=()):
         """
-        This method will call by `post_save` signal to delete cache keys
+        :param default: callable，未命中時呼叫並寫入快取
         """
-        if not self.use_cache:
+
+        value = self.get(key, namespaces)
+
+        if value is None:
+            value = default()
+            self.set(key, value, timeout, namespaces)
+
+        return value
+
+    def make_key(self, key: str, namespaces=()):
+        if not namespaces:
+            return key
+
+        generations = self.generations(namespaces)
+
+        return '{}:{}'.format(key, '.'.join(str(generations[namespace]) for namespace in namespaces))
+
+    def generations(self, namespaces):
+        keys = {namespace: self.GENERATION_KEY.format(namespace) for namespace in namespaces}
+        generations = {}
+
+        for namespace, key in keys.items():
+            value = self._local_get(key)
+            if value is not None:
+                generations[namespace] = value
+
+        missing = [keys[namespace] for namespace in keys if namespace not in generations]
+
+        if missing:
+            values = self.cache.get_many(missing)
+
+            for namespace, key in keys.items():
+                if namespace not in generations:
+                    generations[namespace] = values.get(key, 0)
+                    self._local_set(key, generations[namespace])
+
+        return generations
+
+    def invalidate(self, *namespaces):
+        """
+        使屬於這些 namespace 的 key 失效
+        """
+
+        for namespace in set(namespaces):
+            key = self.GENERATION_KEY.format(namespace)
+
+            try:
+                # 版本號不能過期，否則可能回到舊的版本號而讀到舊的快取
+                self.cache.add(key, 0, None)
+                self._local_set(key, self.cache.incr(key))
+            except Exception as e:
+                db_logger.exception(e)
+                self._local_pop(key)
+
+    def _local_get(self, key):
+        if not self.local_timeout:
+            return None
+
+        with self._lock:
+            item = self._local.get(key)
+
+            if item is None:
+                return None
+
+            expires, value = item
+
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+
+            return value
+
+    def _local_set(self, key, value):
+        if not self.local_timeout:
             return
 
-        # this is a hack to avoid circular import and this condition only for the model argument that
-        # is `AbstractProduct` class
-        if model._meta.object_name == 'AbstractProduct' and isinstance(instance, model):
-            self.delete_keys_with_pattern(f'*product{instance.id}*')
+        with self._lock:
+            self._local.pop(key, None)
+            self._local[key] = (time.monotonic() + self.local_timeout, value)
+
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_pop(self, key):
+        with self._lock:
+            self._local.pop(key, None)
 
-            config = instance.config
-            watchlist_item = instance.watchlistitem_set.last()
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
 
-            if config:
-                self.delete_keys_with_pattern(f'*config{config.id}*')
-            if watchlist_item:
-                self.delete_keys_with_pattern(f'*watchlist{watchlist_item.parent.id}*')
+    def delete(self, key: str):
+        self._local_pop(key)
+        self.cache.delete(key)
 
-        elif model._meta.object_name == 'Last5YearsItems' and isinstance(instance, model):
-            self.delete(key)
+    def delete_keys(self, keys: list):
+        # delete multiple keys
+        for key in keys:
+            self._local_pop(key)
+        self.cache.delete_many(keys)
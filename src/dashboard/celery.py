@@ -2,6 +2,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown, worker_shutdown
 import datetime
 
 # set the default Django settings module for the 'celery' program.
@@ -21,6 +22,15 @@ app.autodiscover_tasks()
 # Add the following line to enable the workaround
 app.conf.beat_max_loop_interval = 0
 
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_db_logs(**kwargs):
+    # DatabaseLogHandler 以背景 thread 批次寫入，worker 結束前需將尚未寫入的 log 寫入資料庫
+    from apps.logs.db_log_handler import flush_handlers
+
+    flush_handlers()
+
 app.conf.beat_schedule = {
     # ======================================== Job ========================================
     'monitor_profile_active_update': {
@@ -36,6 +46,11 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute='0,30', hour='9-12', day_of_week='1-5'),
         'args': (-1,)  # Update yesterday's report
     },
+    'create_daily_tran_partitions': {
+        'task': 'CreateDailyTranPartitions',
+        'schedule': crontab(minute=0, hour='1', day_of_month='1'),
+        'args': (1,)  # Create partitions until next year
+    },
     # ======================================== ShortTerm Builder ========================================
     'daily-chicken-builder-3d': {
         'task': 'DailyChickenBuilder',
@@ -128,7 +128,10 @@ LOGGING = {
         },
         'aprp_log': {
             'level': 'DEBUG',
-            'class': 'apps.logs.db_log_handler.DatabaseLogHandler'
+            'class': 'apps.logs.db_log_handler.DatabaseLogHandler',
+            'asynchronous': env.bool('LOG_HANDLER_ASYNC', default=True),
+            'batch_size': env.int('LOG_HANDLER_BATCH_SIZE', default=100),
+            'flush_interval': env.float('LOG_HANDLER_FLUSH_INTERVAL', default=2.0),
         },
         'console': {
             'class': 'logging.StreamHandler',
@@ -406,6 +409,74 @@ DAILYTRAN_BUILDER_API = {
     'naifchickens': 'https://www.naif.org.tw/memberLogin.aspx?frontTitleMenuID=105',   #飼料和環南市場雞隻等數據是從中央畜產會登入帳號爬蟲取得
 }
 
+# builder 共用的 HTTP 連線設定(apps/dailytrans/builders/fetcher.py)
+DAILYTRAN_BUILDER_HTTP = {
+    # (connect timeout, read timeout) 秒
+    'TIMEOUT': (env.int('BUILDER_HTTP_CONNECT_TIMEOUT', default=10), env.int('BUILDER_HTTP_READ_TIMEOUT', default=60)),
+    'MAX_RETRY': env.int('BUILDER_HTTP_MAX_RETRY', default=5),
+    # 重試等待秒數上限為 min(BACKOFF_MAX, BACKOFF_BASE * 2 ^ n)，並加上隨機抖動
+    'BACKOFF_BASE': 2,
+    'BACKOFF_MAX': 60,
+    'MAX_WORKERS': env.int('BUILDER_HTTP_MAX_WORKERS', default=8),
+    # 每個 host 同時進行的請求數
+    'HOST_CONCURRENCY': {
+        'data.moa.gov.tw': 4,
+    },
+    'DEFAULT_HOST_CONCURRENCY': 2,
+}
+
+# 支援日期區間查詢的 API 單次請求最多涵蓋的天數(MAX_WINDOW_DAYS)及伺服器回傳筆數上限(MAX_ROWS，0 為不檢查)
+# 請求失敗或回傳筆數達到 MAX_ROWS 時，區間會自動切半重新請求
+DAILYTRAN_BUILDER_WINDOW = {
+    'eir030': {
+        'MAX_WINDOW_DAYS': env.int('BUILDER_EIR030_MAX_WINDOW_DAYS', default=31),
+        'MAX_ROWS': env.int('BUILDER_EIR030_MAX_ROWS', default=1000),
+    },
+    'eir032': {
+        'MAX_WINDOW_DAYS': env.int('BUILDER_EIR032_MAX_WINDOW_DAYS', default=31),
+        'MAX_ROWS': env.int('BUILDER_EIR032_MAX_ROWS', default=1000),
+    },
+    'apis': {
+        'MAX_WINDOW_DAYS': env.int('BUILDER_APIS_MAX_WINDOW_DAYS', default=31),
+        'MAX_ROWS': env.int('BUILDER_APIS_MAX_ROWS', default=0),
+    },
+}
+
+# 組合型 direct 拆分成 Celery 子任務時，各資料來源每分鐘最多可啟動的子任務數(apps/dailytrans/tasks.py)
+DAILYTRAN_BUILDER_RATE_LIMITS = {
+    'eir030': 10,
+    'apis': 5,
+    'amis': 10,
+    'efish': 2,
+}
+
+# 單次寫入的 DailyTran 筆數達到此值時，改以 COPY 寫入暫存表後合併(apps/dailytrans/builders/staging.py)
+DAILYTRAN_BUILDER_COPY_THRESHOLD = env.int('BUILDER_COPY_THRESHOLD', default=5000)
+
+# 是否將每次 director 執行的統計數據寫入 BuilderRun(apps/dailytrans/builders/metrics.py)
+DAILYTRAN_BUILDER_METRICS = env.bool('BUILDER_METRICS', default=True)
+
+# builder 原始資料存放設定(apps/dailytrans/builders/store.py)，ROOT 為空時不啟用
+# REPLAY 為 True 時不連線，直接以存下來的資料重跑 load
+DAILYTRAN_BUILDER_STORE = {
+    'ROOT': env.str('BUILDER_STORE_ROOT', default=''),
+    'REPLAY': env.bool('BUILDER_STORE_REPLAY', default=False),
+}
+
+# 選單、圖表頁籤物件快取(dashboard/caches/redis_cache.py)，只存放 id list，依 namespace 版本號失效
+OBJECT_CACHE_ENABLED = env.bool('OBJECT_CACHE_ENABLED', default=True)
+OBJECT_CACHE_TIMEOUT = env.int('OBJECT_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# 每個 process 的 L1 快取秒數及筆數上限，其他 process 寫入後最多延遲此秒數生效，0 為不使用 L1
+OBJECT_CACHE_LOCAL_TIMEOUT = env.int('OBJECT_CACHE_LOCAL_TIMEOUT', default=5)
+OBJECT_CACHE_LOCAL_MAX_ENTRIES = env.int('OBJECT_CACHE_LOCAL_MAX_ENTRIES', default=1000)
+
+# 圖表計算結果快取秒數(dashboard/caches/chart_cache.py)，builder 寫入後依品項失效，0 為不使用快取
+CHART_CACHE_TIMEOUT = env.int('CHART_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# DailyTran 異動後延遲此秒數於背景重新產生受影響的日報表(apps/dailytrans/reports/artifacts.py)，合併同一批 builder 的多次寫入
+DAILY_REPORT_REFRESH_DELAY = env.int('DAILY_REPORT_REFRESH_DELAY', default=120)
+
 # Hide login
 DJANGO_ADMIN_PATH = env.str('DJANGO_ADMIN_PATH', default='admin')
 
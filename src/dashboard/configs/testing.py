@@ -4,6 +4,15 @@ EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
 EMAIL_ADDR = 'no-reply@domain.com'
 
+# 測試在交易中執行，log 需於同一個 thread 寫入才看得到
+LOGGING['handlers']['aprp_log']['asynchronous'] = False
+
+# 測試的交易不會 commit，圖表快取不會失效
+CHART_CACHE_TIMEOUT = 0
+
+# 測試結束後資料會 rollback，id 重複使用時會讀到其他測試的快取
+OBJECT_CACHE_ENABLED = False
+
 # Fixtures
 
 # FIXTURE_DIRS = [
@@ -1,7 +1,6 @@
 import datetime
 import json
 import operator
-import pickle
 from functools import reduce
 
 from django.contrib.contenttypes.models import ContentType
@@ -31,10 +30,6 @@ from apps.watchlists.models import (
     Watchlist,
     MonitorProfile,
 )
-from dashboard.caches import redis_instance as cache
-
-CONTENT_TYPE_CONFIG_CHARTS_CACHE_KEY = "content_type_config{config_id}_charts"
-CONTENT_TYPE_PRODUCT_CHARTS_CACHE_KEY = "content_type_product{product_id}_charts"
 
 
 def jarvismenu_extra_context(view):
@@ -182,6 +177,12 @@ def chart_tab_extra_context(view):
     return extra_context
 
 
+def get_charts(config):
+    """ 圖表頁籤的 Chart，快取只保存 Chart id(Config.chart_ids) """
+
+    return Chart.objects.filter(id__in=config.chart_ids()).order_by('id')
+
+
 def watchlist_base_chart_tab_extra_context(view):
     # Captured values
     kwargs = view.kwargs
@@ -196,16 +197,7 @@ def watchlist_base_chart_tab_extra_context(view):
 
     if content_type == 'config':
         config = Config.objects.get(id=object_id)
-        cache_key = CONTENT_TYPE_CONFIG_CHARTS_CACHE_KEY.format(config_id=config.id)
-        charts = cache.get(cache_key)
-
-        if charts is None:
-            charts = config.charts.all()
-            cache.set(cache_key, charts, dump=True)
-        else:
-            charts = pickle.loads(charts)
-
-        extra_context['charts'] = charts
+        extra_context['charts'] = get_charts(config)
 
     elif content_type == 'abstractproduct':
         content_type_with_abstract_product(object_id, extra_context, watchlist)
@@ -213,16 +205,7 @@ def watchlist_base_chart_tab_extra_context(view):
     elif content_type in ['type', 'source']:
         if last_content_type == 'abstractproduct':
             product = AbstractProduct.objects.get(id=last_object_id)
-            cache_key = CONTENT_TYPE_PRODUCT_CHARTS_CACHE_KEY.format(product_id=product.id)
-            charts = cache.get(cache_key)
-
-            if charts is None:
-                charts = product.config.charts.all()
-                cache.set(cache_key, charts, dump=True)
-            else:
-                charts = pickle.loads(charts)
-
-            extra_context['charts'] = charts
+            extra_context['charts'] = get_charts(product.config)
 
     extra_context['watchlists_json'] = WatchlistSerializer(Watchlist.objects.filter(watch_all=False), many=True).data
 
@@ -231,15 +214,7 @@ def watchlist_base_chart_tab_extra_context(view):
 
 def content_type_with_abstract_product(object_id: str, extra_context: dict, watchlist: Watchlist):
     product = AbstractProduct.objects.get(id=object_id)
-    cache_key = CONTENT_TYPE_PRODUCT_CHARTS_CACHE_KEY.format(product_id=product.id)
-    charts = cache.get(cache_key)
-
-    if charts is None:
-        charts = product.config.charts.all()
-        cache.set(cache_key, charts, dump=True)
-    else:
-        charts = pickle.loads(charts)
-    extra_context['charts'] = charts
+    extra_context['charts'] = get_charts(product.config)
     monitor_profiles = MonitorProfile.objects.filter(product__id=object_id).order_by('price')
 
     extra_context['product'] = product
@@ -1,5 +1,4 @@
 import itertools
-import pickle
 from datetime import datetime, timedelta
 from functools import wraps
 
@@ -20,6 +19,7 @@ from apps.configs.models import (
     FestivalName,
     AbstractProduct,
     Last5YearsItems,
+    LAST5_YEARS_ITEMS_CACHE_NAMESPACE,
 )
 from apps.watchlists.models import Watchlist
 from dashboard.caches import redis_instance as cache
@@ -217,17 +217,17 @@ class Last5YearsReport(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(Last5YearsReport, self).get_context_data(**kwargs)
-        all_items = cache.get(Last5YearsItems.LAST5_YEARS_ITEMS_CACHE_KEY)
-
-        all_items = self._get_items() if all_items is None else pickle.loads(all_items)
-        context['items_list'] = all_items
+        context['items_list'] = cache.get_or_set(
+            Last5YearsItems.LAST5_YEARS_ITEMS_CACHE_KEY, self._get_items,
+            namespaces=(LAST5_YEARS_ITEMS_CACHE_NAMESPACE,),
+        )
 
         return context
 
     @staticmethod
     def _get_items():
         """
-        Get last 5 years items from database and store in cache
+        Get last 5 years items from database
         """
 
         result = {}
@@ -252,9 +252,6 @@ class Last5YearsReport(LoginRequiredMixin, TemplateView):
 
             result[i.name] = {'product_id': pid, 'source': source}
 
-        # store in cache
-        cache.set(Last5YearsItems.LAST5_YEARS_ITEMS_CACHE_KEY, result, dump=True)
-
         return result
 
 
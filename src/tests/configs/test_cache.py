@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from apps.configs.models import AbstractProduct
+from dashboard.caches import RedisCache
+
+
+@pytest.fixture
+def object_cache():
+    return RedisCache(cache=LocMemCache('object-cache-test', {}), enabled=True, local_timeout=60)
+
+
+@pytest.fixture
+def patch_cache(monkeypatch, object_cache):
+    monkeypatch.setattr('apps.configs.models.cache', object_cache)
+    return object_cache
+
+
+class TestRedisCache:
+    def test_get_or_set_counts_hits(self, object_cache):
+        # Act
+        first = object_cache.get_or_set('key', lambda: [1, 2], namespaces=('products',))
+        second = object_cache.get_or_set('key', lambda: [3], namespaces=('products',))
+        object_cache.clear_local()
+        third = object_cache.get_or_set('key', lambda: [3], namespaces=('products',))
+
+        # Assert
+        assert first == second == third == [1, 2]
+        assert object_cache.stats == {'local_hits': 1, 'hits': 1, 'misses': 1}
+
+    def test_invalidate_namespace(self, object_cache):
+        # Arrange
+        object_cache.set('a', [1], namespaces=('products',))
+        object_cache.set('b', [2], namespaces=('watchlist1',))
+
+        # Act
+        object_cache.invalidate('products')
+
+        # Assert
+        assert object_cache.get('a', namespaces=('products',)) is None
+        assert object_cache.get('b', namespaces=('watchlist1',)) == [2]
+
+    def test_disabled(self):
+        # Arrange
+        object_cache = RedisCache(cache=LocMemCache('object-cache-test-disabled', {}), enabled=False)
+
+        # Act
+        object_cache.set('key', [1])
+
+        # Assert
+        assert object_cache.get('key') is None
+
+
+@pytest.mark.django_db
+class TestAbstractProductCache:
+    def test_children_invalidated_on_save(self, patch_cache, product_of_rice):
+        # Arrange
+        child = product_of_rice.children().first()
+        expected = list(product_of_rice.children())
+
+        # Act
+        cached = list(product_of_rice.children())
+
+        # Assert
+        assert cached == expected
+        assert patch_cache.stats['local_hits'] >= 1
+
+        # Act: 測試中的交易不會 commit，直接執行 on_commit 的函數
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()):
+            child.parent = None
+            child.save()
+
+        # Assert
+        assert child not in product_of_rice.children()
+        assert isinstance(patch_cache.get(product_of_rice.get_cache_key(), namespaces=('products',)), list)
+
+    def test_invalidated_after_commit(self, patch_cache, product_of_rice):
+        # Arrange
+        list(product_of_rice.children())
+
+        with patch('django.db.transaction.on_commit') as mock_on_commit:
+            # Act
+            product_of_rice.save()
+
+            # Assert: commit 前快取仍在，commit 後才失效
+            assert patch_cache.get(product_of_rice.get_cache_key(), namespaces=('products',)) is not None
+
+            for call in mock_on_commit.call_args_list:
+                call[0][0]()
+
+        assert patch_cache.get(product_of_rice.get_cache_key(), namespaces=('products',)) is None
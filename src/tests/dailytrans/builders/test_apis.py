@@ -5,7 +5,6 @@ from urllib.parse import urlparse, parse_qs
 
 import pandas as pd
 import pytest
-from pandas import Series
 from requests import Response, Request
 
 from apps.configs.models import Config, Source, AbstractProduct, Type
@@ -297,58 +296,30 @@ class TestOriginApis:
         assert result.id.any() == True
         assert result.avg_price_y.any() == True
 
-    def test_update_data(
-            self,
-            mock_crops_origin_api: OriginApi,
-            mock_fruits_origin_api: OriginApi,
-            load_daily_trans_origin_crops_fixtures,
-            mock_daily_trans_data_frame
-    ):
-        # Arrange
-        series: Series = mock_daily_trans_data_frame.iloc[0]
-        series.avg_price_x = 999.5
-        daily_trans = DailyTran.objects.get(id=series.id)
-
-        # Act
-        mock_fruits_origin_api._update_data(series, daily_trans)
-
-        # Assert
-        assert daily_trans.update_time is not None
-        assert daily_trans.avg_price == series.avg_price_x
-
-    def test_save_new_data(
+    def test_convert_to_daily_trans(
             self,
             mock_crops_origin_api: OriginApi,
             mock_fruits_origin_api: OriginApi,
             mock_daily_trans_data_frame
     ):
         # Arrange
-        series: Series = mock_daily_trans_data_frame.iloc[0]
+        df = mock_daily_trans_data_frame
 
         # Act
-        mock_fruits_origin_api._save_new_data(series)
-        daily_trans = DailyTran.objects.filter(date=series.date)
-        daily_trans_obj: DailyTran = daily_trans[0]
+        result = mock_fruits_origin_api._convert_to_daily_trans(df)
 
         # Assert
-        assert len(daily_trans) > 0
-        assert daily_trans_obj.avg_price == series.avg_price_x
-        assert daily_trans_obj.product.code == series.product__code
-        assert daily_trans_obj.source.name == series.source__name
-        assert daily_trans_obj.date == series.date
-
-    @patch('apps.dailytrans.builders.apis.Api._update_data')
-    @patch('apps.dailytrans.builders.apis.Api._save_new_data')
-    @patch(
-        'apps.dailytrans.builders.apis.DailyTran',
-        new_callable=MagicMock,
-        spec=DailyTran
-    )
+        assert len(result) > 0
+        assert all(obj.pk is None for obj in result)
+        assert result[0].avg_price == df.iloc[0].avg_price_x
+        assert result[0].product.code == df.iloc[0].product__code
+        assert result[0].source.name == df.iloc[0].source__name
+        assert result[0].date == df.iloc[0].date
+
+    @patch('apps.dailytrans.builders.apis.DailyTranUpserter')
     def test_access_data_from_api_with_no_data_change(
             self,
-            mock_daily_trans,
-            mock_save_new_data,
-            mock_update_data,
+            mock_upserter,
             mock_crops_origin_api: OriginApi,
             mock_fruits_origin_api: OriginApi,
             mock_daily_trans_data_frame
@@ -365,22 +336,12 @@ class TestOriginApis:
 
         # Assert
         api._compare_data_from_api_and_db.assert_called_once_with(df)
-        mock_daily_trans.objects.get.assert_not_called()
-        mock_save_new_data.assert_not_called()
-        mock_update_data.assert_not_called()
-
-    @patch('apps.dailytrans.builders.apis.Api._update_data')
-    @patch('apps.dailytrans.builders.apis.Api._save_new_data')
-    @patch(
-        'apps.dailytrans.builders.apis.DailyTran',
-        new_callable=MagicMock,
-        spec=DailyTran
-    )
+        mock_upserter.assert_not_called()
+
+    @patch('apps.dailytrans.builders.apis.DailyTranUpserter')
     def test_access_data_from_api_with_data_changed(
             self,
-            mock_daily_trans,
-            mock_save_new_data,
-            mock_update_data,
+            mock_upserter,
             mock_crops_origin_api: OriginApi,
             mock_fruits_origin_api: OriginApi,
             load_daily_trans_origin_crops_fixtures,
@@ -392,87 +353,69 @@ class TestOriginApis:
         api = OriginApi(model=Fruit, **data._asdict())
         api._compare_data_from_api_and_db = MagicMock()
         api._compare_data_from_api_and_db.return_value = df
-        daily_trans = DailyTran.objects.get(id=df.iloc[0].id)
-        mock_daily_trans.objects.get.return_value = daily_trans
 
         # Act
         api._access_data_from_api(df)
+        trans = mock_upserter.return_value.upsert.call_args[0][0]
+        deleted_ids = mock_upserter.return_value.delete.call_args[0][0]
 
         # Assert
         api._compare_data_from_api_and_db.assert_called_once_with(df)
-        mock_daily_trans.objects.get.assert_called_once_with(id=df.iloc[0].id)
-        mock_update_data.assert_called_once()
-        mock_save_new_data.assert_not_called()
-
-    @patch('apps.dailytrans.builders.apis.Api._update_data')
-    @patch('apps.dailytrans.builders.apis.Api._save_new_data')
-    @patch(
-        'apps.dailytrans.builders.apis.DailyTran',
-        new_callable=MagicMock,
-        spec=DailyTran
-    )
-    def test_access_data_from_api_with_new_data(
+        mock_upserter.return_value.upsert.assert_called_once()
+        assert len(trans) > 0
+        assert trans[0].avg_price == 999.5
+        assert deleted_ids.empty
+
+    @patch('apps.dailytrans.builders.apis.Api._convert_to_daily_trans')
+    @patch('apps.dailytrans.builders.apis.DailyTranUpserter')
+    def test_access_data_from_api_with_data_to_delete(
             self,
-            mock_daily_trans,
-            mock_save_new_data,
-            mock_update_data,
+            mock_upserter,
+            mock_convert_to_daily_trans,
             mock_crops_origin_api: OriginApi,
             mock_fruits_origin_api: OriginApi,
+            load_daily_trans_origin_crops_fixtures,
             mock_daily_trans_data_frame
     ):
         # Arrange
-        df = mock_daily_trans_data_frame.assign(avg_price_x=999.5)
+        df = mock_daily_trans_data_frame.assign(avg_price_x='')
         data = DirectData('COG06', 2, 'LOT-fruits')
         api = OriginApi(model=Fruit, **data._asdict())
         api._compare_data_from_api_and_db = MagicMock()
         api._compare_data_from_api_and_db.return_value = df
-        mock_daily_trans.objects.get.side_effect = DailyTran.DoesNotExist
+        mock_convert_to_daily_trans.return_value = []
 
         # Act
         api._access_data_from_api(df)
+        deleted_ids = mock_upserter.return_value.delete.call_args[0][0]
 
         # Assert
         api._compare_data_from_api_and_db.assert_called_once_with(df)
-        mock_daily_trans.objects.get.assert_called_once()
-        mock_update_data.assert_not_called()
-        mock_save_new_data.assert_called_once()
-
-    @patch('apps.dailytrans.builders.apis.Api._update_data')
-    @patch('apps.dailytrans.builders.apis.Api._save_new_data')
-    @patch(
-        'apps.dailytrans.builders.apis.DailyTran',
-        new_callable=MagicMock,
-        spec=DailyTran
-    )
-    def test_access_data_from_api_with_data_to_delete(
+        assert deleted_ids.tolist() == [df.iloc[0].id]
+        mock_upserter.return_value.upsert.assert_called_once_with([])
+
+    def test_access_data_from_api_with_manual_data(
             self,
-            mock_daily_trans,
-            mock_save_new_data,
-            mock_update_data,
             mock_crops_origin_api: OriginApi,
             mock_fruits_origin_api: OriginApi,
             load_daily_trans_origin_crops_fixtures,
             mock_daily_trans_data_frame
     ):
         # Arrange
-        df = mock_daily_trans_data_frame.assign(avg_price_x='')
+        df = mock_daily_trans_data_frame.assign(avg_price_x=999.5)
+        daily_trans = DailyTran.objects.get(id=df.iloc[0].id)
+        DailyTran.objects.filter(id=daily_trans.id).update(not_updated=-999)
         data = DirectData('COG06', 2, 'LOT-fruits')
         api = OriginApi(model=Fruit, **data._asdict())
         api._compare_data_from_api_and_db = MagicMock()
         api._compare_data_from_api_and_db.return_value = df
-        daily_trans = DailyTran.objects.get(id=df.iloc[0].id)
-        daily_trans.delete = MagicMock()
-        mock_daily_trans.objects.get.return_value = daily_trans
 
         # Act
         api._access_data_from_api(df)
+        daily_trans.refresh_from_db()
 
         # Assert
-        api._compare_data_from_api_and_db.assert_called_once_with(df)
-        mock_daily_trans.objects.get.assert_called_once_with(id=df.iloc[0].id)
-        mock_update_data.assert_not_called()
-        daily_trans.delete.assert_called_once()
-        mock_save_new_data.assert_not_called()
+        assert daily_trans.avg_price == df.iloc[0].avg_price_y
 
     @patch('requests.Response')
     def test_access_data_from_api_with_real_data(
@@ -1,5 +1,7 @@
 import pandas as pd
 import pytest
+from unittest.mock import patch, MagicMock
+from requests import Response
 
 from datetime import date
 from apps.configs.models import Config, Source, AbstractProduct
@@ -64,3 +66,51 @@ class TestCropsEir030:
         # Assert
         assert df_result.query('id.notnull()').shape[0] == 0
         assert df_result.query('date.notnull()').shape[0] == len(crops_wholesale05_api)
+
+    def test_split_window(self, mock_wholesale_api05: WholeSaleApi05):
+        # Act
+        windows = mock_wholesale_api05.split_window(date(2024, 1, 1), date(2024, 2, 5), 31)
+
+        # Assert
+        assert windows == [(date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 2, 1), date(2024, 2, 5))]
+        assert mock_wholesale_api05.split_window(date(2024, 1, 1), date(2024, 1, 1), 31) == [
+            (date(2024, 1, 1), date(2024, 1, 1))
+        ]
+
+    @patch('apps.dailytrans.builders.eir030.Api.request')
+    def test_request_range_with_window_exceeded(self, mock_request: MagicMock, mock_wholesale_api05: WholeSaleApi05):
+        # Arrange: 多天的區間請求失敗，單日請求成功
+        def request(start_date, end_date, **kwargs):
+            response = Response()
+            response.status_code = 200 if start_date == end_date else 503
+            return response
+
+        mock_request.side_effect = request
+
+        # Act
+        responses = list(mock_wholesale_api05.request_range(date(2024, 1, 1), date(2024, 1, 4), tc_type='N04'))
+
+        # Assert
+        assert len(responses) == 4
+        assert all(response.status_code == 200 for response in responses)
+        assert {call[1]['tc_type'] for call in mock_request.call_args_list} == {'N04'}
+
+    @patch('apps.dailytrans.builders.eir030.Api.request')
+    def test_request_range_with_truncated_window(self, mock_request: MagicMock, mock_wholesale_api05: WholeSaleApi05):
+        # Arrange: 回傳筆數達到 MAX_ROWS 視為資料被截斷
+        def request(start_date, end_date, **kwargs):
+            response = Response()
+            response.status_code = 200
+            days = (end_date - start_date).days + 1
+            response._content = ('[' + ','.join(['{}'] * days) + ']').encode('utf-8')
+            return response
+
+        mock_request.side_effect = request
+        mock_wholesale_api05.MAX_ROWS = 4
+
+        # Act
+        responses = list(mock_wholesale_api05.request_range(date(2024, 1, 1), date(2024, 1, 4)))
+
+        # Assert: 4 天的區間切半為兩個 2 天的區間
+        assert len(responses) == 2
+        assert all(mock_wholesale_api05.count_rows(response) == 2 for response in responses)
@@ -7,6 +7,7 @@ import pytest
 from bs4 import BeautifulSoup
 from bs4.element import ResultSet
 from requests import Response, Request
+from requests.exceptions import ConnectionError
 
 from apps.dailytrans.builders.eir032 import HTMLParser, ScrapperApi
 from apps.dailytrans.builders.utils import DirectData
@@ -364,11 +365,12 @@ class TestScrapperApi:
         # Assert
         assert [d['mid'] for d in params] == list(api.SOURCES.keys())
 
-    @patch('apps.dailytrans.builders.eir032.post', new_callable=MagicMock)
-    @patch('apps.dailytrans.builders.eir032.time.sleep', new_callable=MagicMock)
+    @patch('apps.dailytrans.builders.fetcher.requests.Session.request', new_callable=MagicMock)
+    @patch('apps.dailytrans.builders.fetcher.time.sleep', new_callable=MagicMock)
     def test_make_request(self, mock_sleep: MagicMock, mock_post: MagicMock, mock_instances, mock_html_page: str):
         # Arrange
         mock_response, api = mock_instances
+        mock_response.headers = {}
         mock_post.return_value = mock_response
         urls = api.urls_list
         params = api.params_list
@@ -383,18 +385,18 @@ class TestScrapperApi:
         # Assert
         assert resp == mock_response
 
-        # Case 2: bad path with status code 404
-        mock_response.status_code = 404
+        # Case 2: bad path with status code 503
+        mock_response.status_code = 503
 
         # Act
         resp = api._make_request(urls[0], params[0], headers[0])
 
         # Assert
-        assert resp is not None and resp != mock_response
-        assert resp.status_code is None
-        mock_post.assert_called_with(urls[0], params=params[0], headers=headers[0])
-        mock_sleep.assert_called_with(api.SLEEP_TIME)
-        assert Log.objects.filter(level=30).count() == 3
+        assert resp.status_code == 503
+        mock_post.assert_called_with('POST', urls[0], params=params[0], headers=headers[0],
+                                     timeout=api.FETCHER.TIMEOUT)
+        assert mock_sleep.call_count == api.MAX_RETRY
+        assert Log.objects.filter(level=40).count() == api.MAX_RETRY
 
         # Case 3: bad path with ConnectionError
         mock_post.side_effect = ConnectionError
@@ -405,7 +407,8 @@ class TestScrapperApi:
         # Assert
         assert resp is not None and resp != mock_response
         assert resp.status_code is None
-        assert Log.objects.filter(level=40).count() == 3
+        assert Log.objects.filter(level=30).count() == api.MAX_RETRY + 1
+        assert Log.objects.filter(level=40).count() == api.MAX_RETRY * 2
 
     def test_convert_to_dataframe(self, mock_instances, mock_html_page: str, mock_code):
         # Arrange
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+import pytest
+from requests import Response
+from requests.exceptions import ConnectionError
+
+from apps.dailytrans.builders.fetcher import Fetcher
+
+
+def make_response(status_code, headers=None):
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.request = MagicMock(url='https://data.moa.gov.tw/')
+
+    return response
+
+
+@pytest.fixture
+def fetcher():
+    return Fetcher(MAX_RETRY=3, BACKOFF_BASE=1, BACKOFF_MAX=10)
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('test')
+
+
+class TestFetcher:
+    def test_init_with_unknown_option(self):
+        with pytest.raises(NotImplementedError):
+            Fetcher(UNKNOWN=1)
+
+    def test_backoff(self, fetcher):
+        # Case 1: jittered exponential backoff
+        for retry_count in range(1, 6):
+            assert 0 <= fetcher.backoff(retry_count) <= min(fetcher.BACKOFF_MAX, 2 ** (retry_count - 1))
+
+        # Case 2: honour Retry-After header
+        assert fetcher.backoff(1, make_response(429, {'Retry-After': '7'})) == 7
+
+        # Case 3: Retry-After is capped by BACKOFF_MAX
+        assert fetcher.backoff(1, make_response(429, {'Retry-After': '120'})) == fetcher.BACKOFF_MAX
+
+        # Case 4: Retry-After in HTTP-date format which has passed
+        assert fetcher.backoff(1, make_response(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+
+    @patch('apps.dailytrans.builders.fetcher.time.sleep', new_callable=MagicMock)
+    def test_request(self, mock_sleep: MagicMock, fetcher, logger):
+        # Case 1: retry until success
+        fetcher.session.request = MagicMock(side_effect=[
+            ConnectionError, make_response(503), make_response(200)
+        ])
+
+        # Act
+        resp = fetcher.get('https://data.moa.gov.tw/', logger=logger)
+
+        # Assert
+        assert resp.status_code == 200
+        assert fetcher.session.request.call_count == 3
+        assert mock_sleep.call_count == 2
+
+        # Case 2: status code which should not be retried
+        fetcher.session.request = MagicMock(return_value=make_response(404))
+
+        # Act
+        resp = fetcher.get('https://data.moa.gov.tw/', logger=logger)
+
+        # Assert
+        assert resp.status_code == 404
+        assert fetcher.session.request.call_count == 1
+
+        # Case 3: retry count exhausted
+        fetcher.session.request = MagicMock(side_effect=ConnectionError)
+
+        # Act
+        resp = fetcher.get('https://data.moa.gov.tw/', logger=logger)
+
+        # Assert
+        assert resp.status_code is None
+        assert fetcher.session.request.call_count == fetcher.MAX_RETRY + 1
+
+    def test_map_with_host_concurrency(self, logger):
+        # Arrange
+        fetcher = Fetcher(MAX_WORKERS=8, HOST_CONCURRENCY={'data.moa.gov.tw': 2})
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def request(method, url, **kwargs):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(url)
+
+            return make_response(200)
+
+        fetcher.session.request = request
+
+        # Act
+        results = list(fetcher.map(lambda i: fetcher.get('https://data.moa.gov.tw/', logger=logger), range(10)))
+
+        # Assert
+        assert sorted(item for item, _ in results) == list(range(10))
+        assert all(resp.status_code == 200 for _, resp in results)
+        assert max(peak) <= 2
+
+    def test_map_with_exception(self, fetcher):
+        # Arrange
+        def func(i):
+            if i == 1:
+                raise ValueError
+            return i
+
+        # Act
+        results = dict(fetcher.map(func, range(3)))
+
+        # Assert
+        assert results[0] == 0
+        assert isinstance(results[1], ValueError)
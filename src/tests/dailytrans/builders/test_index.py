@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+
+from apps.dailytrans.builders.index import LookupIndex
+
+
+@pytest.fixture
+def lookup_index():
+    products = [
+        SimpleNamespace(id=1, code='LA1', type_id=1),
+        SimpleNamespace(id=2, code='LA1', type_id=1),
+        SimpleNamespace(id=3, code='FB1', type_id=1),
+    ]
+    sources = [
+        SimpleNamespace(id=1, code='104', name='臺北一', alias=None, type_id=1),
+        SimpleNamespace(id=2, code='109', name='臺北二', alias=None, type_id=1),
+        SimpleNamespace(id=3, code='400', name='臺中市', alias='台中,臺中', type_id=1),
+        SimpleNamespace(id=4, code='F400', name='臺中', alias=None, type_id=2),
+    ]
+
+    return LookupIndex(products=products, sources=sources)
+
+
+class TestLookupIndex:
+    def test_products(self, lookup_index):
+        assert lookup_index.codes == {'LA1', 'FB1'}
+        assert [p.id for p in lookup_index.get_products('LA1')] == [1, 2]
+        assert lookup_index.get_product('LA1').id == 1
+        assert lookup_index.get_product('not-exist') is None
+        assert lookup_index.get_products('not-exist') == ()
+
+    def test_sources(self, lookup_index):
+        assert lookup_index.get_source_by_code('109').id == 2
+        assert lookup_index.get_source_by_code('not-exist') is None
+        assert lookup_index.get_source_by_name('臺北一').id == 1
+        assert lookup_index.get_source_by_name('台北一') is None
+
+    def test_match_source(self, lookup_index):
+        # match by name, '台' will be replaced by '臺'
+        assert lookup_index.match_source('台北二').id == 2
+
+        # match by name first, then alias
+        assert lookup_index.match_source('臺中').id == 4
+        assert lookup_index.match_source('臺中', type_id=1).id == 3
+        assert lookup_index.match_source('not-exist') is None
+
+        with pytest.raises(TypeError):
+            lookup_index.match_source(None)
@@ -0,0 +1,109 @@
+import datetime as dt
+from unittest.mock import MagicMock
+
+import pytest
+
+from apps.dailytrans.builders.metrics import BuilderMetrics, builder_run, current_metrics
+from apps.dailytrans.builders.upsert import UpsertResult
+from apps.dailytrans.builders.utils import director
+from apps.dailytrans.models import BuilderRun
+
+
+class TestBuilderMetrics:
+    def test_record(self):
+        # Arrange
+        metrics = BuilderMetrics()
+        response = MagicMock(content=b'x' * 10)
+
+        # Act
+        for elapsed in (0.1, 0.2, 0.3, 0.4):
+            metrics.record_response(response, elapsed)
+        metrics.record_unmatched('Product', 'LA1')
+        metrics.record_unmatched('Product', 'LA1')
+        metrics.record_unmatched('Source', '台北二')
+        metrics.record_upsert(UpsertResult(inserted=3, unchanged=2), 0.5)
+
+        # Assert
+        assert metrics.counters['requests'] == 4
+        assert metrics.counters['bytes'] == 40
+        assert metrics.counters['unmatched'] == 3
+        assert metrics.counters['inserted'] == 3
+        assert metrics.percentile(50) == 0.2
+        assert metrics.percentile(95) == 0.4
+        assert metrics.stages['upsert'] == 0.5
+        assert metrics.unmatched_codes == {'Product: LA1': 2, 'Source: 台北二': 1}
+
+    def test_builder_run(self):
+        # Act
+        with builder_run() as outer:
+            outer.add(fetched=1)
+
+            with builder_run() as inner:
+                assert current_metrics() is inner
+                inner.add(fetched=2)
+                inner.record_unmatched('Product', 'LA1')
+
+            assert current_metrics() is outer
+
+        # Assert: 巢狀執行時內層數據會併入外層
+        assert current_metrics() is None
+        assert outer.counters['fetched'] == 3
+        assert outer.unmatched_codes == {'Product: LA1': 1}
+
+
+@pytest.mark.django_db
+class TestDirectorMetrics:
+    def test_director_save_builder_run(self):
+        # Arrange
+        @director
+        def direct_test(start_date, end_date, *args, **kwargs):
+            metrics = current_metrics()
+            metrics.type_code = 'LOT-crops'
+            metrics.add(fetched=10, matched=8)
+            metrics.record_unmatched('Product', 'LA1')
+            metrics.record_upsert(UpsertResult(inserted=5, updated=3))
+
+        # Act
+        result = direct_test(start_date=dt.date(2024, 1, 1), end_date=dt.date(2024, 1, 7))
+
+        # Assert
+        run = BuilderRun.objects.get()
+        assert result.success
+        assert run.job.endswith('direct_test')
+        assert run.type_code == 'LOT-crops'
+        assert (run.fetched, run.matched, run.unmatched, run.inserted, run.updated) == (10, 8, 1, 5, 3)
+        assert run.unmatched_codes == {'Product: LA1': 1}
+
+    def test_nested_director_save_outermost_builder_run(self):
+        # Arrange
+        @director
+        def direct_inner(start_date, end_date, *args, **kwargs):
+            current_metrics().record_upsert(UpsertResult(inserted=5, updated=3))
+
+        @director
+        def direct_outer(start_date, end_date, *args, **kwargs):
+            current_metrics().add(fetched=10)
+            direct_inner(start_date=start_date, end_date=end_date)
+
+        # Act
+        direct_outer(start_date=dt.date(2024, 1, 1), end_date=dt.date(2024, 1, 7))
+
+        # Assert: 內層數據併入外層，只寫入一筆
+        run = BuilderRun.objects.get()
+        assert run.job.endswith('direct_outer')
+        assert (run.fetched, run.inserted, run.updated) == (10, 5, 3)
+
+    def test_director_save_failed_builder_run(self):
+        # Arrange
+        @director
+        def direct_test(start_date, end_date, *args, **kwargs):
+            raise ValueError('timeout')
+
+        # Act
+        result = direct_test(start_date=dt.date(2024, 1, 1), end_date=dt.date(2024, 1, 7))
+
+        # Assert
+        run = BuilderRun.objects.get()
+        assert not result.success
+        assert not run.success
+        assert run.msg == 'timeout'
@@ -0,0 +1,135 @@
+import datetime as dt
+import json
+
+import pytest
+from django.core.management import call_command
+
+from apps.dailytrans.builders.staging import DailyTranCopyImporter
+from apps.dailytrans.builders.upsert import UpsertResult
+from apps.dailytrans.models import DailyTran
+
+
+@pytest.mark.django_db
+class TestDailyTranCopyImporter:
+    def test_upsert_with_new_data(self, product_of_pig, sources_for_pig):
+        # Arrange
+        importer = DailyTranCopyImporter(fields=('avg_price', 'volume'))
+        trans = [
+            DailyTran(product=product_of_pig, source=source, avg_price=50.0, volume=10.0, date=dt.date(2024, 1, 1))
+            for source in sources_for_pig
+        ]
+
+        # Act
+        result = importer.upsert(trans)
+
+        # Assert
+        assert result == UpsertResult(inserted=2)
+        assert DailyTran.objects.filter(product=product_of_pig, date=dt.date(2024, 1, 1)).count() == 2
+
+    def test_upsert_with_insert_condition(self, product_of_pig, sources_for_pig):
+        # Arrange
+        importer = DailyTranCopyImporter(fields=('avg_price',))
+        trans = [DailyTran(product=product_of_pig, source=sources_for_pig[0], avg_price=0, date=dt.date(2024, 1, 1))]
+
+        # Act
+        result = importer.upsert(trans, insert_condition=lambda obj: obj.avg_price > 0)
+
+        # Assert
+        assert result == UpsertResult(skipped=1)
+        assert DailyTran.objects.count() == 0
+
+    def test_upsert_with_existed_data(self, daily_tran):
+        # Arrange
+        importer = DailyTranCopyImporter(fields=('avg_price',))
+        tran = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5, date=daily_tran.date)
+
+        # Act
+        result_changed = importer.upsert([tran])
+        result_unchanged = importer.upsert([tran])
+        daily_tran.refresh_from_db()
+
+        # Assert
+        assert result_changed == UpsertResult(updated=1)
+        assert result_unchanged == UpsertResult(unchanged=1)
+        assert daily_tran.avg_price == 999.5
+        assert DailyTran.objects.count() == 1
+
+    def test_upsert_with_manual_data(self, daily_tran):
+        # Arrange
+        DailyTran.objects.filter(id=daily_tran.id).update(not_updated=-999)
+        importer = DailyTranCopyImporter(fields=('avg_price',))
+        tran = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5, date=daily_tran.date)
+
+        # Act
+        result = importer.upsert([tran])
+        daily_tran.refresh_from_db()
+
+        # Assert
+        assert result == UpsertResult(skipped=1)
+        assert daily_tran.avg_price != 999.5
+
+    def test_import_rows_with_duplicate_keys(self, product_of_pig, sources_for_pig):
+        # Arrange: 同一批資料中 key 重複時以最後一筆為主
+        importer = DailyTranCopyImporter()
+        rows = [
+            {'product_id': product_of_pig.id, 'source_id': sources_for_pig[0].id, 'date': '2024-01-01',
+             'avg_price': price}
+            for price in (10.0, 20.0)
+        ]
+
+        # Act
+        result = importer.import_rows(rows)
+
+        # Assert
+        assert result == UpsertResult(inserted=1)
+        assert DailyTran.objects.get().avg_price == 20.0
+
+    def test_import_rows_with_insertable(self, product_of_pig, sources_for_pig):
+        # Arrange: 未傳入 insertable 或為空值時預設為 True
+        importer = DailyTranCopyImporter()
+        rows = [
+            {'product_id': product_of_pig.id, 'source_id': source.id, 'date': '2024-01-01', 'avg_price': 10.0,
+             'insertable': insertable}
+            for source, insertable in zip(sources_for_pig, ('', False))
+        ]
+
+        # Act
+        result = importer.import_rows(rows)
+
+        # Assert
+        assert result == UpsertResult(inserted=1, skipped=1)
+        assert DailyTran.objects.get().source == sources_for_pig[0]
+
+
+@pytest.mark.django_db
+class TestImportDailyTransCommand:
+    def test_import_json(self, tmpdir, product_of_pig, sources_for_pig):
+        # Arrange
+        path = tmpdir.join('dailytrans.json')
+        path.write(json.dumps([
+            {'product_id': product_of_pig.id, 'source_id': source.id, 'date': '2024-01-01', 'avg_price': 50.0,
+             'volume': 10.0}
+            for source in sources_for_pig
+        ]))
+
+        # Act
+        call_command('import_dailytrans', str(path))
+
+        # Assert
+        assert DailyTran.objects.filter(product=product_of_pig, date=dt.date(2024, 1, 1)).count() == 2
+
+    def test_import_csv(self, tmpdir, daily_tran):
+        # Arrange
+        path = tmpdir.join('dailytrans.csv')
+        path.write(
+            'product_id,source_id,date,avg_price,volume\n'
+            f'{daily_tran.product_id},{daily_tran.source_id},{daily_tran.date:%Y-%m-%d},999.5,\n'
+        )
+
+        # Act
+        call_command('import_dailytrans', str(path), '--fields', 'avg_price')
+        daily_tran.refresh_from_db()
+
+        # Assert
+        assert daily_tran.avg_price == 999.5
+        assert DailyTran.objects.count() == 1
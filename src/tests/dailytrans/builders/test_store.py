@@ -0,0 +1,127 @@
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+from requests import Response
+
+from apps.dailytrans.builders.store import ResponseStore, skip_applied
+
+
+URL = 'https://data.moa.gov.tw/Service/OpenData/FromM/FarmTransData.aspx?StartDate=113.11.25&TcType=N04'
+
+
+def make_response(content, status_code=200):
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.encoding = 'utf-8'
+
+    return response
+
+
+@pytest.fixture
+def store(tmpdir):
+    return ResponseStore(str(tmpdir))
+
+
+class Builder(object):
+    API_NAME = 'eir030'
+
+    def __init__(self, store):
+        self.STORE = store
+        self.LOGGER = logging.getLogger('test')
+        self.calls = 0
+        self.fail = False
+
+    @skip_applied
+    def load(self, response):
+        self.calls += 1
+
+        if self.fail:
+            self.LOGGER.error('load failed')
+
+
+class TestResponseStore:
+    def test_normalize(self, store):
+        # query string 順序不同或以 params 傳入時，key 應相同
+        key = store.key('GET', URL)
+
+        assert key == store.key('get', URL.replace('StartDate=113.11.25&TcType=N04', 'TcType=N04&StartDate=113.11.25'))
+        assert key == store.key('GET', URL.split('?')[0] + '?TcType=N04', params={'StartDate': '113.11.25'})
+        assert key != store.key('POST', URL)
+
+    def test_save_and_load(self, store):
+        # Arrange
+        response = make_response('[{"作物代號": "LA1"}]'.encode('utf8'))
+
+        # Act
+        store.save('eir030', 'GET', URL, None, response)
+        replay = store.load('eir030', 'GET', URL)
+
+        # Assert
+        assert replay.status_code == 200
+        assert replay.json() == [{'作物代號': 'LA1'}]
+        assert replay.store_digest == response.store_digest
+        assert replay.request.url.startswith('https://data.moa.gov.tw/')
+
+    def test_save_with_failed_response(self, store):
+        # Act
+        response = store.save('eir030', 'GET', URL, None, make_response(b'', status_code=503))
+
+        # Assert
+        assert getattr(response, 'store_key', None) is None
+        assert store.load('eir030', 'GET', URL).status_code is None
+
+
+class TestSkipApplied:
+    def test_skip_applied(self, store):
+        # Arrange
+        builder = Builder(store)
+
+        # Act
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[1]')))
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[1]')))
+
+        # Assert: 內容相同時第二次不會再執行
+        assert builder.calls == 1
+
+        # Act
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[2]')))
+
+        # Assert: 內容不同時會再執行
+        assert builder.calls == 2
+
+    def test_skip_applied_with_error(self, store):
+        # Arrange
+        builder = Builder(store)
+        builder.fail = True
+
+        # Act
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[1]')))
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[1]')))
+
+        # Assert: load 有錯誤時不會標記為已寫入
+        assert builder.calls == 2
+
+    def test_skip_applied_with_replay(self, store):
+        # Arrange
+        builder = Builder(store)
+        builder.load(store.save('eir030', 'GET', URL, None, make_response(b'[1]')))
+        store.replay = True
+
+        # Act
+        builder.load(store.load('eir030', 'GET', URL))
+
+        # Assert: replay 模式一律重新執行 load
+        assert builder.calls == 2
+
+    def test_skip_applied_without_store(self):
+        # Arrange
+        builder = Builder(None)
+
+        # Act
+        builder.load(MagicMock())
+        builder.load(MagicMock())
+
+        # Assert
+        assert builder.calls == 2
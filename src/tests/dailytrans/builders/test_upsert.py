@@ -0,0 +1,106 @@
+import datetime as dt
+from unittest.mock import patch
+
+import pytest
+
+from apps.dailytrans.builders.upsert import DailyTranUpserter, UpsertResult
+from apps.dailytrans.models import DailyTran
+from tests.dailytrans.factories import DailyTranFactory
+
+
+@pytest.mark.django_db
+class TestDailyTranUpserter:
+    def test_upsert_with_new_data(self, product_of_pig, sources_for_pig):
+        # Arrange
+        upserter = DailyTranUpserter(fields=('avg_price', 'volume'))
+        trans = [
+            DailyTran(product=product_of_pig, source=source, avg_price=50.0, volume=10.0, date=dt.date(2024, 1, 1))
+            for source in sources_for_pig
+        ]
+
+        # Act
+        result = upserter.upsert(trans)
+
+        # Assert
+        assert result == UpsertResult(inserted=2)
+        assert DailyTran.objects.filter(product=product_of_pig, date=dt.date(2024, 1, 1)).count() == 2
+
+    def test_upsert_with_insert_condition(self, product_of_pig, sources_for_pig):
+        # Arrange
+        upserter = DailyTranUpserter(fields=('avg_price',))
+        trans = [DailyTran(product=product_of_pig, source=sources_for_pig[0], avg_price=0, date=dt.date(2024, 1, 1))]
+
+        # Act
+        result = upserter.upsert(trans, insert_condition=lambda obj: obj.avg_price > 0)
+
+        # Assert
+        assert result == UpsertResult(skipped=1)
+        assert DailyTran.objects.count() == 0
+
+    def test_upsert_with_existed_data(self, daily_tran):
+        # Arrange
+        upserter = DailyTranUpserter(fields=('avg_price',))
+        changed = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5,
+                            date=daily_tran.date)
+        unchanged = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5,
+                              date=daily_tran.date)
+
+        # Act
+        result_changed = upserter.upsert([changed])
+        daily_tran.refresh_from_db()
+        result_unchanged = upserter.upsert([unchanged])
+
+        # Assert
+        assert result_changed == UpsertResult(updated=1)
+        assert result_unchanged == UpsertResult(unchanged=1)
+        assert daily_tran.avg_price == 999.5
+        assert DailyTran.objects.count() == 1
+
+    def test_upsert_with_manual_data(self, daily_tran):
+        # Arrange
+        DailyTran.objects.filter(id=daily_tran.id).update(not_updated=-999)
+        upserter = DailyTranUpserter(fields=('avg_price',))
+        tran = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5, date=daily_tran.date)
+
+        # Act
+        result = upserter.upsert([tran])
+        daily_tran.refresh_from_db()
+
+        # Assert
+        assert result == UpsertResult(skipped=1)
+        assert daily_tran.avg_price != 999.5
+
+    def test_upsert_with_concurrent_insert(self, daily_tran):
+        # Arrange: 模擬 SELECT 之後其他 process 才新增相同 key 的資料
+        upserter = DailyTranUpserter(fields=('avg_price',))
+        tran = DailyTran(product=daily_tran.product, source=daily_tran.source, avg_price=999.5, date=daily_tran.date)
+        fetch_existing = DailyTranUpserter._fetch_existing
+        calls = []
+
+        def fetch_after_insert(self, keys):
+            calls.append(keys)
+            return {} if len(calls) == 1 else fetch_existing(self, keys)
+
+        # Act
+        with patch.object(DailyTranUpserter, '_fetch_existing', autospec=True, side_effect=fetch_after_insert):
+            result = upserter.upsert([tran])
+
+        daily_tran.refresh_from_db()
+
+        # Assert: 改為更新既有資料
+        assert result == UpsertResult(updated=1)
+        assert daily_tran.avg_price == 999.5
+        assert DailyTran.objects.count() == 1
+
+    def test_delete(self, daily_tran):
+        # Arrange
+        manual_tran = DailyTranFactory(product=daily_tran.product, source=daily_tran.source,
+                                       date=daily_tran.date - dt.timedelta(days=1), not_updated=-999)
+        upserter = DailyTranUpserter()
+
+        # Act
+        deleted = upserter.delete([daily_tran.id, manual_tran.id, ''])
+
+        # Assert
+        assert deleted == 1
+        assert list(DailyTran.objects.values_list('id', flat=True)) == [manual_tran.id]
@@ -0,0 +1,57 @@
+import datetime as dt
+
+import pytest
+
+from apps.dailytrans.builders.utils import (
+    DirectResult,
+    aggregate_direct_results,
+    date_windows,
+)
+
+
+class TestDateWindows:
+    def test_date_windows(self):
+        # Act
+        windows = date_windows(dt.date(2024, 1, 1), dt.date(2024, 1, 10), 4)
+
+        # Assert
+        assert windows == [
+            (dt.date(2024, 1, 1), dt.date(2024, 1, 4)),
+            (dt.date(2024, 1, 5), dt.date(2024, 1, 8)),
+            (dt.date(2024, 1, 9), dt.date(2024, 1, 10)),
+        ]
+
+    def test_date_windows_with_invalid_range(self):
+        with pytest.raises(NotImplementedError):
+            date_windows(dt.date(2024, 1, 2), dt.date(2024, 1, 1), 4)
+
+
+class TestAggregateDirectResults:
+    def test_aggregate_direct_results(self):
+        # Arrange
+        results = [
+            DirectResult(dt.date(2024, 1, 1), dt.date(2024, 1, 7), duration=dt.timedelta(seconds=30), success=True),
+            DirectResult(dt.date(2024, 1, 8), dt.date(2024, 1, 10), duration=dt.timedelta(seconds=10), success=True),
+        ]
+
+        # Act
+        result = aggregate_direct_results(results)
+
+        # Assert
+        assert result == DirectResult(dt.date(2024, 1, 1), dt.date(2024, 1, 10), duration=dt.timedelta(seconds=30),
+                                      success=True, msg='')
+
+    def test_aggregate_direct_results_with_failure(self):
+        # Arrange
+        results = [
+            DirectResult(dt.date(2024, 1, 1), dt.date(2024, 1, 7), duration=dt.timedelta(seconds=30), success=True),
+            DirectResult(dt.date(2024, 1, 8), dt.date(2024, 1, 10), success=False, msg='timeout'),
+        ]
+
+        # Act
+        result = aggregate_direct_results(results)
+
+        # Assert
+        assert result.success is False
+        assert result.msg == 'timeout'
+        assert aggregate_direct_results([]).success is False
@@ -0,0 +1,115 @@
+import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from apps.dailytrans.models import DailyTran, ReportArtifact
+from apps.dailytrans.reports.artifacts import DailyReportStore
+from apps.dailytrans.reports.dailyreport import DailyReportFactory, ReportItem
+
+REPORT_DATE = datetime.date(2024, 11, 12)
+
+
+@pytest.fixture
+def store():
+    return DailyReportStore(folder_id='', delay=0, cache=LocMemCache('daily-report-store-test', {}))
+
+
+def fake_report(self, output_dir):
+    file_name = '{}.xlsx'.format(self.specify_day.date())
+    file_path = Path(output_dir, file_name)
+    file_path.write_bytes(b'report')
+    return file_name, file_path
+
+
+@pytest.mark.django_db
+class TestDailyReportStore:
+    def test_affected_dates(self, store):
+        # Act
+        dates = store.affected_dates(datetime.date(2023, 11, 10), datetime.date(2023, 11, 11),
+                                     today=datetime.date(2024, 11, 5))
+
+        # Assert: 之後兩週及隔年同月份，不含未來日期
+        assert datetime.date(2023, 11, 10) in dates
+        assert datetime.date(2023, 11, 24) in dates
+        assert datetime.date(2023, 11, 25) not in dates
+        assert datetime.date(2024, 11, 1) in dates
+        assert datetime.date(2024, 11, 5) in dates
+        assert datetime.date(2024, 11, 6) not in dates
+
+    def test_version_changes_with_trans_in_report_range(self, store, product_of_pig, sources_for_pig):
+        # Arrange
+        version = store.version(REPORT_DATE)
+
+        # Act: 報表區間外的資料
+        DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0], date=datetime.date(2024, 9, 1),
+                                 avg_price=10.0)
+
+        # Assert
+        assert store.version(REPORT_DATE) == version
+
+        # Act
+        tran = DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0], date=REPORT_DATE,
+                                        avg_price=10.0)
+        created = store.version(REPORT_DATE)
+        DailyTran.objects.filter(id=tran.id).update(avg_price=20.0)
+        updated = store.version(REPORT_DATE)
+
+        # Assert
+        assert len({version, created, updated}) == 3
+
+    def test_generate_only_when_data_changed(self, store, product_of_pig, sources_for_pig):
+        # Arrange
+        with patch.object(DailyReportFactory, '__call__', autospec=True, side_effect=fake_report) as mock_call:
+            # Act
+            first = store.generate(REPORT_DATE)
+            second = store.generate(REPORT_DATE)
+
+            # Assert
+            assert mock_call.call_count == 1
+            assert first.id == second.id
+            assert bytes(store.latest(REPORT_DATE).content) == b'report'
+
+            # Act: 資料異動後產生新版本並刪除舊版本
+            DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0], date=REPORT_DATE,
+                                     avg_price=10.0)
+            third = store.generate(REPORT_DATE)
+
+        # Assert
+        assert mock_call.call_count == 2
+        assert third.version != first.version
+        assert list(ReportArtifact.objects.filter(date=REPORT_DATE).values_list('id', flat=True)) == [third.id]
+
+    def test_version_changes_with_as_of_trans(self, store, product_of_pig, sources_for_pig):
+        # Arrange: 羊、牛每日價格沿用區間以前最近一筆
+        item = ReportItem(name='羊', row=1, product_ids=frozenset([product_of_pig.id]), source_ids=None, price=None,
+                          profile=None, as_of_product_ids=frozenset([product_of_pig.id]), as_of_source_ids=None)
+
+        with patch.object(DailyReportFactory, 'get_report_items', return_value=[item]):
+            version = store.version(REPORT_DATE)
+
+            # Act: 報表區間外的資料
+            tran = DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0],
+                                            date=datetime.date(2024, 9, 1), avg_price=10.0)
+            created = store.version(REPORT_DATE)
+            DailyTran.objects.filter(id=tran.id).update(avg_price=20.0)
+            updated = store.version(REPORT_DATE)
+
+        # Assert
+        assert len({version, created, updated}) == 3
+
+    def test_generate_scheduled_retries_when_locked(self, store):
+        # Arrange: 其他 worker 正在產生同一天的報表
+        store.cache.add(store.LOCK_KEY.format(REPORT_DATE), 1)
+
+        with patch.object(DailyReportFactory, '__call__', autospec=True, side_effect=fake_report) as mock_call, \
+                patch.object(store, 'enqueue') as mock_enqueue:
+            # Act
+            artifact = store.generate_scheduled(REPORT_DATE)
+
+        # Assert
+        assert artifact is None
+        assert mock_call.call_count == 0
+        mock_enqueue.assert_called_once_with(REPORT_DATE, countdown=store.RETRY_DELAY)
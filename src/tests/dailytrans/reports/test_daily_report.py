@@ -5,7 +5,13 @@ import pandas as pd
 import pytest
 
 from apps.dailytrans.models import DailyTran
-from apps.dailytrans.reports.dailyreport import SimplifyDailyReportFactory, DailyTranHandler, ExtraItem
+from apps.dailytrans.reports.dailyreport import (
+    DailyReportFactory,
+    SimplifyDailyReportFactory,
+    DailyTranHandler,
+    ExtraItem,
+)
+from apps.watchlists.models import MonitorProfile
 
 
 @pytest.mark.django_db
@@ -666,3 +672,50 @@ class TestDailyTranHandler:
         # Assert
         assert result_volume != 0
         assert result_volume == df_grouped.sum_volume.mean()
+
+
+@pytest.mark.django_db
+class TestDailyReportFactory:
+    @staticmethod
+    def get_factories(date=datetime.strptime('2024-11-12', '%Y-%m-%d')):
+        return DailyReportFactory(date), SimplifyDailyReportFactory(date)
+
+    def test_report_same_as_per_profile_queries(self, load_daily_tran_fixtures_of_eggplant):
+        # Arrange
+        f, expected = self.get_factories()
+        expected.monitor = expected.monitor_profile_qs.filter(product__name__icontains='茄子').first()
+        expected.extend_query_str()
+        expected.set_this_week_data()
+        expected.set_avg_price_values()
+        expected.set_volume_values()
+        expected.set_monitor_price()
+        expected.set_same_month_of_last_year_value()
+
+        # Act
+        f.report()
+
+        # Assert
+        result = f.result[expected.monitor.product.name]
+        for key, value in expected.result[expected.monitor.product.name].items():
+            assert round(result[key], 2) == round(value, 2)
+
+    def test_report_ram_as_of_price(self, load_daily_tran_fixtures_of_ram):
+        # Arrange
+        f, _ = self.get_factories()
+
+        # Act
+        f.report()
+
+        # Assert
+        profile = MonitorProfile.objects.filter(product__name__icontains='羊', product__track_item=True,
+                                                row=117).first()
+        result = f.result[profile.product.name]
+        assert {key: result[key] for key in ('M117', 'N117', 'O117', 'P117', 'Q117', 'R117', 'S117')} == {
+            'M117': 364.0,
+            'N117': 358.0,
+            'O117': '(11/07)',
+            'P117': '(11/07)',
+            'Q117': '(11/07)',
+            'R117': 367.0,
+            'S117': '(11/11)'
+        }
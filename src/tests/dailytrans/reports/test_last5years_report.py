@@ -0,0 +1,65 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.dailytrans.reports.last5yearsreport import Last5YearsReportFactory
+
+LAST_YEAR = date.today().year - 1
+LAST_YEAR_ROW = f'{LAST_YEAR - 1911}年'
+
+
+def make_table(rows):
+    # 同 Last5YearsReportFactory.get_table
+    table = pd.DataFrame(rows, columns=['product_id', 'source_id', 'avg_price', 'avg_weight', 'volume', 'date'])
+    table['date'] = pd.to_datetime(table['date'])
+
+    return table
+
+
+class TestLast5YearsReportFactory:
+    def test_hogs_weighted_average(self):
+        # Arrange: 澎湖市場(40050)不計入
+        table = make_table([
+            (70001, 1, 100.0, 120.0, 1000.0, date(LAST_YEAR, 1, 2)),
+            (70001, 1, 110.0, 125.0, 2000.0, date(LAST_YEAR, 1, 3)),
+            (70001, 40050, 999.0, 999.0, 10.0, date(LAST_YEAR, 1, 3)),
+        ])
+        factory = Last5YearsReportFactory(product_id=[70001], source=[], is_hogs=True)
+
+        # Act
+        avgprice, avgvolume, avgweight, avgvolumeweight = factory.result(table)
+
+        # Assert
+        price = (100 * 120 * 1000 + 110 * 125 * 2000) / (120 * 1000 + 125 * 2000)
+        assert avgprice.loc[LAST_YEAR_ROW, '1月'] == pytest.approx(round(price, 2))
+        assert avgprice.loc[LAST_YEAR_ROW, '年平均'] == pytest.approx(round(price, 2))
+        assert avgprice.loc['近五年平均', '1月'] == pytest.approx(round(price, 2))
+        assert np.isnan(avgprice.loc[LAST_YEAR_ROW, '2月'])
+        assert avgvolume.loc[LAST_YEAR_ROW, '1月'] == pytest.approx(1.5)
+        assert avgweight.loc[LAST_YEAR_ROW, '1月'] == pytest.approx(round(370000 / 3000, 3))
+        assert avgvolumeweight.loc['近五年平均', '1月'] == pytest.approx(185)
+        assert list(avgweight.index) == [LAST_YEAR_ROW, '近五年平均']
+
+    def test_source_filter_without_volume(self):
+        # Arrange
+        table = make_table([
+            (50001, 1, 10.0, None, None, date(LAST_YEAR, 3, 1)),
+            (50001, 1, 20.0, None, None, date(LAST_YEAR, 3, 1)),
+            (50001, 1, 30.0, None, None, date(LAST_YEAR, 3, 2)),
+            (50001, 2, 99.0, None, None, date(LAST_YEAR, 3, 2)),
+        ])
+        factory = Last5YearsReportFactory(product_id=[50001], source=[1])
+
+        # Act
+        avgprice, avgvolume, avgweight, avgvolumeweight = factory.result(table)
+
+        # Assert: 每日平均價格的平均
+        assert avgprice.loc[LAST_YEAR_ROW, '3月'] == pytest.approx(22.5)
+        assert avgprice.loc[LAST_YEAR_ROW, '年平均'] == pytest.approx(22.5)
+        assert list(avgprice.columns)[0] == '年平均'
+        assert len(avgprice) == 7
+        assert avgvolume.empty
+        assert avgweight.empty
+        assert avgvolumeweight.empty
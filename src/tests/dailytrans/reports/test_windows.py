@@ -0,0 +1,85 @@
+import datetime as dt
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apps.dailytrans.models import DailyTran
+from apps.dailytrans.reports.windows import (
+    WINDOW_TRANS_COLUMNS,
+    Window,
+    fetch_window_trans,
+    trimmed_mean,
+    window_averages,
+)
+
+WINDOWS = [
+    Window('first', dt.date(2024, 1, 1), dt.date(2024, 1, 7)),
+    Window('second', dt.date(2024, 1, 5), dt.date(2024, 1, 11)),
+]
+
+
+def make_trans(rows):
+    # 同 fetch_window_trans，數值欄位轉為 float
+    return pd.DataFrame(rows, columns=WINDOW_TRANS_COLUMNS).astype(
+        {'source_id': float, 'avg_price': float, 'avg_weight': float, 'volume': float}
+    )
+
+
+class TestWindowAverages:
+    def test_weighted_by_volume_and_weight(self):
+        # Arrange
+        trans = make_trans([
+            (0, 1, 10.0, 100.0, 2.0, 10.0, dt.date(2024, 1, 1)),
+            (0, 1, 10.0, 200.0, 1.0, 30.0, dt.date(2024, 1, 2)),
+            (0, 1, 20.0, 999.0, 1.0, 10.0, dt.date(2024, 1, 2)),
+        ])
+        groups = OrderedDict([('a', ([1], [10])), ('b', ([1], None))])
+
+        # Act
+        price, volume = window_averages(trans, groups, WINDOWS, count_groups=['b'])
+
+        # Assert: a 只計算來源 10 的資料
+        assert price.loc['a', 'first'] == pytest.approx((100 * 2 * 10 + 200 * 1 * 30) / (2 * 10 + 1 * 30))
+        assert volume.loc['a', 'first'] == pytest.approx((2 * 10 + 1 * 30) / 40)
+        assert volume.loc['b', 'first'] == pytest.approx(50)
+        assert np.isnan(price.loc['a', 'second'])
+
+    def test_fallback_without_volume(self):
+        # Arrange
+        trans = make_trans([
+            (1, 1, None, 100.0, None, 10.0, dt.date(2024, 1, 8)),
+            (1, 1, None, 200.0, None, None, dt.date(2024, 1, 9)),
+        ])
+
+        # Act
+        price, volume = window_averages(trans, OrderedDict([('a', ([1], []))]), WINDOWS)
+
+        # Assert: 交易量不足 8 成時為簡單平均
+        assert price.loc['a', 'second'] == pytest.approx(150)
+        assert np.isnan(volume.loc['a', 'second'])
+        assert list(price.columns) == ['first', 'second']
+
+    def test_trimmed_mean(self):
+        # Arrange
+        frame = pd.DataFrame([[1.0, 2.0, 3.0, 4.0, 10.0]])
+
+        # Act & Assert
+        assert trimmed_mean(frame)[0] == pytest.approx(3)
+
+
+@pytest.mark.django_db
+class TestFetchWindowTrans:
+    def test_overlapping_windows(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for day in range(1, 12):
+            DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0], date=dt.date(2024, 1, day),
+                                     avg_price=float(day))
+
+        # Act
+        df = fetch_window_trans([product_of_pig.id], WINDOWS)
+
+        # Assert: 重疊的日期分別出現在兩個區間
+        assert df.groupby('window').size().to_dict() == {0: 7, 1: 7}
+        assert df[df['window'] == 1]['avg_price'].sum() == sum(range(5, 12))
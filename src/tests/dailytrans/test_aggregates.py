@@ -0,0 +1,119 @@
+import datetime
+
+import pytest
+
+from apps.configs.models import AbstractProduct
+from apps.dailytrans.builders.upsert import DailyTranUpserter
+from apps.dailytrans.models import DailyTran, DailyTranAggregate
+from apps.dailytrans.utils import get_aggregate_query_set, get_group_by_date_query_set, get_query_set
+from tests.dailytrans.factories import DailyTranFactory
+
+
+@pytest.mark.django_db
+class TestDailyTranAggregate:
+    def test_save_refreshes_aggregate(self, product_of_pig, sources_for_pig):
+        # Arrange
+        date = datetime.date(2024, 1, 1)
+
+        # Act
+        tran = DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date,
+                                avg_price=100, avg_weight=None, volume=20)
+
+        # Assert
+        aggregate = DailyTranAggregate.objects.get(product=product_of_pig, source=sources_for_pig[0], date=date)
+        assert aggregate.type == product_of_pig.type
+        assert aggregate.count == 1
+        assert aggregate.weight_count == 0
+        assert aggregate.price_vol_wt == 100 * 1 * 20
+        assert aggregate.positive_count == 0
+
+        # Act
+        tran.avg_weight = 100
+        tran.date = datetime.date(2024, 1, 2)
+        tran.save()
+
+        # Assert
+        aggregate = DailyTranAggregate.objects.get()
+        assert aggregate.date == datetime.date(2024, 1, 2)
+        assert aggregate.positive_count == 1
+        assert aggregate.positive_price_vol_wt == 100 * 100 * 20
+
+    def test_delete_refreshes_aggregate(self, product_of_pig, sources_for_pig):
+        # Arrange
+        tran = DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=datetime.date(2024, 1, 1))
+        DailyTranFactory(product=product_of_pig, source=sources_for_pig[1], date=datetime.date(2024, 1, 1))
+
+        # Act
+        tran.delete()
+
+        # Assert
+        assert DailyTranAggregate.objects.count() == 1
+
+        # Act
+        DailyTran.objects.all().delete()
+
+        # Assert
+        assert DailyTranAggregate.objects.count() == 0
+
+    def test_refresh_without_source(self, product_of_pig):
+        # Arrange
+        date = datetime.date(2024, 1, 1)
+        DailyTranFactory(product=product_of_pig, source=None, date=date, avg_price=100, volume=20)
+
+        # Act
+        DailyTranAggregate.objects.refresh([(product_of_pig.id, None, date)])
+        DailyTranAggregate.objects.refresh([(product_of_pig.id, None, date), (product_of_pig.id, None, date)])
+
+        # Assert: source 為空的 key 重複計算時不會重複新增
+        aggregate = DailyTranAggregate.objects.get(product=product_of_pig, source=None, date=date)
+        assert aggregate.count == 1
+        assert aggregate.volume == 20
+
+    def test_upsert_refreshes_aggregate(self, product_of_pig, sources_for_pig):
+        # Arrange
+        date = datetime.date(2024, 1, 1)
+        upserter = DailyTranUpserter()
+
+        # Act
+        upserter.upsert([DailyTran(product=product_of_pig, source=sources_for_pig[0], date=date, avg_price=80)])
+        upserter.upsert([DailyTran(product=product_of_pig, source=sources_for_pig[0], date=date, avg_price=90)])
+
+        # Assert
+        aggregate = DailyTranAggregate.objects.get(product=product_of_pig, date=date)
+        assert aggregate.count == 1
+        assert aggregate.price_vol_wt == 90
+
+    def test_group_by_date_matches_raw_query_set(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for day in range(1, 4):
+            date = datetime.date(2024, 1, day)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date,
+                             avg_price=80 + day, avg_weight=100, volume=10 * day)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[1], date=date,
+                             avg_price=90 + day, avg_weight=110, volume=5)
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+        start_date, end_date = datetime.date(2024, 1, 2), datetime.date(2024, 1, 3)
+
+        # Act
+        expected, expected_volume, expected_weight = get_group_by_date_query_set(
+            get_query_set(product_of_pig.type, items, sources_for_pig), start_date, end_date)
+        result, has_volume, has_weight = get_group_by_date_query_set(
+            get_aggregate_query_set(product_of_pig.type, items, sources_for_pig), start_date, end_date)
+
+        # Assert
+        assert (has_volume, has_weight) == (expected_volume, expected_weight)
+        assert list(result['date']) == list(expected['date'])
+        for column in ['avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']:
+            assert list(result[column]) == pytest.approx(list(expected[column]))
+
+    def test_rebuild(self, product_of_pig, sources_for_pig):
+        # Arrange
+        DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=datetime.date(2024, 1, 1))
+        DailyTranAggregate.objects.all().delete()
+
+        # Act
+        rows = DailyTranAggregate.objects.rebuild()
+
+        # Assert
+        assert rows == 1
+        assert DailyTranAggregate.objects.get().count == 1
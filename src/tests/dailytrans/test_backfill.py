@@ -0,0 +1,71 @@
+import datetime as dt
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from apps.dailytrans.builders.metrics import current_metrics
+from apps.dailytrans.builders.upsert import UpsertResult
+from apps.dailytrans.builders.utils import DirectResult
+from apps.dailytrans.management.commands.backfill import Command, run_chunk
+from apps.dailytrans.models import BackfillCheckpoint
+
+
+def fake_direct(start_date=None, end_date=None):
+    current_metrics().record_upsert(UpsertResult(inserted=3, updated=2, unchanged=5))
+    return DirectResult(start_date, end_date, success=True)
+
+
+@pytest.mark.django_db
+class TestBackfillCommand:
+    def test_get_chunks(self):
+        # Act
+        chunks = Command.get_chunks(['COG05'], dt.date(2024, 1, 1), dt.date(2024, 2, 15), 31)
+
+        # Assert
+        assert [chunk[0] for chunk in chunks] == [
+            'apps.crops.builder.direct_wholesale_05',
+            'apps.crops.builder.direct_wholesale_05',
+            'apps.crops.builder.direct_origin',
+            'apps.crops.builder.direct_origin',
+        ]
+        assert [(chunk[3], chunk[4]) for chunk in chunks[:2]] == [
+            (dt.date(2024, 1, 1), dt.date(2024, 1, 31)),
+            (dt.date(2024, 2, 1), dt.date(2024, 2, 15)),
+        ]
+
+    def test_get_chunks_with_checkpoint(self):
+        # Arrange
+        BackfillCheckpoint.objects.create(job='apps.crops.builder.direct_wholesale_05', start_date=dt.date(2024, 1, 1),
+                                          end_date=dt.date(2024, 1, 31), success=True)
+        BackfillCheckpoint.objects.create(job='apps.crops.builder.direct_origin', start_date=dt.date(2024, 1, 1),
+                                          end_date=dt.date(2024, 1, 31), success=False)
+
+        # Act
+        chunks = Command.get_chunks(['COG05'], dt.date(2024, 1, 1), dt.date(2024, 2, 15), 31)
+        all_chunks = Command.get_chunks(['COG05'], dt.date(2024, 1, 1), dt.date(2024, 2, 15), 31, restart=True)
+
+        # Assert: 只略過已成功的區間
+        assert len(chunks) == 3
+        assert ('apps.crops.builder.direct_wholesale_05', dt.date(2024, 1, 1)) not in [(c[0], c[3]) for c in chunks]
+        assert len(all_chunks) == 4
+
+    def test_start_date_later_than_end_date(self):
+        # Act & Assert
+        with pytest.raises(CommandError):
+            call_command('backfill', 'COG05', '--start-date', '2024-02-01', '--end-date', '2024-01-01')
+
+    def test_run_chunk_counts_rows_of_job(self):
+        # Arrange
+        func = 'apps.crops.builder.direct_origin'
+
+        # Act
+        with patch('apps.dailytrans.tasks.throttle_upstream', return_value=0), \
+                patch('apps.dailytrans.management.commands.backfill.import_string', return_value=fake_direct):
+            result = run_chunk(func, 'apis', 'COG05', dt.date(2024, 1, 1), dt.date(2024, 1, 31))
+
+        # Assert: 只計算本次 job 新增及更新的筆數
+        assert result[3] is True
+        assert result[4] == 5
+        assert BackfillCheckpoint.objects.get(job=func).rows == 5
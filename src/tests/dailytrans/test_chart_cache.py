@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from apps.configs.models import AbstractProduct
+from dashboard import caches
+from dashboard.caches import ChartCache
+
+
+@pytest.fixture
+def chart_cache(settings):
+    settings.CHART_CACHE_TIMEOUT = 60
+    return ChartCache(cache=LocMemCache('chart-cache-test', {}))
+
+
+@pytest.mark.django_db
+class TestChartCache:
+    def test_cached_result_reused_until_invalidated(self, chart_cache, product_of_pig):
+        # Arrange
+        calls = []
+
+        @chart_cache.cached
+        def build(_type, items, sources=None):
+            calls.append(1)
+            return {'count': len(calls)}
+
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+
+        # Act
+        first = build(product_of_pig.type, items)
+        second = build(product_of_pig.type, items)
+
+        # Assert
+        assert first == second == {'count': 1}
+
+        # Act: 其他品項寫入不影響此圖表
+        chart_cache.invalidate([product_of_pig.id + 1])
+        third = build(product_of_pig.type, items)
+
+        # Assert
+        assert third == {'count': 1}
+
+        # Act
+        chart_cache.invalidate([product_of_pig.id])
+        fourth = build(product_of_pig.type, items)
+
+        # Assert
+        assert fourth == {'count': 2}
+
+    def test_invalidate_all(self, chart_cache, product_of_pig):
+        # Arrange
+        calls = []
+
+        @chart_cache.cached
+        def build(_type, items, sources=None):
+            calls.append(1)
+            return len(calls)
+
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+        build(product_of_pig.type, items)
+
+        # Act
+        chart_cache.invalidate_all()
+
+        # Assert
+        assert build(product_of_pig.type, items) == 2
+
+    def test_disabled(self, chart_cache, product_of_pig, settings):
+        # Arrange
+        settings.CHART_CACHE_TIMEOUT = 0
+        calls = []
+
+        @chart_cache.cached
+        def build(_type, items, sources=None):
+            calls.append(1)
+            return len(calls)
+
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+
+        # Act
+        build(product_of_pig.type, items)
+
+        # Assert
+        assert build(product_of_pig.type, items) == 2
+
+
+@pytest.mark.django_db
+class TestChartCacheInvalidation:
+    def test_watchlist_item_sources_changed(self, watchlist_item_with_pig, sources_for_pig):
+        # Arrange: 測試中的交易不會 commit，直接執行 on_commit 的函數
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), \
+                patch.object(caches.chart_cache, 'invalidate') as mock_invalidate:
+            # Act
+            watchlist_item_with_pig.sources.remove(sources_for_pig[0])
+
+        # Assert
+        mock_invalidate.assert_called_once_with([watchlist_item_with_pig.product_id])
+
+    def test_source_configs_changed(self, sources_for_pig):
+        # Arrange
+        source = sources_for_pig[0]
+
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), \
+                patch.object(caches.chart_cache, 'invalidate_all') as mock_invalidate_all:
+            # Act
+            source.configs.clear()
+
+        # Assert
+        assert mock_invalidate_all.called
@@ -2,9 +2,10 @@ import datetime as dt
 from datetime import datetime
 
 import pytest
+from django.db import IntegrityError
 
 from apps.configs.models import AbstractProduct, Source
-from apps.dailytrans.models import DailyTran
+from apps.dailytrans.models import DailyTran, month_day_ranges
 from tests.dailytrans.factories import (
     DailyTranFactory,
 )
@@ -40,6 +41,16 @@ class TestDailyTranModel:
             Source.objects.get(id=daily_tran.source.id)
             DailyTran.objects.get(id=daily_tran.id)
 
+    def test_daily_tran_unique_product_source_date(self, daily_tran):
+        with pytest.raises(IntegrityError):
+            DailyTranFactory(product=daily_tran.product, source=daily_tran.source, date=daily_tran.date)
+
+    def test_daily_tran_unique_product_date_without_source(self, daily_tran):
+        DailyTranFactory(product=daily_tran.product, source=None, date=daily_tran.date)
+
+        with pytest.raises(IntegrityError):
+            DailyTranFactory(product=daily_tran.product, source=None, date=daily_tran.date)
+
     def test_month_day_method(self, daily_tran):
         assert daily_tran.month_day == int(datetime.now().strftime('%m%d'))
 
@@ -65,3 +76,89 @@ class TestDailyTranModel:
         result = DailyTran.objects.between_month_day_filter(start_date=date, end_date=date)
 
         assert result.count() == 0
+
+    def test_between_month_day_filter_uses_date_ranges(self, daily_tran):
+        # Arrange
+        start_date, end_date = dt.date(2025, 1, 1), dt.date(2025, 3, 1)
+
+        # Act
+        sql, params = DailyTran.objects.between_month_day_filter(start_date, end_date).query.sql_with_params()
+
+        # Assert
+        assert len(params) == 2 * (2025 - 2011 + 1)
+
+    def test_between_month_day_filter_across_years(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for date in [dt.date(2022, 12, 31), dt.date(2023, 1, 1), dt.date(2023, 1, 2), dt.date(2023, 6, 1)]:
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date)
+
+        # Act
+        result = DailyTran.objects.between_month_day_filter(dt.date(2023, 12, 31), dt.date(2024, 1, 1))
+
+        # Assert
+        assert sorted(result.values_list('date', flat=True)) == [dt.date(2022, 12, 31), dt.date(2023, 1, 1)]
+
+    def test_latest_on_or_before(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for source, date, price in [
+            (sources_for_pig[0], dt.date(2024, 1, 1), 10),
+            (sources_for_pig[0], dt.date(2024, 1, 3), 30),
+            (sources_for_pig[1], dt.date(2024, 1, 2), 20),
+        ]:
+            DailyTranFactory(product=product_of_pig, source=source, date=date, avg_price=price)
+        days = [datetime(2023, 12, 31), datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 5)]
+
+        # Act
+        result = DailyTran.objects.filter(product=product_of_pig).latest_on_or_before(days)
+
+        # Assert
+        assert [(t.as_of_date, t.avg_price) for t in result] == [
+            (dt.date(2024, 1, 1), 10), (dt.date(2024, 1, 2), 20), (dt.date(2024, 1, 5), 30),
+        ]
+
+        # Act
+        result = DailyTran.objects.filter(product=product_of_pig).latest_on_or_before(days, group_by=('source_id',))
+
+        # Assert
+        assert {(t.source_id, t.as_of_date): t.avg_price for t in result} == {
+            (sources_for_pig[0].id, dt.date(2024, 1, 1)): 10,
+            (sources_for_pig[0].id, dt.date(2024, 1, 2)): 10,
+            (sources_for_pig[0].id, dt.date(2024, 1, 5)): 30,
+            (sources_for_pig[1].id, dt.date(2024, 1, 2)): 20,
+            (sources_for_pig[1].id, dt.date(2024, 1, 5)): 20,
+        }
+
+    def test_filter_by_date_lte_keeps_days_order(self, product_of_pig, sources_for_pig):
+        # Arrange
+        DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=dt.date(2024, 1, 2), avg_price=20)
+        days = [datetime(2024, 1, 3), datetime(2024, 1, 1), datetime(2024, 1, 2)]
+
+        # Act
+        result = DailyTran.objects.filter_by_date_lte(days, [product_of_pig])
+
+        # Assert
+        assert [t and t.avg_price for t in result] == [20, None, 20]
+        assert DailyTran.objects.filter_by_date_lte(days, [product_of_pig], sources=[]) == result
+
+
+class TestMonthDayRanges:
+    def test_leap_day(self):
+        # Act
+        result = month_day_ranges(dt.date(2024, 2, 29), dt.date(2024, 2, 29), first_year=2022)
+
+        # Assert
+        assert result == [
+            (dt.date(2024, 3, 1), dt.date(2024, 2, 28)),
+            (dt.date(2023, 3, 1), dt.date(2023, 2, 28)),
+            (dt.date(2022, 3, 1), dt.date(2022, 2, 28)),
+        ]
+
+    def test_leap_day_in_window(self):
+        # Act
+        result = month_day_ranges(dt.date(2024, 2, 1), dt.date(2024, 2, 29), first_year=2023)
+
+        # Assert
+        assert result == [
+            (dt.date(2024, 2, 1), dt.date(2024, 2, 28)),
+            (dt.date(2023, 2, 1), dt.date(2023, 2, 28)),
+        ]
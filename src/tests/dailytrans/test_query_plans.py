@@ -0,0 +1,170 @@
+import datetime as dt
+
+import pytest
+from django.db import connection
+
+from apps.configs.models import AbstractProduct
+from apps.dailytrans.builders.upsert import DailyTranUpserter
+from apps.dailytrans.models import DailyTran
+from apps.dailytrans.reports.windows import Window, window_trans_sql
+from apps.dailytrans.utils import get_query_set
+from tests.configs.factories import AbstractProductFactory
+
+TABLE = DailyTran._meta.db_table
+
+# 模擬正式環境的資料分布: 多個品項、每個品項約七年的資料，查詢只涉及少數品項
+SYNTHETIC_PRODUCTS = 120
+
+SYNTHETIC_TRANS_SQL = '''
+    INSERT INTO {table} (product_id, source_id, date, avg_price, avg_weight, volume, not_updated, update_time,
+                         create_time)
+    SELECT p, s, d::date, 50 + EXTRACT(DOW FROM d), 100, 10, 0, now(), now()
+    FROM unnest(%s::integer[]) AS p, unnest(%s::integer[]) AS s,
+         generate_series('2018-01-01'::date, '2024-12-31'::date, interval '2 days') AS d
+'''
+
+
+def explain(sql, params=None):
+    """
+    以實際的統計資料取得查詢計畫，不強制 PostgreSQL 使用索引
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def assert_index_scan(sql, params=None):
+    plan = explain(sql, params)
+
+    assert 'Seq Scan on %s' % TABLE not in plan, plan
+
+
+def assert_query_set_index_scan(query_set):
+    sql, params = query_set.query.sql_with_params()
+
+    assert_index_scan(sql, params)
+
+
+@pytest.fixture
+def synthetic_trans(product_of_pig, sources_for_pig):
+    products = [product_of_pig] + [
+        AbstractProductFactory(config=product_of_pig.config, type=product_of_pig.type, unit=product_of_pig.unit)
+        for _ in range(SYNTHETIC_PRODUCTS - 1)
+    ]
+
+    # 約 25 萬筆，以 generate_series 直接寫入
+    with connection.cursor() as cursor:
+        cursor.execute(SYNTHETIC_TRANS_SQL.format(table=TABLE),
+                       [[product.id for product in products], [source.id for source in sources_for_pig]])
+        cursor.execute('ANALYZE %s' % TABLE)
+
+    return products
+
+
+@pytest.mark.django_db
+class TestDailyTranQueryPlans:
+    def test_utils_query_set_by_date_range(self, synthetic_trans, sources_for_pig):
+        # Arrange
+        items = AbstractProduct.objects.filter(id=synthetic_trans[0].id)
+        query_set = get_query_set(synthetic_trans[0].type, items, sources_for_pig)
+
+        # Act & Assert
+        assert_query_set_index_scan(query_set.filter(date__range=(dt.date(2023, 1, 1), dt.date(2023, 3, 1))))
+
+    def test_utils_between_month_day_filter(self, synthetic_trans):
+        # Arrange
+        query_set = DailyTran.objects.filter(product=synthetic_trans[0])
+
+        # Act & Assert
+        assert_query_set_index_scan(
+            query_set.between_month_day_filter(dt.date(2023, 1, 1), dt.date(2023, 3, 1)))
+
+    def test_daily_report_latest_before_date(self, synthetic_trans, sources_for_pig):
+        # Arrange: dailyreport.py 以 latest_on_or_before 取出每個品項在各日期以前最近一筆資料
+        query_set = DailyTran.objects.filter(product__in=synthetic_trans[:2], source__in=sources_for_pig)
+        days = [dt.date(2023, 6, 1) - dt.timedelta(days=day) for day in range(7)]
+
+        # Act & Assert
+        assert_index_scan(*query_set.latest_on_or_before_sql(days))
+        assert_index_scan(*query_set.latest_on_or_before_sql(days, group_by=('source_id',)))
+        assert_query_set_index_scan(
+            DailyTran.objects.filter(product__in=synthetic_trans[:2], date__year=2022, date__month=6))
+
+    def test_last_5_years_report(self, synthetic_trans):
+        # Arrange: 同 Last5YearsReportFactory.get_table
+        sql = (
+            'select product_id, source_id, avg_price, avg_weight, volume, date from dailytrans_dailytran '
+            'INNER JOIN unnest(%(ids)s) as pid ON pid=dailytrans_dailytran.product_id '
+            'where ((date between %(start)s and %(end)s))'
+        )
+
+        # Act & Assert
+        assert_index_scan(sql, {'ids': [p.id for p in synthetic_trans[:3]], 'start': '2019-01-01',
+                                'end': '2023-12-31'})
+
+    def test_festival_report(self, synthetic_trans):
+        # Arrange: 同 FestivalReportFactory.get_table，六個年度 x 八週的節日區間
+        windows = [
+            Window((year, week), dt.date(year, 1, 20) + dt.timedelta(days=7 * week),
+                   dt.date(year, 1, 26) + dt.timedelta(days=7 * week))
+            for year in range(2018, 2024) for week in range(8)
+        ]
+
+        # Act & Assert
+        assert_index_scan(*window_trans_sql([p.id for p in synthetic_trans[:5]], windows))
+
+    def test_upserter_fetch_existing(self, synthetic_trans):
+        # Arrange: 同 DailyTranUpserter._fetch_existing
+        upserter = DailyTranUpserter()
+        query_set = DailyTran.objects.filter(
+            product_id__in=[synthetic_trans[0].id], date__range=(dt.date(2023, 1, 1), dt.date(2023, 1, 31))
+        ).values('id', 'product_id', 'source_id', 'date', 'not_updated', *upserter.fields)
+
+        # Act & Assert
+        assert_query_set_index_scan(query_set)
+
+
+@pytest.mark.django_db
+class TestDailyTranPartitions:
+    def test_partitions_by_year(self):
+        # Act
+        partitions = DailyTran.objects.partitions()
+
+        # Assert
+        assert 'dailytrans_dailytran_y2011' in partitions
+        assert 'dailytrans_dailytran_y%d' % (dt.date.today().year + 1) in partitions
+
+    def test_create_partitions(self, product_of_pig, sources_for_pig):
+        # Arrange
+        year = dt.date.today().year + 5
+
+        # Act
+        DailyTran.objects.create_partitions(year, year)
+        DailyTran.objects.create_partitions(year, year)
+        DailyTran.objects.create(product=product_of_pig, source=sources_for_pig[0], date=dt.date(year, 1, 1),
+                                 avg_price=10.0)
+
+        # Assert
+        assert 'dailytrans_dailytran_y%d' % year in DailyTran.objects.partitions()
+        assert DailyTran.objects.filter(date__year=year).count() == 1
+
+    def test_report_queries_prune_partitions(self, synthetic_trans):
+        # Arrange
+        sql = (
+            'select product_id, source_id, avg_price, avg_weight, volume, date from dailytrans_dailytran '
+            'INNER JOIN unnest(%(ids)s) as pid ON pid=dailytrans_dailytran.product_id '
+            'where ((date between %(start)s and %(end)s))'
+        )
+        query_set = DailyTran.objects.filter(product=synthetic_trans[0]).between_month_day_filter(
+            dt.date(2022, 1, 1), dt.date(2022, 2, 1))
+
+        # Act
+        plan = explain(sql, {'ids': [p.id for p in synthetic_trans], 'start': '2022-01-01', 'end': '2023-12-31'})
+        month_day_plan = explain(*query_set.query.sql_with_params())
+
+        # Assert
+        assert 'dailytrans_dailytran_y2022' in plan
+        assert 'dailytrans_dailytran_y2023' in plan
+        assert 'dailytrans_dailytran_y2021' not in plan
+        assert 'dailytrans_dailytran_y2023' not in month_day_plan
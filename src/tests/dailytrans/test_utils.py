@@ -0,0 +1,216 @@
+import datetime
+from io import StringIO
+
+import pandas as pd
+import pytest
+from django.core.management import call_command
+
+from apps.configs.models import AbstractProduct
+from apps.dailytrans.models import DailyTran
+from apps.dailytrans.utils import (
+    get_daily_price_by_year,
+    get_integration,
+    get_group_by_date_data_frame,
+    get_group_by_date_sql,
+    to_unix,
+    to_unix_array,
+)
+from tests.dailytrans.factories import DailyTranFactory
+
+
+def assert_same_result(query_set, start_date=None, end_date=None, specific_year=True):
+    expected, expected_volume, expected_weight = get_group_by_date_data_frame(
+        query_set, start_date, end_date, specific_year)
+    result, has_volume, has_weight = get_group_by_date_sql(query_set, start_date, end_date, specific_year)
+
+    assert (has_volume, has_weight) == (expected_volume, expected_weight)
+    assert list(result.columns) == list(expected.columns)
+    assert list(result['date']) == list(expected['date'])
+    for column in ['avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']:
+        assert list(result[column]) == pytest.approx(list(expected[column]))
+
+
+@pytest.mark.django_db
+class TestGetGroupByDateSql:
+    def test_with_volume_and_weight(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for day in range(1, 5):
+            date = datetime.date(2024, 1, day)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date,
+                             avg_price=80 + day, avg_weight=100 + day, volume=10 * day)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[1], date=date,
+                             avg_price=90 + day, avg_weight=110, volume=0 if day == 2 else 5)
+
+        # Act & Assert
+        assert_same_result(DailyTran.objects.all())
+        assert_same_result(DailyTran.objects.all(), datetime.date(2024, 1, 2), datetime.date(2024, 1, 3))
+
+    def test_without_volume_and_weight(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for day in range(1, 4):
+            date = datetime.date(2024, 1, day)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date,
+                             avg_price=80 + day, avg_weight=None, volume=None)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[1], date=date,
+                             avg_price=90 + day, avg_weight=None, volume=3 if day == 1 else None)
+
+        # Act
+        result, has_volume, has_weight = get_group_by_date_sql(DailyTran.objects.all())
+
+        # Assert
+        assert not has_volume
+        assert not has_weight
+        assert list(result['sum_volume']) == [2, 2, 2]
+        assert list(result['avg_avg_weight']) == [1, 1, 1]
+        assert_same_result(DailyTran.objects.all())
+
+    def test_without_source(self, product_of_pig):
+        # Arrange
+        for day in range(1, 3):
+            DailyTranFactory(product=product_of_pig, source=None, date=datetime.date(2024, 1, day),
+                             avg_price=80 + day, avg_weight=100, volume=10)
+
+        # Act
+        result, _, _ = get_group_by_date_sql(DailyTran.objects.all())
+
+        # Assert
+        assert list(result['num_of_source']) == [1, 1]
+        assert_same_result(DailyTran.objects.all())
+
+    def test_between_month_day(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for year in range(2021, 2025):
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=datetime.date(year, 3, 1),
+                             avg_price=year - 2000, avg_weight=100, volume=10)
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=datetime.date(year, 6, 1),
+                             avg_price=year - 2000, avg_weight=100, volume=10)
+
+        # Act
+        result, _, _ = get_group_by_date_sql(
+            DailyTran.objects.all(), datetime.date(2024, 2, 1), datetime.date(2024, 4, 1), specific_year=False)
+
+        # Assert
+        assert len(result) == 4
+        assert_same_result(
+            DailyTran.objects.all(), datetime.date(2024, 2, 1), datetime.date(2024, 4, 1), specific_year=False)
+
+    def test_empty(self, product_of_pig, sources_for_pig):
+        # Act
+        result, has_volume, has_weight = get_group_by_date_sql(DailyTran.objects.all())
+
+        # Assert
+        assert result.empty
+        assert list(result.columns) == ['date', 'avg_price', 'num_of_source', 'sum_volume', 'avg_avg_weight']
+        assert not has_volume
+        assert not has_weight
+
+
+@pytest.mark.django_db
+class TestGetDailyPriceByYear:
+    def test_result(self, product_of_pig, sources_for_pig):
+        # Arrange
+        for date, price in [(datetime.date(2023, 2, 28), 80), (datetime.date(2023, 3, 1), 81),
+                            (datetime.date(2024, 2, 29), 90), (datetime.date(2024, 3, 1), 0)]:
+            DailyTranFactory(product=product_of_pig, source=sources_for_pig[0], date=date,
+                             avg_price=price, avg_weight=None, volume=None)
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+
+        # Act
+        result = get_daily_price_by_year(product_of_pig.type, items)
+
+        # Assert
+        highchart = result['price']['highchart']
+        assert [year for year, _ in result['years']] == [2023, 2024]
+        assert list(highchart) == ['2023', '2024']
+        assert len(highchart['2023']) == len(highchart['2024']) == 366
+        # 2 月 28 日、2 月 29 日、3 月 1 日
+        assert highchart['2023'][58] == (to_unix(datetime.date(2016, 2, 28)), 80)
+        assert highchart['2023'][59] == (to_unix(datetime.date(2016, 2, 29)), None)
+        assert highchart['2023'][60] == (to_unix(datetime.date(2016, 3, 1)), 81)
+        assert highchart['2024'][59] == (to_unix(datetime.date(2016, 2, 29)), 90)
+        assert highchart['2024'][60] is None
+        assert highchart['2024'][0] == (to_unix(datetime.date(2016, 1, 1)), None)
+        assert 'volume' not in result
+        assert not result['no_data']
+
+        rows = result['price']['raw']['rows']
+        assert [row[1:] for row in rows] == [[80, ''], ['', 90], [81, '']]
+        assert [row[0].strftime('%m-%d') for row in rows] == ['02-28', '02-29', '03-01']
+
+
+@pytest.mark.django_db
+class TestGetIntegration:
+    def create_trans(self, product, source, prices):
+        for date, price in prices.items():
+            DailyTranFactory(product=product, source=source, date=date, avg_price=price, avg_weight=None,
+                             volume=None)
+
+    def test_year_comparison(self, product_of_pig, sources_for_pig):
+        # Arrange
+        self.create_trans(product_of_pig, sources_for_pig[0], {
+            datetime.date(2022, 1, 1): 10, datetime.date(2022, 1, 5): 20,
+            datetime.date(2023, 1, 2): 30, datetime.date(2023, 2, 1): 99,
+        })
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+
+        # Act
+        result = get_integration(product_of_pig.type, items, datetime.date(2024, 1, 1), datetime.date(2024, 1, 10),
+                                 to_init=False)
+
+        # Assert
+        integration = result['integration']
+        assert [dic['name'] for dic in integration] == ['2023', '2022']
+        assert [dic['avg_price'] for dic in integration] == pytest.approx([30, 15])
+        assert [dic['order'] for dic in integration] == [5, 6]
+        assert integration[1]['points']['avg_price'] == [10, 20]
+        assert integration[1]['points']['unix'] == [to_unix(datetime.date(2022, 1, 1)),
+                                                   to_unix(datetime.date(2022, 1, 5))]
+        assert not result['has_volume']
+        assert not result['has_weight']
+
+    def test_year_comparison_across_years(self, product_of_pig, sources_for_pig):
+        # Arrange
+        self.create_trans(product_of_pig, sources_for_pig[0], {
+            datetime.date(2021, 12, 31): 30, datetime.date(2022, 1, 1): 40,
+            datetime.date(2022, 12, 30): 10, datetime.date(2023, 1, 2): 20,
+        })
+        items = AbstractProduct.objects.filter(id=product_of_pig.id)
+
+        # Act
+        result = get_integration(product_of_pig.type, items, datetime.date(2023, 12, 30), datetime.date(2024, 1, 2),
+                                 to_init=False)
+
+        # Assert
+        integration = result['integration']
+        assert [dic['name'] for dic in integration] == ['2021~2022', '2022~2023']
+        assert [dic['avg_price'] for dic in integration] == pytest.approx([35, 15])
+        assert [len(dic['points']['date']) for dic in integration] == [2, 2]
+
+
+class TestToUnixArray:
+    def test_same_as_to_unix(self):
+        # Arrange: 10 年的每日資料點
+        dates = pd.date_range(datetime.date(2014, 1, 1), datetime.date(2023, 12, 31), freq='D')
+        date_list = [date.date() for date in dates]
+
+        # Act & Assert
+        assert to_unix_array(date_list).tolist() == [to_unix(date) for date in date_list]
+        assert to_unix_array(dates).tolist() == [to_unix(date) for date in dates]
+        assert to_unix_array(pd.Series(date_list)).tolist() == [to_unix(date) for date in date_list]
+
+    def test_datetime(self):
+        # Arrange
+        date = datetime.datetime(2024, 2, 29, 13, 45, 30, 500)
+
+        # Act & Assert
+        assert to_unix_array([date]).tolist() == [to_unix(date)]
+
+    def test_benchmark_command(self):
+        # Arrange
+        out = StringIO()
+
+        # Act
+        call_command('benchmark_to_unix', years=1, repeat=1, stdout=out)
+
+        # Assert
+        assert 'Speedup' in out.getvalue()